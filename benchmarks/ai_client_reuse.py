@@ -0,0 +1,107 @@
+"""
+AI 连接复用基准：本地起模拟 SSE 服务（`utils.mock_sse`），同样的命名请求分别
+每次新建 `httpx.AsyncClient`、和通过 `ClientRegistry` 共用连接池，对比单次命名耗时和新建的 TCP 连接数。
+
+模拟服务是明文 HTTP，省下的只是建客户端（SSL 上下文、连接池）和 TCP 握手；真实的 Kimi / OpenAI 还要加上 TLS 握手。
+
+.. code-block:: bash
+    uv run python -m benchmarks.ai_client_reuse
+    uv run python -m benchmarks.ai_client_reuse --images 100 --concurrency 4 --ttft 0.05
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from rich import print
+from rich.table import Table
+
+from utils.ai import Img
+from utils.http_client import ClientRegistry
+from utils.mock_sse import MockOptions, MockServer, serve
+from utils.naming_backends import KimiBackend, NamingBackend, OpenAIBackend
+from utils.timing import Histogram
+
+
+async def run(
+    backend: NamingBackend, imgs: list[Img], concurrency: int, reuse: bool
+) -> tuple[float, Histogram]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = Histogram()
+    backend.clients = ClientRegistry(concurrency) if reuse else None
+
+    async def name(img: Img) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await backend.name_one(img, img["src"])
+            latencies.observe(time.perf_counter() - start)
+
+    start_time = time.perf_counter()
+
+    try:
+        # 命名过程的逐张输出会淹没结果表格
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(name(img) for img in imgs))
+    finally:
+        if backend.clients is not None:
+            await backend.clients.aclose()
+            backend.clients = None
+
+    return time.perf_counter() - start_time, latencies
+
+
+def measure(
+    server: MockServer, backend: NamingBackend, imgs: list[Img], args, reuse: bool
+) -> list[str]:
+    connections = server.connections
+    elapsed, latencies = asyncio.run(run(backend, imgs, args.concurrency, reuse))
+
+    return [
+        backend.name,
+        "复用" if reuse else "每次新建",
+        f"{elapsed:.2f}s",
+        f"{latencies.percentile(0.5) * 1000:.1f}ms",
+        f"{latencies.percentile(0.95) * 1000:.1f}ms",
+        str(server.connections - connections),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--ttft", type=float, default=0.05, help="模拟的首 token 延迟")
+    args = parser.parse_args()
+
+    server = serve(MockOptions(ttft=args.ttft))
+    imgs = [
+        Img(alt="", src=f"https://example.com/{index}.jpg")
+        for index in range(args.images)
+    ]
+    backends: list[NamingBackend] = [
+        KimiBackend(server.base_url, chat_id="mock", authorization="Bearer mock"),
+        OpenAIBackend(f"{server.base_url}/v1", model="mock"),
+    ]
+
+    table = Table(
+        title=f"{args.images} 张图片，并发 {args.concurrency}，模拟首 token 延迟 {args.ttft}s"
+    )
+    table.add_column("后端")
+    table.add_column("连接")
+    table.add_column("耗时", justify="right")
+    table.add_column("单次 p50", justify="right")
+    table.add_column("单次 p95", justify="right")
+    table.add_column("新建连接", justify="right")
+
+    for backend in backends:
+        for reuse in (False, True):
+            table.add_row(*measure(server, backend, imgs, args, reuse))
+
+    server.shutdown()
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
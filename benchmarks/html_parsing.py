@@ -0,0 +1,111 @@
+"""
+页面解析基准：对比 BeautifulSoup 整页解析 + `css.select` 与 `StreamExtractor` 按 64KB 分块增量解析，
+在大页面上的总耗时、拿到第一张图片的耗时和内存峰值。
+
+.. code-block:: bash
+    uv run python -m benchmarks.html_parsing
+    uv run python -m benchmarks.html_parsing --images 20000 --filler 400
+"""
+
+import argparse
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from bs4 import BeautifulSoup
+from rich import print
+from rich.table import Table
+
+from utils.html_stream import StreamExtractor, compile_stream_selectors
+
+SELECTOR = ".md-content img"
+CHUNK_SIZE = 64 * 1024
+
+
+def make_page(images: int, filler: int) -> str:
+    """每张图片前后夹杂 `filler` 字节左右的正文，模拟长文章页。"""
+
+    text = "<p>" + "lorem ipsum " * (filler // 12) + "</p>"
+    body = "".join(
+        f'<div class="item">{text}<img src="/img/{i}.jpg" alt="image {i}"></div>'
+        for i in range(images)
+    )
+
+    return f'<html><head><title>bench</title></head><body><div class="md-content">{body}</div></body></html>'
+
+
+def parse_full(html: str) -> tuple[int, float]:
+    start = time.perf_counter()
+    imgs = BeautifulSoup(html, "html.parser").css.select(SELECTOR)
+
+    return len(imgs), time.perf_counter() - start
+
+
+def parse_stream(html: str) -> tuple[int, float]:
+    selectors = compile_stream_selectors(img=SELECTOR)
+    assert selectors is not None
+
+    extractor = StreamExtractor(selectors)
+    start = time.perf_counter()
+    first = None
+    found = 0
+
+    for offset in range(0, len(html), CHUNK_SIZE):
+        extractor.feed(html[offset : offset + CHUNK_SIZE])
+        found += len(extractor.drain())
+
+        if found and first is None:
+            first = time.perf_counter() - start
+
+    extractor.close()
+    found += len(extractor.drain())
+
+    return found, first or 0.0
+
+
+def measure(parse: Callable[[str], tuple[int, float]], html: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    found, first = parse(html)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return found, elapsed, first, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument(
+        "--filler", type=int, default=200, help="每张图片附带的正文字节数"
+    )
+    args = parser.parse_args()
+
+    html = make_page(args.images, args.filler)
+
+    table = Table(title=f"页面 {len(html) / 1024 / 1024:.1f} MB，{args.images} 张图片")
+    table.add_column("解析方式")
+    table.add_column("图片数", justify="right")
+    table.add_column("总耗时", justify="right")
+    table.add_column("首张图片", justify="right")
+    table.add_column("内存峰值", justify="right")
+
+    for name, parse in (
+        ("BeautifulSoup", parse_full),
+        ("StreamExtractor", parse_stream),
+    ):
+        found, elapsed, first, peak = measure(parse, html)
+        table.add_row(
+            name,
+            str(found),
+            f"{elapsed:.2f}s",
+            f"{first:.3f}s",
+            f"{peak / 1024 / 1024:.1f} MB",
+        )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
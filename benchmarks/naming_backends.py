@@ -0,0 +1,95 @@
+"""
+命名后端基准：本地起确定性的模拟 SSE 服务（`utils.mock_sse`），对比 Kimi / OpenAI 兼容协议和离线 slug 后端
+在各自声明的并发上限下，逐张命名与批量命名的吞吐。不需要任何真实的模型服务。
+
+.. code-block:: bash
+    uv run python -m benchmarks.naming_backends
+    uv run python -m benchmarks.naming_backends --images 200 --ttft 0.5 --batch-size 20
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+from rich import print
+from rich.table import Table
+
+from utils.ai import Img
+from utils.mock_sse import MockOptions, serve
+from utils.naming_backends import (
+    KimiBackend,
+    LocalBackend,
+    NamingBackend,
+    OpenAIBackend,
+)
+
+
+async def run(backend: NamingBackend, imgs: list[Img], batch_size: int) -> float:
+    semaphore = asyncio.Semaphore(backend.max_concurrency)
+    filenames = [img["src"] for img in imgs]
+
+    async def name(start: int) -> None:
+        async with semaphore:
+            if batch_size == 1:
+                await backend.name_one(imgs[start], filenames[start])
+            else:
+                await backend.name_many(
+                    imgs[start : start + batch_size],
+                    filenames[start : start + batch_size],
+                )
+
+    start_time = time.perf_counter()
+
+    # 命名过程的逐张输出会淹没结果表格
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(name(i) for i in range(0, len(imgs), batch_size)))
+
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--ttft", type=float, default=0.3, help="模拟的首 token 延迟")
+    parser.add_argument("--batch-size", type=int, default=10)
+    args = parser.parse_args()
+
+    server = serve(MockOptions(ttft=args.ttft))
+    imgs = [
+        Img(alt=f"photo {index}", src=f"https://example.com/{index}.jpg")
+        for index in range(args.images)
+    ]
+    backends: list[NamingBackend] = [
+        KimiBackend(server.base_url, chat_id="mock", authorization="Bearer mock"),
+        OpenAIBackend(f"{server.base_url}/v1", model="mock"),
+        LocalBackend(),
+    ]
+
+    table = Table(
+        title=f"{args.images} 张图片，模拟首 token 延迟 {args.ttft}s（每个后端按其并发上限）"
+    )
+    table.add_column("后端")
+    table.add_column("并发", justify="right")
+    table.add_column("批大小", justify="right")
+    table.add_column("耗时", justify="right")
+    table.add_column("张/秒", justify="right")
+
+    for backend in backends:
+        for batch_size in sorted({1, min(args.batch_size, backend.max_batch_size)}):
+            elapsed = asyncio.run(run(backend, imgs, batch_size))
+            table.add_row(
+                backend.name,
+                str(backend.max_concurrency),
+                str(batch_size),
+                f"{elapsed:.2f}s",
+                f"{args.images / elapsed:.1f}",
+            )
+
+    server.shutdown()
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+冷启动基准：用 `python -X importtime` 测量 `import main` 的累计导入耗时，列出最慢的模块，
+并检查 `--help` 和参数校验路径没有加载重量级依赖。超出预算时退出码为 1，可以放进 CI。
+
+.. code-block:: bash
+    uv run python -m benchmarks.startup
+    uv run python -m benchmarks.startup --runs 20 --budget-ms 150
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from rich import print
+from rich.table import Table
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 只有真正下载 / 命名时才应该导入的模块
+HEAVY_MODULES = ("httpx", "bs4", "pydantic_settings", "requests", "PIL")
+
+DEFAULT_BUDGET_MS = 200.0
+
+
+def importtime(module: str) -> dict[str, int]:
+    """
+    在新进程中导入 `module`，返回它本身以及它直接导入的各模块的累计导入耗时（微秒）。
+    `-X importtime` 先输出子模块再输出父模块，缩进表示层级。
+    """
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries: list[tuple[int, str, int]] = []
+
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, total, raw_name = line.removeprefix("import time:").split("|")
+        depth = (len(raw_name) - len(raw_name.lstrip())) // 2
+        entries.append((depth, raw_name.strip(), int(total)))
+
+    cumulative: dict[str, int] = {}
+
+    # 从 `module` 那一行往前，直到上一个顶层模块为止都是它导入的
+    for depth, name, total in reversed(entries):
+        if name == module and depth == 0:
+            cumulative[name] = total
+        elif cumulative and depth == 0:
+            break
+        elif cumulative and depth == 1:
+            cumulative[name] = total
+
+    return cumulative
+
+
+def loaded_heavy_modules(module: str) -> list[str]:
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    return [name for name in completed.stdout.strip().split(",") if name]
+
+
+def help_seconds() -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "main.py", "--help"],
+        cwd=ROOT,
+        capture_output=True,
+        check=True,
+    )
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help="`import main` 累计导入耗时中位数的上限",
+    )
+    parser.add_argument("--top", type=int, default=10, help="列出最慢的模块数")
+    args = parser.parse_args()
+
+    samples = [importtime("main") for _ in range(args.runs)]
+    median_ms = statistics.median(sample["main"] for sample in samples) / 1000
+    help_ms = statistics.median(help_seconds() for _ in range(args.runs)) * 1000
+
+    table = Table(
+        title=f"main 直接导入的最慢的 {args.top} 个模块（{args.runs} 次中位数）"
+    )
+    table.add_column("模块")
+    table.add_column("累计耗时", justify="right")
+
+    modules = {name for name in samples[0] if name != "main"}
+    slowest = sorted(
+        (
+            (statistics.median(s.get(name, 0) for s in samples), name)
+            for name in modules
+        ),
+        reverse=True,
+    )
+
+    for total, name in slowest[: args.top]:
+        table.add_row(name, f"{total / 1000:.1f} ms")
+
+    print(table)
+    print(f"import main: {median_ms:.1f} ms（预算 {args.budget_ms:.0f} ms）")
+    print(f"main.py --help: {help_ms:.1f} ms")
+
+    failures = []
+
+    if median_ms > args.budget_ms:
+        failures.append(f"导入耗时 {median_ms:.1f} ms 超出预算 {args.budget_ms:.0f} ms")
+
+    if heavy := loaded_heavy_modules("main"):
+        failures.append(f"import main 加载了 {', '.join(heavy)}")
+
+    for failure in failures:
+        print(f"[red]❌ {failure}[/red]")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,20 @@
 # import argparse
-import asyncio
+import contextlib
 import sys
-from typing import TypedDict
+from pathlib import Path
+from typing import TextIO, TypedDict
 
-import httpx
-import requests
 import typer
 from loguru import logger
 from rich import print
-from rich.console import Console
 from typing_extensions import Annotated
 
-from utils import timing, CLIArgs, get_args, set_args, start as start_download
+# 只导入 `--help` 和参数校验用得到的轻量模块，httpx、bs4、pydantic-settings 等到真正下载时才加载
+from utils.cli_args import FSYNC_POLICIES, OUTPUT_FORMATS, CLIArgs
+from utils.concurrency import AUTO_INITIAL
+from utils.near_dup import DEFAULT_THRESHOLD, MAX_THRESHOLD
+from utils.postprocess import FORMATS, has_pillow
+from utils.timing import timing
 
 # from utils.logging_config import logging
 
@@ -26,8 +29,6 @@ class Config(TypedDict):
     verbose: bool
 
 
-console = Console()
-
 # parser = argparse.ArgumentParser()
 # parser.add_argument(
 #     "-u", "--url", type=str, required=True, help="想要下载图片的网站链接"
@@ -50,57 +51,70 @@ console = Console()
 
 
 @timing(customizeLabel=lambda time: f"⏱️ 总耗时：{time:.2f} 秒\n")
-async def init():
+async def init(args: CLIArgs, records: TextIO | None = None):
     """
     Downloads pictures from a website using a CSS selector and generates names for them using AI.
 
-    :param url: The URL of the website to download pictures from.
-    :param selector: The CSS selector to use to find pictures on the website.
-    :param output_dir: The directory to save the downloaded pictures to.
-    :param verbose: Whether to print verbose output.
-    :param concurrency: The number of concurrent downloads to use.
+    :param args: The parsed command line options.
+    :param records: Where `--output-format jsonl` writes its records.
     """
 
-    print(f"\n{'[purple] Hello from picture-downloader-ai-namer [/purple]':-^160}\n")
+    from utils.download import start as start_download
+
+    if args.output_format == "jsonl":
+        # 记录由下载器边完成边写出，这里只负责把结果取走
+        async for _ in start_download(args, records):
+            pass
 
-    args = get_args()
+        return
+
+    print(f"\n{'[purple] Hello from picture-downloader-ai-namer [/purple]':-^160}\n")
 
     verbose = args.verbose
-    url = args.url
+    urls = args.urls or [args.url]
     selector = args.selector
     output_dir = args.output_dir
-    concurrency = args.concurrency
+    concurrency = "auto" if args.auto_concurrency else args.concurrency
 
     if verbose:
         print(
-            f"🔍 将从页面 {url!r} 抓取符合 {selector!r} 的图片，保存到 {output_dir!r} 目录下，并发数为 {concurrency}"
+            f"🔍 将从页面 {', '.join(urls)} 抓取符合 {selector!r} 的图片，保存到 {output_dir!r} 目录下，并发数为 {concurrency}"
         )
 
-    result = await start_download()
+    downloaded = 0
 
-    if result is None:
+    # 边下载边输出，不攒成一个大列表
+    async for result in start_download(args):
+        if not downloaded:
+            print("\nPicture list:")
+
+        downloaded += 1
+        print(f"[green]- {result.img_name}[/green]")
+
+    if not downloaded:
         # logger.error("🤔 没有找到任何图片")
         return
 
-    list = [item.img_name for item in result if item is not None]
-
-    print(f"\nPicture list ({len(list)}):")
-    for name in list:
-        print(f"[green]- {name}[/green]")
-    print()
+    print(f"\n共 {downloaded} 张图片\n")
 
     logger.success("🎉 All Done.")
 
 
+def read_url_file(path: Path) -> list[str]:
+    lines = path.read_text(encoding="utf-8").splitlines()
+
+    return [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+
+
 def main(
     url: Annotated[
-        str,
+        list[str] | None,
         typer.Option(
             "--url",
             "-u",
-            help="The URL of the website to download pictures from.",
+            help="The URL of the website to download pictures from. Repeat it to crawl several pages.",
         ),
-    ],
+    ] = None,
     selector: Annotated[
         str,
         typer.Option(
@@ -108,7 +122,7 @@ def main(
             "-s",
             help="The CSS selector to use to find pictures on the website.",
         ),
-    ],
+    ] = "",
     output_dir: Annotated[
         str,
         typer.Option(
@@ -116,51 +130,497 @@ def main(
             "-o",
             help="The directory to save the downloaded pictures to.",
         ),
-    ],
+    ] = "",
+    url_file: Annotated[
+        Path | None,
+        typer.Option(
+            "--url-file",
+            help="A file with one page URL per line to crawl in addition to `--url`. Blank lines and lines starting with `#` are ignored.",
+            exists=True,
+            dir_okay=False,
+        ),
+    ] = None,
+    next_page: Annotated[
+        str | None,
+        typer.Option(
+            "--next-page",
+            help="The CSS selector of the next page link, e.g. `a.next`. Pages are followed up to `--max-depth`.",
+        ),
+    ] = None,
+    max_depth: Annotated[
+        int,
+        typer.Option(
+            "--max-depth",
+            help="How many next pages to follow from each `--url`.",
+            min=0,
+        ),
+    ] = 10,
+    page_concurrency: Annotated[
+        int,
+        typer.Option(
+            "--page-concurrency",
+            help="The number of pages fetched at the same time, overlapped with picture downloads.",
+            min=1,
+        ),
+    ] = 4,
+    stream_parse: Annotated[
+        bool,
+        typer.Option(
+            help="Parse pages incrementally and start downloading as soon as a picture is matched. Selectors with pseudo-classes or sibling combinators always use the full BeautifulSoup parser.",
+        ),
+    ] = True,
     verbose: Annotated[
         bool, typer.Option(help="Whether to print verbose output.")
     ] = False,
+    output_format: Annotated[
+        str,
+        typer.Option(
+            "--output-format",
+            help="`text` renders progress and a summary for humans. `jsonl` writes one JSON record per picture to stdout as soon as it is saved or fails, then a summary record, with all Rich rendering off and logs on stderr.",
+        ),
+    ] = "text",
+    metrics_file: Annotated[
+        str | None,
+        typer.Option(
+            "--metrics-file",
+            help="Write per-stage timing histograms (p50/p95/p99) and retry/failure counters to this file when the run ends. `.prom` or `.txt` writes the Prometheus text format, otherwise JSON.",
+        ),
+    ] = None,
     concurrency: Annotated[
-        int,
+        str,
         typer.Option(
             "--concurrency",
             "-c",
-            help="The number of concurrent downloads to perform.",
+            help="The number of concurrent downloads to perform, or `auto` to grow and shrink it from measured throughput, latency and error rate. Capped by the open file limit (`ulimit -n`).",
+        ),
+    ] = "1",
+    max_concurrency: Annotated[
+        int | None,
+        typer.Option(
+            "--max-concurrency",
+            help="Upper bound for `--concurrency auto`. Defaults to 256, or less if the open file limit is lower.",
             min=1,
-            max=100,
         ),
-    ] = 1,
+    ] = None,
+    max_bandwidth: Annotated[
+        str | None,
+        typer.Option(
+            "--max-bandwidth",
+            help="Cap the total download bandwidth, in bytes per second with an optional K/M/G suffix, e.g. `10M`.",
+        ),
+    ] = None,
     ai_naming: Annotated[
         bool,
         typer.Option(
             help="Whether to use AI to name the pictures. AI is slow if `--no-ai-naming` set the downloading will be faster and you can set higher concurrency"
         ),
     ] = True,
+    naming_backend: Annotated[
+        str,
+        typer.Option(
+            "--naming-backend",
+            help="Who names the pictures: `kimi`, `openai` (any OpenAI-compatible endpoint such as llama.cpp server or vLLM, API key from OPENAI_API_KEY) or `local` (offline slug of the alt text). Naming concurrency and batch size are capped by what the backend supports.",
+        ),
+    ] = "kimi",
+    naming_base_url: Annotated[
+        str | None,
+        typer.Option(
+            "--naming-base-url",
+            help="Base URL of the naming backend, e.g. `http://127.0.0.1:8080/v1` for a local OpenAI-compatible server.",
+        ),
+    ] = None,
+    naming_model: Annotated[
+        str | None,
+        typer.Option(
+            "--naming-model",
+            help="Model name sent to an OpenAI-compatible backend.",
+        ),
+    ] = None,
+    naming_deadline: Annotated[
+        float | None,
+        typer.Option(
+            "--naming-deadline",
+            help="Seconds to wait for an AI name, including batching and queueing for a naming slot. A picture whose name misses the deadline is saved under the file name from its src right away.",
+            min=0.1,
+        ),
+    ] = 30.0,
+    naming_ttft_timeout: Annotated[
+        float | None,
+        typer.Option(
+            "--naming-ttft-timeout",
+            help="Give up an AI naming request that has not streamed its first token after this many seconds.",
+            min=0.1,
+        ),
+    ] = 15.0,
+    naming_read_timeout: Annotated[
+        float,
+        typer.Option(
+            "--naming-read-timeout",
+            help="Seconds to wait between two chunks of an AI answer. AI requests share keep-alive connections per upstream, separate from the download pool.",
+            min=0.1,
+        ),
+    ] = 60.0,
+    naming_late_rename: Annotated[
+        bool,
+        typer.Option(
+            "--naming-late-rename",
+            help="Keep AI naming requests that missed `--naming-deadline` running in the background and rename the saved files when the answers arrive.",
+        ),
+    ] = False,
+    naming_hedge: Annotated[
+        bool,
+        typer.Option(
+            "--naming-hedge",
+            help="Send a duplicate AI naming request when one has been running longer than the p95 latency so far, and use whichever answers first.",
+        ),
+    ] = False,
     count: Annotated[
         int | None,
         typer.Option(
             "--count",
-            help="The number of pictures to download.",
+            help="The number of pictures to download. Page parsing stops as soon as this many pictures are queued.",
             min=1,
-            max=100,
         ),
     ] = None,
+    retries: Annotated[
+        int,
+        typer.Option(
+            help="How many times to retry a picture after a network error, timeout, 429 or 5xx, with exponential backoff and jitter.",
+            min=0,
+        ),
+    ] = 3,
+    connect_timeout: Annotated[
+        float,
+        typer.Option(help="Seconds to wait for a connection to be established."),
+    ] = 10.0,
+    read_timeout: Annotated[
+        float,
+        typer.Option(help="Seconds to wait between two chunks of a response."),
+    ] = 30.0,
+    retry_failed: Annotated[
+        bool,
+        typer.Option(
+            "--retry-failed",
+            help="Only re-download the pictures that failed in the previous run of `--output-dir`, without crawling the pages again.",
+        ),
+    ] = False,
+    per_host_limit: Annotated[
+        int | None,
+        typer.Option(
+            "--per-host-limit",
+            help="The maximum number of simultaneous downloads from the same host. Defaults to `--concurrency`.",
+            min=1,
+        ),
+    ] = None,
+    naming_concurrency: Annotated[
+        int | None,
+        typer.Option(
+            "--naming-concurrency",
+            help="The number of concurrent AI naming requests, independent of downloads. Defaults to `--concurrency`.",
+            min=1,
+        ),
+    ] = None,
+    naming_batch_size: Annotated[
+        int,
+        typer.Option(
+            "--naming-batch-size",
+            help="Name up to this many pictures in a single AI request. Batches are filled from concurrent downloads, so set `--concurrency` at least as high.",
+            min=1,
+        ),
+    ] = 1,
+    ai_rate: Annotated[
+        float,
+        typer.Option(
+            "--ai-rate",
+            help="The initial number of AI naming requests per second. It grows on success and backs off when Kimi throttles.",
+            min=0.05,
+        ),
+    ] = 1.0,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            help="Skip pictures already recorded in the manifest of `--output-dir` and resume partially downloaded files with HTTP Range."
+        ),
+    ] = True,
+    cache: Annotated[
+        bool,
+        typer.Option(
+            help="Whether to cache AI generated names on disk so that re-crawling the same pictures skips the AI entirely."
+        ),
+    ] = True,
+    http_cache: Annotated[
+        bool,
+        typer.Option(
+            help="Whether to cache pages on disk and re-fetch pages and already downloaded pictures with If-None-Match / If-Modified-Since, so that unchanged ones only cost a 304."
+        ),
+    ] = True,
+    cache_dir: Annotated[
+        str | None,
+        typer.Option(
+            "--cache-dir",
+            help="The directory of the AI name cache and the page cache. Defaults to `~/.cache/picture-downloader-ai`.",
+        ),
+    ] = None,
+    skip_descriptive: Annotated[
+        bool,
+        typer.Option(
+            help="Skip AI naming when the filename in `src` is already readable English, e.g. `httpx-help.png`."
+        ),
+    ] = True,
+    convert: Annotated[
+        str | None,
+        typer.Option(
+            "--convert",
+            help=f"Convert downloaded pictures to this format: {', '.join(FORMATS)}. Requires Pillow (`uv sync --extra image`).",
+        ),
+    ] = None,
+    max_size: Annotated[
+        int | None,
+        typer.Option(
+            "--max-size",
+            help="Shrink pictures whose longer side exceeds this many pixels. Requires Pillow.",
+            min=1,
+        ),
+    ] = None,
+    thumbs: Annotated[
+        int | None,
+        typer.Option(
+            "--thumbs",
+            help="Write thumbnails with this longer side in pixels to `<output-dir>/thumbs`. Requires Pillow.",
+            min=1,
+        ),
+    ] = None,
+    strip_exif: Annotated[
+        bool,
+        typer.Option(
+            "--strip-exif",
+            help="Remove EXIF and other metadata from downloaded pictures. Requires Pillow.",
+        ),
+    ] = False,
+    postprocess_workers: Annotated[
+        int | None,
+        typer.Option(
+            "--postprocess-workers",
+            help="Number of processes for post-processing. Defaults to the number of CPUs.",
+            min=1,
+        ),
+    ] = None,
+    write_threads: Annotated[
+        int,
+        typer.Option(
+            "--write-threads",
+            help="Number of threads writing pictures to disk, so a slow or network drive never blocks the event loop.",
+            min=1,
+        ),
+    ] = 4,
+    fsync: Annotated[
+        str,
+        typer.Option(
+            "--fsync",
+            help="`never` leaves flushing to the OS. `file` fsyncs each picture before it gets its final name. `full` also fsyncs the directory after the rename, so a power loss cannot lose it.",
+        ),
+    ] = "never",
+    preallocate: Annotated[
+        bool,
+        typer.Option(
+            "--preallocate",
+            help="Preallocate temporary files from Content-Length to reduce fragmentation. Preallocated files are not kept for resuming.",
+        ),
+    ] = False,
+    output_archive: Annotated[
+        str | None,
+        typer.Option(
+            "--output-archive",
+            help="Append pictures to a `.tar` or `.zip` archive in the output dir instead of one file per picture, e.g. `out.tar`. With a `%d` placeholder such as `out-%05d.zip`, a new shard starts every `--archive-shard-size`. Member offsets are indexed for random access.",
+        ),
+    ] = None,
+    archive_shard_size: Annotated[
+        str,
+        typer.Option(
+            "--archive-shard-size",
+            help="The maximum size of each archive shard, with a K, M or G suffix.",
+        ),
+    ] = "1G",
+    near_dup: Annotated[
+        bool,
+        typer.Option(
+            "--near-dup",
+            help="Detect near-duplicate pictures (same picture at another size or through other CDN parameters) with a perceptual hash, across runs, and keep only the largest one. Requires Pillow.",
+        ),
+    ] = False,
+    near_dup_threshold: Annotated[
+        int,
+        typer.Option(
+            "--near-dup-threshold",
+            help="The maximum Hamming distance between two 64-bit dHashes to treat pictures as near duplicates.",
+            min=0,
+            max=MAX_THRESHOLD,
+        ),
+    ] = DEFAULT_THRESHOLD,
+    near_dup_skip_naming: Annotated[
+        bool,
+        typer.Option(
+            "--near-dup-skip-naming",
+            help="Check for near duplicates before asking AI for a name, so duplicates never cost an AI call. Naming no longer overlaps with downloading.",
+        ),
+    ] = False,
+    prefer: Annotated[
+        str | None,
+        typer.Option(
+            "--prefer",
+            help="Pick one of the candidates from `srcset`, `<picture><source>`, lazy-load attributes and CDN originals: `largest`, `smallest` or `max-width=N`. Without it, `data-src` or `src` is downloaded as before.",
+        ),
+    ] = None,
+    probe_sources: Annotated[
+        bool,
+        typer.Option(
+            "--probe-sources",
+            help="With `--prefer`, send concurrent HEAD requests to compare the Content-Length of candidates instead of trusting their width descriptors alone.",
+        ),
+    ] = False,
 ):
-    args = CLIArgs(
-        url=url,
-        selector=selector,
-        output_dir=output_dir,
-        verbose=verbose,
-        concurrency=concurrency,
-        count=count,
-        ai_naming=ai_naming,
-    )
-    set_args(args)
+    urls = [*(url or []), *(read_url_file(url_file) if url_file else [])]
+
+    if not urls:
+        raise typer.BadParameter("at least one `--url` or `--url-file` is required")
+    if not selector:
+        raise typer.BadParameter("`--selector` is required")
+    if not output_dir:
+        raise typer.BadParameter("`--output-dir` is required")
+    auto_concurrency = concurrency == "auto"
+
+    if not auto_concurrency and not (concurrency.isdigit() and int(concurrency) >= 1):
+        raise typer.BadParameter(
+            f"`--concurrency` must be a positive integer or `auto`, got {concurrency!r}"
+        )
+    bandwidth: float | None = None
+
+    if max_bandwidth:
+        from utils.rate_limit import parse_bandwidth
+
+        try:
+            bandwidth = parse_bandwidth(max_bandwidth)
+        except ValueError as error:
+            raise typer.BadParameter(f"`--max-bandwidth`: {error}")
+    if output_format not in OUTPUT_FORMATS:
+        raise typer.BadParameter(
+            f"`--output-format` must be one of {', '.join(OUTPUT_FORMATS)}, got {output_format!r}"
+        )
+    shard_size: int | None = None
+
+    if output_archive:
+        from utils.archive import ARCHIVE_FORMATS
+        from utils.rate_limit import parse_bytes
+
+        if not output_archive.lower().endswith(ARCHIVE_FORMATS):
+            raise typer.BadParameter(
+                f"`--output-archive` must end with {' or '.join(ARCHIVE_FORMATS)}, got {output_archive!r}"
+            )
+        try:
+            shard_size = int(parse_bytes(archive_shard_size))
+        except ValueError as error:
+            raise typer.BadParameter(f"`--archive-shard-size`: {error}")
+    if fsync not in FSYNC_POLICIES:
+        raise typer.BadParameter(
+            f"`--fsync` must be one of {', '.join(FSYNC_POLICIES)}, got {fsync!r}"
+        )
+    if convert and convert.lower() not in FORMATS:
+        raise typer.BadParameter(
+            f"`--convert` must be one of {', '.join(FORMATS)}, got {convert!r}"
+        )
+    if ai_naming:
+        from utils.naming_backends import BACKENDS
+
+        if naming_backend not in BACKENDS:
+            raise typer.BadParameter(
+                f"`--naming-backend` must be one of {', '.join(BACKENDS)}, got {naming_backend!r}"
+            )
+    if prefer:
+        from utils.sources import parse_preference
+
+        try:
+            parse_preference(prefer)
+        except ValueError as error:
+            raise typer.BadParameter(f"`--prefer`: {error}")
+    if probe_sources and not prefer:
+        raise typer.BadParameter("`--probe-sources` requires `--prefer`")
+    if (convert or max_size or thumbs or strip_exif or near_dup) and not has_pillow():
+        raise typer.BadParameter(
+            "`--convert`, `--max-size`, `--thumbs`, `--strip-exif` and `--near-dup` require Pillow, run `uv sync --extra image`"
+        )
+
+    try:
+        args = CLIArgs(
+            url=urls[0],
+            urls=urls,
+            next_page=next_page,
+            max_depth=max_depth,
+            page_concurrency=page_concurrency,
+            stream_parse=stream_parse,
+            selector=selector,
+            output_dir=output_dir,
+            verbose=verbose,
+            metrics_file=metrics_file,
+            output_format=output_format,
+            progress=output_format == "text",
+            concurrency=AUTO_INITIAL if auto_concurrency else int(concurrency),
+            auto_concurrency=auto_concurrency,
+            max_concurrency=max_concurrency,
+            max_bandwidth=bandwidth,
+            count=count,
+            retries=retries,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retry_failed=retry_failed,
+            convert=convert and convert.lower(),
+            max_size=max_size,
+            thumbs=thumbs,
+            strip_exif=strip_exif,
+            postprocess_workers=postprocess_workers,
+            write_threads=write_threads,
+            fsync=fsync,
+            preallocate=preallocate,
+            output_archive=output_archive,
+            archive_shard_size=shard_size,
+            near_dup=near_dup,
+            near_dup_threshold=near_dup_threshold,
+            near_dup_skip_naming=near_dup_skip_naming,
+            prefer=prefer,
+            probe_sources=probe_sources,
+            ai_naming=ai_naming,
+            naming_backend=naming_backend,
+            naming_base_url=naming_base_url,
+            naming_model=naming_model,
+            naming_deadline=naming_deadline,
+            naming_ttft_timeout=naming_ttft_timeout,
+            naming_read_timeout=naming_read_timeout,
+            naming_late_rename=naming_late_rename,
+            naming_hedge=naming_hedge,
+            per_host_limit=per_host_limit,
+            naming_concurrency=naming_concurrency,
+            naming_batch_size=naming_batch_size,
+            ai_rate=ai_rate,
+            resume=resume,
+            cache=cache,
+            http_cache=http_cache,
+            cache_dir=cache_dir,
+            skip_descriptive=skip_descriptive,
+        )
+    except ValueError as error:
+        raise typer.BadParameter(str(error))
+
+    if output_format == "jsonl":
+        # 标准输出只留给 JSON 记录：关掉 Rich 渲染，日志和其他零散输出改写到标准错误
+        import rich
+
+        rich.reconfigure(quiet=True)
+        logger.remove()
+        logger.add(sys.stderr, level="INFO")
 
     if verbose:
         print(
             {
-                "url": url,
+                "urls": urls,
                 "selector": selector,
                 "output_dir": output_dir,
                 "verbose": verbose,
@@ -169,18 +629,25 @@ def main(
             }
         )
 
-    coroutine = init()
+    import asyncio
+
+    import httpx
+
+    records = sys.stdout
+    quiet = (
+        contextlib.redirect_stdout(sys.stderr)
+        if output_format == "jsonl"
+        else contextlib.nullcontext()
+    )
+
+    coroutine = init(args, records)
 
     try:
-        asyncio.run(coroutine)
+        with quiet:
+            asyncio.run(coroutine)
     except httpx.ConnectError as httpConnectError:
         logger.error(f"{httpConnectError.request} failed: {httpConnectError}")
         sys.exit(1)
-    except requests.exceptions.ConnectionError as connectionError:
-        logger.error(
-            f"{f'{connectionError.request.method} {connectionError.request.url}' if connectionError.request else connectionError.request} failed: {connectionError}"
-        )
-        sys.exit(1)
     except httpx.ReadTimeout as ReadTimeoutError:
         logger.error(f"{ReadTimeoutError.request} timeout: {ReadTimeoutError}")
         sys.exit(1)
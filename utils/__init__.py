@@ -1,19 +1,47 @@
-from .ai import ask_ai_for_image_name
-from .url import extract_filename
-from .timing import timing
-from .download import start
-from .env_settings import get_settings
-from .logger import logger
-from .cli_args import CLIArgs, set_args, get_args
+import importlib
+from typing import TYPE_CHECKING
+
+# 按需导入：`import utils` 本身不加载 httpx、bs4、pydantic-settings，用到哪个功能才导入哪个模块
+_EXPORTS = {
+    "ask_ai_for_image_name": ".ai",
+    "extract_filename": ".url",
+    "timing": ".timing",
+    "start": ".download",
+    "Downloader": ".download",
+    "DownloadResult": ".download",
+    "get_settings": ".env_settings",
+    "logger": ".logger",
+    "CLIArgs": ".cli_args",
+}
+
+if TYPE_CHECKING:
+    from .ai import ask_ai_for_image_name
+    from .cli_args import CLIArgs
+    from .download import Downloader, DownloadResult, start
+    from .env_settings import get_settings
+    from .logger import logger
+    from .timing import timing
+    from .url import extract_filename
+
+
+def __getattr__(name: str):
+    if (module := _EXPORTS.get(name)) is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+
+    return value
+
 
 __all__ = [
     "ask_ai_for_image_name",
     "extract_filename",
     "timing",
     "start",
+    "Downloader",
+    "DownloadResult",
     "get_settings",
     "logger",
-    "get_args",
-    "set_args",
     "CLIArgs",
 ]
@@ -1,38 +1,63 @@
 import asyncio
 import json
+import re
 import textwrap
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable, Sequence
+from contextlib import AsyncExitStack, aclosing
 from http import HTTPMethod
-from typing import AsyncIterator, TypedDict
+from typing import TypedDict
 
 import bs4
 import httpx
 from rich.progress import Progress
 
-from utils.env_settings import get_settings
 from .logger import logger
+from .rate_limit import AdaptiveRateLimiter, parse_retry_after
+from .timing import metrics, timing
+
 # from utils.logging_config import logging
 
 # logger = logging.getLogger(__name__)
 
 
-settings = get_settings()
-
-
 class Img(TypedDict):
     alt: str
     src: str
 
 
+NAMING_RULES = '1. 如果src本身名称已经具备描述性，则直接使用（比如 src="img/httpx-help.png" 则返回 httpx-help.png），2. 否则根据alt生成摘要当做图片文件名，3. 否则请*阅读图片内容*取名字。文件名必须是英文，优先人/动物/物品名称、时间季节、地点等区别于其他图片的标识性独特的词语，比如`alt=塔莎的照片里……花园里种植的是牡丹`则需要出现“塔莎”、“公园”、“牡丹”。文件名不必简短，需要充分描述图片内容，但是不多于12个词，少量使用介词连词等虚词比如with and or，单词小写且用`-`隔开，后缀请从 src 推断。'
+
+# 攒批时最多等待多久凑齐一批
+BATCH_LINGER = 0.2
+
+# 被限流后最多重试几次
+MAX_THROTTLE_RETRIES = 3
+
+# 出现在错误信息中即视为被限流
+THROTTLE_HINTS = ("频率", "rate limit", "too many requests")
+
+KIMI_BASE_URL = "https://kimi.moonshot.cn"
+
+# 提问并返回回答的 token 流，比如 `ask_kimi`；命名后端据此接入不同的模型服务
+Ask = Callable[[str, "AdaptiveRateLimiter | None"], AsyncIterator[str]]
+
+
+@timing(metric="ai_naming_seconds")
 async def ask_ai_for_image_name(
     img: bs4.Tag | Img,
     filename: None | str = None,
     progress: None | Progress = None,
     verbose: bool = False,
+    rate_limiter: AdaptiveRateLimiter | None = None,
+    ask: Ask | None = None,
 ) -> str | None:
     """
     生成图片文件名，如果src本身名称已经具备描述性，则直接使用，否则根据alt生成摘要当做图片文件名，否则请看图内容取名字。
 
     :param img: Tag 对象
+    :param rate_limiter: 所有命名请求共享的限速器
+    :param ask: 向哪个模型提问，默认 `ask_kimi`
     :return: 图片文件名
 
     .. code-block:: python
@@ -40,11 +65,8 @@ async def ask_ai_for_image_name(
         name = ask_ai_for_image_name(img) # => "duck-puppy-me-aside.jpg"
     """
 
-    chat_id = settings.chat_id
-    authorization = settings.authorization
-
     question = textwrap.dedent(f"""
-    生成图片文件名：1. 如果src本身名称已经具备描述性，则直接使用（比如 src="img/httpx-help.png" 则返回 httpx-help.png），2. 否则根据alt生成摘要当做图片文件名，3. 否则请*阅读图片内容*取名字。文件名必须是英文，优先人/动物/物品名称、时间季节、地点等区别于其他图片的标识性独特的词语，比如`alt=塔莎的照片里……花园里种植的是牡丹`则需要出现“塔莎”、“公园”、“牡丹”。文件名不必简短，需要充分描述图片内容，但是不多于12个词，少量使用介词连词等虚词比如with and or，单词小写且用`-`隔开，后缀请从 src 推断。只需输出文件名无需解释。请务必在*5秒内尽快返回*！
+    生成图片文件名：{NAMING_RULES}只需输出文件名无需解释。请务必在*5秒内尽快返回*！
 
     ```
     {img}
@@ -65,35 +87,7 @@ async def ask_ai_for_image_name(
 
     verbose and logger.info(f"{question=!r}")  # type: ignore
 
-    token_stream = read_sse_stream(
-        url=f"https://kimi.moonshot.cn/api/chat/{chat_id}/completion/stream",
-        method=HTTPMethod.POST,
-        headers={
-            "authorization": authorization,
-            "cache-control": "no-cache",
-            "content-type": "application/json",
-            "pragma": "no-cache",
-        },
-        data={
-            "kimiplus_id": "kimi",
-            "extend": {
-                "sidebar": True,
-            },
-            "model": "kimi",
-            "stream": False,
-            # 是否联网搜索
-            "use_search": False,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": question,
-                },
-            ],
-            "refs": [],
-            "history": [],
-            "scene_labels": [],
-        },
-    )
+    token_stream = (ask or ask_kimi)(question, rate_limiter)
 
     try:
         async for token in token_stream:
@@ -110,14 +104,27 @@ async def ask_ai_for_image_name(
             f"🚫 Bad Request {status_code} {error.response_text} while requesting {url!r}."
         )
 
+        metrics.incr("ai_failures_total")
         return None
         # raise error
 
+    # 其他后端的流没有经过 `parse_event()`，畸形的事件同样按 AI 出错处理
+    except (AIStreamError, ValueError, KeyError) as error:
+        logger.error(f"🚫 AI error {error!r} {img=}")
+        metrics.incr("ai_failures_total")
+        return None
+
     except httpx.RequestError as error:
         logger.error(f"❌ {img=}")
         logger.error(
             f"❌ Network error while fetch name from AI: {error.request.url!r}"
         )
+        metrics.incr("ai_failures_total")
+        return None
+
+    except TimeoutError:
+        logger.error(f"⌛ AI 迟迟没有返回第一个 token，放弃命名 {filename}")
+        metrics.incr("ai_failures_total")
         return None
 
     # progress and naming_task and progress.update(
@@ -126,9 +133,381 @@ async def ask_ai_for_image_name(
     #     completed=TOTAL_TOKENS,
     # )  # type: ignore
 
-    print(f"✅ 取名 🤰 {name} 完毕，开始下载")
+    # 和批量命名一样，AI 的原文可能带代码块、换行甚至 `../`，不能直接拼到保存路径上
+    if (sanitized := sanitize_name(name)) is None:
+        logger.error(f"🚫 AI 返回的名字不可用 {name!r} {img=}")
+        return None
+
+    print(f"✅ 取名 🤰 {sanitized} 完毕")
+
+    return sanitized
+
+
+@timing(metric="ai_batch_naming_seconds")
+async def ask_ai_for_image_names(
+    imgs: Sequence[bs4.Tag | Img],
+    filenames: Sequence[str],
+    verbose: bool = False,
+    rate_limiter: AdaptiveRateLimiter | None = None,
+    ask: Ask | None = None,
+) -> list[str | None]:
+    """
+    一次请求为多张图片命名，减少 AI 往返次数。解析失败或缺失的图片返回 None，由调用方回退到 src 中的文件名。
+
+    :param imgs: Tag 对象列表
+    :param filenames: 和 imgs 一一对应的原始文件名，仅用于日志
+    :param rate_limiter: 所有命名请求共享的限速器
+    :param ask: 向哪个模型提问，默认 `ask_kimi`
+    :return: 和 imgs 一一对应的图片文件名
+    """
+
+    snippets = "\n".join(f"{index}. {img}" for index, img in enumerate(imgs, 1))
+    question = textwrap.dedent(f"""
+    为下面 {len(imgs)} 张图片分别生成文件名，规则：{NAMING_RULES}只需输出 JSON 数组无需解释，每张图片一项 {{"i": 图片编号, "name": 文件名}}，共 {len(imgs)} 项。请务必尽快返回！
+
+    ```
+    {snippets}
+    ```
+    """).strip()
+
+    print(f"⏳ AI 正在给 {len(imgs)} 张图片起名字 {', '.join(filenames)}...")
+
+    verbose and logger.info(f"{question=!r}")  # type: ignore
+
+    answer = ""
+
+    try:
+        async for token in (ask or ask_kimi)(question, rate_limiter):
+            answer += token
+
+    except EnhancedHTTPError as error:
+        status_code = error.original_error.response.status_code
+        url = error.original_error.request.url
+        logger.error(
+            f"🚫 Bad Request {status_code} {error.response_text} while requesting {url!r}."
+        )
+
+        metrics.incr("ai_failures_total")
+        return [None] * len(imgs)
+
+    except (AIStreamError, ValueError, KeyError) as error:
+        logger.error(f"🚫 AI error {error!r}")
+        metrics.incr("ai_failures_total")
+        return [None] * len(imgs)
+
+    except httpx.RequestError as error:
+        logger.error(
+            f"❌ Network error while fetch name from AI: {error.request.url!r}"
+        )
+        metrics.incr("ai_failures_total")
+        return [None] * len(imgs)
+
+    except TimeoutError:
+        logger.error(f"⌛ AI 迟迟没有返回第一个 token，放弃命名 {len(imgs)} 张图片")
+        metrics.incr("ai_failures_total")
+        return [None] * len(imgs)
 
-    return name
+    names = parse_batch_names(answer, len(imgs))
+
+    print(f"✅ 取名 🤰 {names} 完毕")
+
+    return names
+
+
+def parse_batch_names(answer: str, count: int) -> list[str | None]:
+    """
+    解析批量命名的 JSON 回答，容忍代码块、前后多余文字。优先按编号 `i` 对齐，
+    只有纯字符串数组且数量恰好一致时才按顺序对齐，否则宁可回退也不张冠李戴。
+
+    .. code-block:: python
+        parse_batch_names('```json\n[{"i": 2, "name": "b.jpg"}]\n```', 2) # => [None, "b.jpg"]
+    """
+
+    names: list[str | None] = [None] * count
+
+    if (match := re.search(r"\[.*\]", answer, re.DOTALL)) is None:
+        logger.warning(f"🤔 AI 批量命名没有返回 JSON 数组 {answer=}")
+        return names
+
+    try:
+        items = json.loads(match.group())
+    except json.JSONDecodeError:
+        logger.warning(f"🤔 AI 批量命名返回的 JSON 无法解析 {answer=}")
+        return names
+
+    if all(isinstance(item, str) for item in items):
+        if len(items) != count:
+            logger.warning(f"🤔 AI 批量命名数量不一致 {len(items)=} {count=}")
+            return names
+
+        return [sanitize_name(item) for item in items]
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+
+        index, name = item.get("i"), item.get("name")
+
+        if isinstance(index, int) and 1 <= index <= count and isinstance(name, str):
+            names[index - 1] = sanitize_name(name)
+
+    return names
+
+
+def sanitize_name(name: str) -> str | None:
+    """去掉代码块、引号、空白和路径分隔符，防止 AI 返回的名字跳出保存目录。"""
+
+    name = re.sub(r"^```[\w-]*\s*|\s*```$", "", name.strip())
+    name = name.strip().strip("`'\"").strip()
+    name = re.sub(r"[\\/:*?\"<>|\s]+", "-", name).strip(".-")
+
+    return name or None
+
+
+class NameBatcher:
+    """
+    把并发到达的命名请求攒成一批再调用 AI：凑满 `batch_size` 张或等待 `linger` 秒后发送。
+
+    .. code-block:: python
+        batcher = NameBatcher(10, send=ask_ai_for_image_names)
+        name = await batcher.name(img, "01vttarjy7ow5sdayn6tah3731.jpg")
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        send: Callable[
+            [list[bs4.Tag | Img], list[str]], Awaitable[list[str | None]]
+        ] = ask_ai_for_image_names,
+        linger: float = BATCH_LINGER,
+    ) -> None:
+        self.batch_size = batch_size
+        self.send = send
+        self.linger = linger
+        self.pending: list[tuple[bs4.Tag | Img, str, asyncio.Future[str | None]]] = []
+        self.timer: asyncio.TimerHandle | None = None
+        self.requests = 0
+        self.tasks: set[asyncio.Task] = set()
+
+    async def name(self, img: bs4.Tag | Img, filename: str) -> str | None:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[str | None] = loop.create_future()
+        self.pending.append((img, filename, future))
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.linger, self.flush)
+
+        return await future
+
+    def flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        batch, self.pending = self.pending, []
+
+        if batch:
+            task = asyncio.create_task(self.dispatch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def dispatch(
+        self, batch: list[tuple[bs4.Tag | Img, str, asyncio.Future[str | None]]]
+    ) -> None:
+        self.requests += 1
+        names: list[str | None] = [None] * len(batch)
+
+        try:
+            names = await self.send(
+                [img for img, _, _ in batch], [filename for _, filename, _ in batch]
+            )
+        # 网络、解析错误和整批超时；没人等这个任务的结果，抛出去只会变成“Task exception was never retrieved”
+        except Exception as error:  # noqa: BLE001
+            logger.error(f"❌ AI 批量命名失败 {error!r}")
+        finally:
+            # 取消照样抛出，但等待的调用方不能一直等下去，回退到 src 中的文件名
+            for (_, _, future), name in zip(batch, names):
+                if not future.done():
+                    future.set_result(name)
+
+
+async def ask_kimi(
+    question: str,
+    rate_limiter: AdaptiveRateLimiter | None = None,
+    base_url: str = KIMI_BASE_URL,
+    chat_id: str | None = None,
+    authorization: str | None = None,
+    ttft_timeout: float | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> AsyncIterator[str]:
+    """
+    向 Kimi 网页版的对话接口提问，返回回答的 token 流。`chat_id`、`authorization` 默认从 `.env` 读取。
+    `ttft_timeout` 秒内没有收到第一个 token 时抛出 TimeoutError。
+    传入 `client` 时复用它的连接池，否则每次请求临时建立连接。
+
+    传入 `rate_limiter` 时先领令牌再请求；被限流（429 或“发送频率过高”）则让限速器退避后重试，
+    最多 `MAX_THROTTLE_RETRIES` 次。
+    """
+
+    if chat_id is None or authorization is None:
+        # pydantic-settings 导入和读取 .env 都不便宜，只在真正请求 Kimi 时才做
+        from .env_settings import get_settings
+
+        settings = get_settings()
+        chat_id = chat_id or settings.chat_id
+        authorization = authorization or settings.authorization
+
+    def open_stream() -> AsyncGenerator[str]:
+        return read_sse_stream(
+            url=f"{base_url}/api/chat/{chat_id}/completion/stream",
+            method=HTTPMethod.POST,
+            headers={
+                "authorization": authorization,
+                "cache-control": "no-cache",
+                "content-type": "application/json",
+                "pragma": "no-cache",
+            },
+            data={
+                "kimiplus_id": "kimi",
+                "extend": {
+                    "sidebar": True,
+                },
+                "model": "kimi",
+                "stream": False,
+                # 是否联网搜索
+                "use_search": False,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": question,
+                    },
+                ],
+                "refs": [],
+                "history": [],
+                "scene_labels": [],
+            },
+            client=client,
+        )
+
+    async for token in ask_with_retry(open_stream, rate_limiter, ttft_timeout):
+        yield token
+
+
+async def ask_openai(
+    question: str,
+    rate_limiter: AdaptiveRateLimiter | None = None,
+    base_url: str = "http://127.0.0.1:8080/v1",
+    model: str = "default",
+    api_key: str | None = None,
+    ttft_timeout: float | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> AsyncIterator[str]:
+    """
+    向 OpenAI 兼容的 `/chat/completions` 接口（OpenAI、vLLM、llama.cpp server 等）流式提问。
+    限流重试、`client` 和 `ask_kimi` 相同。
+    """
+
+    headers = {"content-type": "application/json"}
+
+    if api_key:
+        headers["authorization"] = f"Bearer {api_key}"
+
+    def open_stream() -> AsyncGenerator[str]:
+        return read_openai_stream(
+            url=f"{base_url.rstrip('/')}/chat/completions",
+            method=HTTPMethod.POST,
+            headers=headers,
+            data={
+                "model": model,
+                "stream": True,
+                "messages": [{"role": "user", "content": question}],
+            },
+            client=client,
+        )
+
+    async for token in ask_with_retry(open_stream, rate_limiter, ttft_timeout):
+        yield token
+
+
+async def ask_with_retry(
+    open_stream: Callable[[], AsyncGenerator[str]],
+    rate_limiter: AdaptiveRateLimiter | None = None,
+    ttft_timeout: float | None = None,
+) -> AsyncIterator[str]:
+    """
+    被限流时让限速器退避后重新 `open_stream()`，并记录首 token 耗时。
+    领到令牌后 `ttft_timeout` 秒内没有第一个 token 就断开连接并抛出 TimeoutError，卡住的流不会一直占着并发名额。
+    """
+
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+
+        answered = False
+        start = time.perf_counter()
+
+        try:
+            async with aclosing(open_stream()) as stream:
+                async with asyncio.timeout(ttft_timeout):
+                    token = await anext(stream, None)
+
+                while token is not None:
+                    if not answered:
+                        metrics.observe("ai_ttft_seconds", time.perf_counter() - start)
+
+                    answered = True
+                    yield token
+                    token = await anext(stream, None)
+
+        except TimeoutError:
+            metrics.incr("ai_timeouts_total")
+            raise
+
+        except (EnhancedHTTPError, AIStreamError) as error:
+            # 已经输出过 token 的回答不能重试，否则会重复
+            if (
+                rate_limiter is None
+                or answered
+                or not is_throttled(error)
+                or attempt == MAX_THROTTLE_RETRIES
+            ):
+                raise
+
+            rate_limiter.on_throttle(get_retry_after(error))
+            metrics.incr("ai_retries_total")
+            continue
+
+        if rate_limiter is not None:
+            rate_limiter.on_success()
+
+        return
+
+
+def is_throttled(error: "EnhancedHTTPError | AIStreamError") -> bool:
+    if isinstance(error, EnhancedHTTPError):
+        if error.original_error.response.status_code == 429:
+            return True
+
+        text = error.response_text
+    else:
+        text = str(error)
+
+    return any(hint in text.lower() for hint in THROTTLE_HINTS)
+
+
+def get_retry_after(error: "EnhancedHTTPError | AIStreamError") -> float | None:
+    if isinstance(error, EnhancedHTTPError):
+        return parse_retry_after(
+            error.original_error.response.headers.get("retry-after")
+        )
+
+    return None
+
+
+class AIStreamError(Exception):
+    """SSE 流中的 error 事件，比如“发送频率过高，请稍后再试”。"""
 
 
 class EnhancedHTTPError(Exception):
@@ -140,36 +519,115 @@ class EnhancedHTTPError(Exception):
         super().__init__(original_error)
 
 
-async def read_sse_stream(
+async def read_sse_data(
     url: str,
     method: HTTPMethod,
     headers: dict | None = None,
     data: dict | None = None,
+    client: httpx.AsyncClient | None = None,
 ) -> AsyncIterator[str]:
-    async with httpx.AsyncClient() as client:
-        async with client.stream(
-            method,
-            url,
-            headers=headers,
-            json=data,
-        ) as response:
-            try:
-                response.raise_for_status()
-            except httpx.HTTPStatusError as error:
-                raise EnhancedHTTPError(error, await error.response.aread())
-
-            async for line in response.aiter_lines():
-                logger.debug(f"{line=}")
-                if line.startswith("data:"):
-                    data = json.loads(line[6:])
-                    if not data:
-                        continue
-
-                    if data["event"] == "cmpl":
-                        yield data["text"]
-                    if "error" in data:
-                        # logger.error("error while reading stream", data)
-                        raise Exception(data["error"])
+    """
+    发送请求并逐个产出 SSE 事件 `data:` 后的内容。
+
+    :param client: 复用的连接池（见 `ClientRegistry`），不传时为这一次请求临时创建，
+        每次都要重新握手
+    """
+
+    async with AsyncExitStack() as stack:
+        if client is None:
+            client = await stack.enter_async_context(httpx.AsyncClient())
+
+        response = await stack.enter_async_context(
+            client.stream(
+                method,
+                url,
+                headers=headers,
+                json=data,
+            )
+        )
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as error:
+            raise EnhancedHTTPError(error, await error.response.aread())
+
+        async for line in response.aiter_lines():
+            logger.debug(f"{line=}")
+            if line.startswith("data:"):
+                yield line[5:].strip()
+
+
+async def read_sse_stream(
+    url: str,
+    method: HTTPMethod,
+    headers: dict | None = None,
+    data: dict | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> AsyncGenerator[str]:
+    """Kimi 的事件格式：`{"event": "cmpl", "text": ...}`，出错时带 `error`。"""
+
+    async for payload in read_sse_data(url, method, headers, data, client):
+        event = parse_event(payload)
+        if not event:
+            continue
+
+        if event.get("event") == "cmpl":
+            if not isinstance(text := event.get("text"), str):
+                raise AIStreamError(f"cmpl 事件缺少 text {payload[:80]!r}")
+
+            yield text
+        if "error" in event:
+            # logger.error("error while reading stream", data)
+            raise AIStreamError(event["error"])
+
+
+async def read_openai_stream(
+    url: str,
+    method: HTTPMethod,
+    headers: dict | None = None,
+    data: dict | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> AsyncGenerator[str]:
+    """OpenAI 的事件格式：`choices[0].delta.content`，以 `[DONE]` 结束。"""
+
+    done = False
+
+    async for payload in read_sse_data(url, method, headers, data, client):
+        # 读完响应体连接才会回到连接池，`[DONE]` 之后不能直接返回
+        if done or payload == "[DONE]":
+            done = True
+            continue
+
+        event = parse_event(payload)
+        if not event:
+            continue
+
+        if "error" in event:
+            error = event["error"]
+            raise AIStreamError(
+                error.get("message", error) if isinstance(error, dict) else error
+            )
+
+        for choice in event.get("choices") or []:
+            if content := (choice.get("delta") or {}).get("content"):
+                yield content
+
+
+def parse_event(payload: str) -> dict | None:
+    """解析 SSE 事件的 JSON，无法解析或不是对象时抛出 AIStreamError，交给和 error 事件相同的回退逻辑。"""
+
+    if not payload:
+        return None
+
+    try:
+        event = json.loads(payload)
+    except ValueError as error:
+        raise AIStreamError(f"无法解析的 SSE 事件 {payload[:80]!r}") from error
+
+    if event is not None and not isinstance(event, dict):
+        raise AIStreamError(f"SSE 事件不是对象 {payload[:80]!r}")
+
+    return event
 
 
 async def main():
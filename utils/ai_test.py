@@ -0,0 +1,175 @@
+import asyncio
+from http import HTTPMethod
+
+import pytest
+
+from .ai import Img, NameBatcher, parse_batch_names, sanitize_name
+
+
+def test_parse_batch_names():
+    assert parse_batch_names(
+        '```json\n[{"i": 1, "name": "duck.jpg"}, {"i": 2, "name": "puppy.jpg"}]\n```', 2
+    ) == ["duck.jpg", "puppy.jpg"]
+
+    # 缺项或乱序时按编号对齐
+    assert parse_batch_names(
+        '[{"i": 3, "name": "c.jpg"}, {"i": 1, "name": "a.jpg"}]', 3
+    ) == [
+        "a.jpg",
+        None,
+        "c.jpg",
+    ]
+
+    assert parse_batch_names('好的：["a.jpg", "b.jpg"]', 2) == ["a.jpg", "b.jpg"]
+
+    # 纯字符串数组数量不一致时无法对齐，全部回退
+    assert parse_batch_names('["a.jpg"]', 2) == [None, None]
+    assert parse_batch_names("抱歉，我无法查看图片", 2) == [None, None]
+    assert parse_batch_names("[not json]", 1) == [None]
+
+
+def test_sanitize_name():
+    assert sanitize_name(" `duck-puppy.jpg` ") == "duck-puppy.jpg"
+    assert sanitize_name("../../etc/passwd") == "etc-passwd"
+    assert sanitize_name("  ") is None
+    assert sanitize_name("```text\nduck.jpg\n```\n") == "duck.jpg"
+
+
+def test_single_image_name_is_sanitized():
+    from .ai import ask_ai_for_image_name
+
+    async def ask(question, rate_limiter=None):
+        for token in ("```\n", "../../", "duck.jpg", "\n```\n"):
+            yield token
+
+    name = asyncio.run(
+        ask_ai_for_image_name(Img(alt="", src="a.jpg"), "a.jpg", ask=ask)
+    )
+
+    assert name == "duck.jpg"
+
+
+def test_name_batcher():
+    calls: list[list[str]] = []
+
+    async def send(imgs, filenames):
+        calls.append(filenames)
+        return [f"named-{filename}" for filename in filenames]
+
+    async def main():
+        batcher = NameBatcher(3, send=send, linger=0.01)
+        imgs = [Img(src=f"{index}.jpg", alt="") for index in range(5)]
+
+        return await asyncio.gather(
+            *(batcher.name(img, img["src"]) for img in imgs)
+        ), batcher.requests
+
+    names, requests = asyncio.run(main())
+
+    assert names == [f"named-{index}.jpg" for index in range(5)]
+    assert requests == 2
+    assert calls == [["0.jpg", "1.jpg", "2.jpg"], ["3.jpg", "4.jpg"]]
+
+
+def test_name_batcher_falls_back_when_send_times_out():
+    async def send(imgs, filenames):
+        raise TimeoutError
+
+    async def main():
+        batcher = NameBatcher(2, send=send)
+        future = asyncio.get_running_loop().create_future()
+
+        # 没人等 dispatch 任务的结果，不能把超时抛出去
+        await batcher.dispatch([(Img(src="a.jpg", alt=""), "a.jpg", future)])
+
+        return future.result()
+
+    assert asyncio.run(main()) is None
+
+
+def test_malformed_sse_event_falls_back(monkeypatch):
+    from . import ai
+
+    async def read_sse_data(*args):
+        yield '{"event": "cmpl", "text": "duck"}'
+        yield '{"event": "cmpl"}'
+
+    monkeypatch.setattr(ai, "read_sse_data", read_sse_data)
+
+    async def read() -> list[str]:
+        return [token async for token in ai.read_sse_stream("", HTTPMethod.POST)]
+
+    with pytest.raises(ai.AIStreamError):
+        asyncio.run(read())
+
+    async def ask(question, rate_limiter=None):
+        yield "duck"
+        raise KeyError("text")
+
+    name = asyncio.run(
+        ai.ask_ai_for_image_name(Img(alt="", src="a.jpg"), "a.jpg", ask=ask)
+    )
+
+    assert name is None
+
+
+def test_ask_kimi_retries_when_throttled(monkeypatch):
+    from . import ai
+    from .rate_limit import AdaptiveRateLimiter
+
+    attempts = []
+
+    async def read_sse_stream(**kwargs):
+        attempts.append(kwargs["url"])
+
+        if len(attempts) == 1:
+            raise ai.AIStreamError("发送频率过高，请稍后再试")
+
+        yield "duck.jpg"
+
+    monkeypatch.setattr(ai, "read_sse_stream", read_sse_stream)
+    ai.metrics.reset()
+
+    async def main():
+        limiter = AdaptiveRateLimiter(rate=100)
+        # 显式传入凭据，不读开发者本机的 .env
+        stream = ai.ask_kimi("?", limiter, chat_id="mock", authorization="Bearer mock")
+        tokens = [token async for token in stream]
+
+        return tokens, limiter
+
+    tokens, limiter = asyncio.run(main())
+
+    assert tokens == ["duck.jpg"]
+    assert len(attempts) == 2
+    assert limiter.throttled == 1
+    assert ai.metrics.counters["ai_retries_total"] == 1
+    assert ai.metrics.histograms["ai_ttft_seconds"].count == 1
+
+
+def test_ttft_timeout_closes_a_stuck_stream():
+    from . import ai
+
+    closed = []
+
+    async def stuck_stream():
+        try:
+            await asyncio.sleep(10)
+            yield "never.jpg"
+        finally:
+            closed.append(True)
+
+    ai.metrics.reset()
+
+    async def main():
+        return await ai.ask_ai_for_image_name(
+            Img(alt="", src="https://example.com/0.jpg"),
+            "0.jpg",
+            ask=lambda question, rate_limiter=None: ai.ask_with_retry(
+                stuck_stream, ttft_timeout=0.05
+            ),
+        )
+
+    assert asyncio.run(main()) is None
+    assert closed == [True]
+    assert ai.metrics.counters["ai_timeouts_total"] == 1
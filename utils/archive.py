@@ -0,0 +1,226 @@
+import asyncio
+import io
+import json
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TypedDict
+
+from .logger import logger
+from .writer import gen_uniq_filename
+
+ARCHIVE_INDEX_NAME = ".picture-downloader-archive.jsonl"
+ARCHIVE_FORMATS = (".tar", ".zip")
+# 文件名中带 `%d` 占位符时按大小分片
+DEFAULT_SHARD_SIZE = 1024**3
+TAR_BLOCK = tarfile.BLOCKSIZE
+
+
+class ArchiveRecord(TypedDict):
+    # 相对 output_dir 的 `<分片>/<成员名>`，和清单中的 path 一致
+    path: str
+    archive: str
+    name: str
+    # 成员内容在分片中的字节偏移和长度，成员不压缩，可以直接 seek 读取
+    offset: int
+    size: int
+
+
+class ArchiveIndex:
+    """
+    `output_dir` 下的归档成员索引（JSON Lines，只追加），按 `DownloadResult.full_path` 随机读取单张图片，
+    不用从头扫描 tar 或解析 zip 的中央目录。
+
+    .. code-block:: python
+        index = ArchiveIndex(output_dir)
+        index.read(result.full_path) # => b"\\xff\\xd8..."
+    """
+
+    def __init__(self, save_dir: str | Path) -> None:
+        self.save_dir = Path(save_dir)
+        self.path = self.save_dir / ARCHIVE_INDEX_NAME
+        self.by_path: dict[str, ArchiveRecord] = {}
+
+        if self.path.exists():
+            self.load()
+
+    def load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record: ArchiveRecord = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ 忽略归档索引中损坏的一行 {line[:80]!r}")
+                    continue
+
+                self.by_path[record["path"]] = record
+
+    def record(self, full_path: str | Path) -> ArchiveRecord | None:
+        path = Path(full_path)
+
+        if path.is_relative_to(self.save_dir):
+            path = path.relative_to(self.save_dir)
+
+        return self.by_path.get(path.as_posix())
+
+    def size(self, full_path: str | Path) -> int | None:
+        """成员存在且所在分片没有被截断时返回大小。"""
+
+        if (record := self.record(full_path)) is None:
+            return None
+
+        shard = self.save_dir / record["archive"]
+
+        if (
+            not shard.exists()
+            or shard.stat().st_size < record["offset"] + record["size"]
+        ):
+            return None
+
+        return record["size"]
+
+    def read(self, full_path: str | Path) -> bytes:
+        if (record := self.record(full_path)) is None:
+            raise FileNotFoundError(full_path)
+
+        with open(self.save_dir / record["archive"], "rb") as f:
+            f.seek(record["offset"])
+            return f.read(record["size"])
+
+    def open(self, full_path: str | Path) -> io.BytesIO:
+        return io.BytesIO(self.read(full_path))
+
+
+class ArchiveSink:
+    """
+    把下载完的图片追加到 tar 或 zip 归档，代替每张图片一个文件，海量小图不再挤占 inode 和元数据。
+    `pattern` 中带 `%d` 占位符（比如 `out-%05d.zip`）时，分片超过 `shard_size` 后换下一个。
+
+    成员以不压缩的方式写入（图片本身已经压缩），偏移记到 `ArchiveIndex`，返回的路径是
+    `<output_dir>/<分片>/<成员名>`，和松散文件一样可以放进 `DownloadResult.full_path` 和清单。
+    追加在单独的线程中按顺序进行，同名成员由归档自己换一个不冲突的名字。
+
+    .. code-block:: python
+        sink = ArchiveSink(output_dir, "out-%05d.tar", shard_size=1024**3)
+        full_path = await sink.add(Path(output_dir) / ".abc.part", "duck.jpg") # => Path("output/out-00000.tar/duck.jpg")
+        sink.close()
+    """
+
+    def __init__(
+        self,
+        save_dir: str | Path,
+        pattern: str,
+        shard_size: int | None = None,
+    ) -> None:
+        suffix = Path(pattern).suffix.lower()
+
+        if suffix not in ARCHIVE_FORMATS:
+            raise ValueError(
+                f"archive must end with {' or '.join(ARCHIVE_FORMATS)}, got {pattern!r}"
+            )
+
+        self.save_dir = Path(save_dir)
+        self.pattern = pattern
+        self.format = suffix
+        self.sharded = "%" in pattern
+        self.shard_size = (shard_size or DEFAULT_SHARD_SIZE) if self.sharded else None
+        self.index = ArchiveIndex(save_dir)
+        # 整个运行期间保持打开，由 `close()` 关闭
+        self.index_file = open(self.index.path, "a", encoding="utf-8")  # noqa: SIM115
+        self.names = {
+            (record["archive"], record["name"])
+            for record in self.index.by_path.values()
+        }
+        # 追加必须串行，单线程既不阻塞事件循环又不用加锁
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+        # 再次运行时接着最后一个分片写
+        self.shard = 0
+
+        while (
+            self.sharded and (self.save_dir / self.shard_name(self.shard + 1)).exists()
+        ):
+            self.shard += 1
+
+        self.archive: tarfile.TarFile | zipfile.ZipFile | None = None
+
+    def shard_name(self, number: int) -> str:
+        return self.pattern % number if self.sharded else self.pattern
+
+    async def add(self, src: Path, name: str) -> Path:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.add_sync, src, name)
+
+    def add_sync(self, src: Path, name: str) -> Path:
+        size = src.stat().st_size
+        archive = self.open_shard(size)
+        shard = self.shard_name(self.shard)
+
+        if (shard, name) in self.names:
+            name = gen_uniq_filename(name)
+
+        if isinstance(archive, tarfile.TarFile):
+            info = archive.gettarinfo(str(src), arcname=name)
+
+            with open(src, "rb") as f:
+                archive.addfile(info, f)
+
+            # 写完后的位置减去按块补齐的内容长度，就是内容的起点
+            offset = archive.offset - -(-size // TAR_BLOCK) * TAR_BLOCK
+            fileobj = archive.fileobj
+        else:
+            archive.write(src, name, compress_type=zipfile.ZIP_STORED)
+            offset = archive.start_dir - archive.getinfo(name).compress_size
+            fileobj = archive.fp
+
+        # 让 tar / zip 的缓冲落到文件里，索引里的偏移随时可读
+        if fileobj is not None:
+            fileobj.flush()
+
+        src.unlink()
+
+        record = ArchiveRecord(
+            path=f"{shard}/{name}", archive=shard, name=name, offset=offset, size=size
+        )
+        self.index_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.index_file.flush()
+        self.index.by_path[record["path"]] = record
+        self.names.add((shard, name))
+
+        return self.save_dir / shard / name
+
+    def open_shard(self, incoming: int) -> tarfile.TarFile | zipfile.ZipFile:
+        path = self.save_dir / self.shard_name(self.shard)
+
+        if (
+            self.shard_size is not None
+            and path.exists()
+            and path.stat().st_size > 0
+            and path.stat().st_size + incoming > self.shard_size
+        ):
+            self.close_shard()
+            self.shard += 1
+            path = self.save_dir / self.shard_name(self.shard)
+            logger.debug(f"🗃️ 归档分片 {path.name}")
+
+        if self.archive is None:
+            mode = "a" if path.exists() and path.stat().st_size > 0 else "w"
+            # 分片写满或运行结束时由 `close_shard()` 关闭
+            self.archive = (
+                tarfile.open(path, mode)  # noqa: SIM115
+                if self.format == ".tar"
+                else zipfile.ZipFile(path, mode)
+            )
+
+        return self.archive
+
+    def close_shard(self) -> None:
+        if self.archive is not None:
+            # 写入 tar 的结束块 / zip 的中央目录
+            self.archive.close()
+            self.archive = None
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        self.close_shard()
+        self.index_file.close()
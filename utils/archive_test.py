@@ -0,0 +1,65 @@
+import asyncio
+import tarfile
+import zipfile
+
+from .archive import ArchiveIndex, ArchiveSink
+
+
+def add_all(sink: ArchiveSink, tmp_path, files: dict[str, bytes]) -> list:
+    async def main():
+        paths = []
+
+        for name, content in files.items():
+            part = tmp_path / f".{name}.part"
+            part.write_bytes(content)
+            paths.append(await sink.add(part, name))
+
+        return paths
+
+    return asyncio.run(main())
+
+
+def test_tar_members_are_indexed_for_random_access(tmp_path):
+    sink = ArchiveSink(tmp_path, "out.tar")
+    paths = add_all(sink, tmp_path, {"a.jpg": b"a" * 700, "b.jpg": b"b" * 3})
+    # 同名成员换一个名字，不覆盖
+    [duplicate] = add_all(sink, tmp_path, {"a.jpg": b"c"})
+    sink.close()
+
+    assert paths == [tmp_path / "out.tar" / "a.jpg", tmp_path / "out.tar" / "b.jpg"]
+    assert duplicate.parent == tmp_path / "out.tar" and duplicate.name != "a.jpg"
+    assert not list(tmp_path.glob(".*.part"))
+
+    index = ArchiveIndex(tmp_path)
+    assert index.read(paths[0]) == b"a" * 700
+    assert index.read(paths[1]) == b"b" * 3
+    assert index.read(duplicate) == b"c"
+
+    with tarfile.open(tmp_path / "out.tar") as tar:
+        assert tar.getnames() == ["a.jpg", "b.jpg", duplicate.name]
+
+
+def test_zip_shards_rotate_by_size_and_resume(tmp_path):
+    sink = ArchiveSink(tmp_path, "out-%03d.zip", shard_size=350)
+    add_all(
+        sink, tmp_path, {f"{index}.jpg": bytes([index]) * 100 for index in range(3)}
+    )
+    sink.close()
+
+    # 再次运行时接着最后一个分片写
+    sink = ArchiveSink(tmp_path, "out-%03d.zip", shard_size=350)
+    [path] = add_all(sink, tmp_path, {"3.jpg": b"3" * 100})
+    sink.close()
+
+    assert path == tmp_path / "out-001.zip" / "3.jpg"
+
+    with zipfile.ZipFile(tmp_path / "out-000.zip") as first:
+        assert first.namelist() == ["0.jpg", "1.jpg"]
+
+    with zipfile.ZipFile(tmp_path / "out-001.zip") as second:
+        assert second.namelist() == ["2.jpg", "3.jpg"]
+        assert second.read("2.jpg") == bytes([2]) * 100
+
+    index = ArchiveIndex(tmp_path)
+    assert index.read("out-000.zip/1.jpg") == bytes([1]) * 100
+    assert index.read(path) == b"3" * 100
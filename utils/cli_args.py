@@ -1,43 +1,102 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+OUTPUT_FORMATS = ("text", "jsonl")
+FSYNC_POLICIES = ("never", "file", "full")
 
 
 @dataclass
 class CLIArgs:
     """
-    Dataclass to store CLI arguments
+    一次下载的配置。命令行解析后构造，也可以直接传给 `Downloader`。
     """
 
     url: str
     output_dir: str
     selector: str
 
+    # 所有种子页面，`url` 为其中第一个
+    urls: list[str] = field(default_factory=list)
+    next_page: str | None = None
+    max_depth: int = 10
+    page_concurrency: int = 4
+    stream_parse: bool = True
+
     concurrency: int = 1
+    # 按吞吐、延迟和失败率自动伸缩下载并发，`concurrency` 为初始值，`max_concurrency` 为上限
+    auto_concurrency: bool = False
+    max_concurrency: int | None = None
+    # 下载总带宽上限（字节/秒）
+    max_bandwidth: float | None = None
+    per_host_limit: int | None = None
+    naming_concurrency: int | None = None
+    naming_batch_size: int = 1
+    ai_rate: float = 1.0
     count: int | None = None
+    # 下载失败的重试次数与超时
+    retries: int = 3
+    connect_timeout: float = 10.0
+    read_timeout: float = 30.0
+    # 只重放上次失败的图片
+    retry_failed: bool = False
+    # 下载后处理，需要 Pillow
+    convert: str | None = None
+    max_size: int | None = None
+    thumbs: int | None = None
+    strip_exif: bool = False
+    postprocess_workers: int | None = None
+    # 写盘线程数；fsync 策略：never / file（发布前刷临时文件）/ full（再刷目录）；按 Content-Length 预分配临时文件
+    write_threads: int = 4
+    fsync: str = "never"
+    preallocate: bool = False
+    # 写进 tar / zip 归档而不是每张图片一个文件，文件名带 `%d` 时按 `archive_shard_size` 字节分片
+    output_archive: str | None = None
+    archive_shard_size: int | None = None
+    # 感知哈希去重，需要 Pillow
+    near_dup: bool = False
+    near_dup_threshold: int = 4
+    near_dup_skip_naming: bool = False
+    # 多个候选地址（srcset、<picture>）时的挑选偏好：largest / smallest / max-width=N
+    prefer: str | None = None
+    probe_sources: bool = False
     verbose: bool = False
+    # 终端进度条，嵌入服务或在同一进程中并发运行时关闭
+    progress: bool = True
+    # text：Rich 渲染的终端输出；jsonl：每张图片一行 JSON，最后一行为汇总
+    output_format: str = "text"
+    # 运行结束时导出各阶段指标，.prom / .txt 为 Prometheus 文本格式，否则为 JSON
+    metrics_file: str | None = None
     ai_naming: bool = True
+    # 命名后端：kimi / openai（任意 OpenAI 兼容接口）/ local（离线 slug）
+    naming_backend: str = "kimi"
+    naming_base_url: str | None = None
+    naming_model: str | None = None
+    # 单次 AI 命名的截止时间和首 token 超时（秒），超时回退到 src 中的文件名，None 表示一直等
+    naming_deadline: float | None = 30.0
+    naming_ttft_timeout: float | None = 15.0
+    # AI 连接池的读超时（两次收到数据之间），和下载的 `read_timeout` 分开
+    naming_read_timeout: float = 60.0
+    # 超时的命名留在后台，AI 答复后重命名已保存的文件
+    naming_late_rename: bool = False
+    # 超过历史 p95 耗时时发对冲请求
+    naming_hedge: bool = False
+    skip_descriptive: bool = True
+    resume: bool = True
+    cache: bool = True
+    # 页面按 ETag / Last-Modified 条件请求，未变化时不重新下载
+    http_cache: bool = True
+    cache_dir: str | None = None
 
-
-args: CLIArgs = CLIArgs("", "", "")
-
-
-def set_args(cli_args: CLIArgs) -> CLIArgs:
-    """
-    Function to set CLI arguments
-    """
-
-    global args
-    args = cli_args
-
-    # print("CLI arguments set", args)
-
-    return args
-
-
-def get_args() -> CLIArgs:
-    """
-    Function to get CLI arguments
-    """
-
-    # print("CLI arguments get", args)
-
-    return args
+    def __post_init__(self) -> None:
+        # 构造和 `Downloader.run()` 按次覆盖（`dataclasses.replace`）时都会校验，不只是命令行
+        # 归档只能追加，不能就地转换、替换或重命名成员
+        if self.output_archive and (
+            self.convert
+            or self.max_size
+            or self.thumbs
+            or self.strip_exif
+            or self.near_dup
+            or self.naming_late_rename
+        ):
+            raise ValueError(
+                "`--output-archive` cannot be combined with post-processing, `--near-dup` or `--naming-late-rename`"
+            )
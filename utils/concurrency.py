@@ -0,0 +1,152 @@
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator
+
+from .logger import logger
+from .timing import metrics
+
+# `--concurrency auto` 的初始 worker 数和默认上限
+AUTO_INITIAL = 4
+AUTO_MAX_WORKERS = 256
+
+# 每个下载占用的文件描述符：socket、临时文件，续传时还有校验头文件
+FDS_PER_DOWNLOAD = 3
+# 留给页面抓取、AI 连接、缓存数据库、日志等
+FD_RESERVE = 64
+
+# 窗口内失败比例超过它视为拥塞
+ERROR_THRESHOLD = 0.1
+# 吞吐比上个窗口提升不到 5% 且延迟超过基线的 2 倍时，说明瓶颈不在并发数
+THROUGHPUT_GAIN = 0.05
+LATENCY_FACTOR = 2.0
+
+
+def fd_budget(
+    per_download: int = FDS_PER_DOWNLOAD, reserve: int = FD_RESERVE
+) -> int | None:
+    """
+    按进程的文件描述符软限制（`ulimit -n`）估算最多能同时下载多少张图片，
+    没有 `resource` 模块（Windows）或不限制时返回 None。
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+    if soft == resource.RLIM_INFINITY:
+        return None
+
+    return max(1, (soft - reserve) // per_download)
+
+
+class AdaptiveConcurrency:
+    """
+    可伸缩的下载并发，类似 TCP 拥塞控制：每完成一个窗口（约等于当前并发数）的下载评估一次，
+    失败率超过 `ERROR_THRESHOLD`（超时、429、5xx）时并发减半；吞吐还在增长或延迟接近基线时增加
+    （慢启动阶段翻倍，之后加一）；吞吐不再增长而延迟明显上升（带宽已经打满，或者 `--max-bandwidth`
+    在限速）时减一。第一次减小并发后退出慢启动。
+
+    .. code-block:: python
+        limiter = AdaptiveConcurrency(initial=4, max_limit=64)
+
+        async with limiter.slot():
+            result = await download(...)
+            # 在名额内上报，释放名额时等待的 worker 按新的上限重新检查
+            limiter.on_complete(result.size, elapsed, ok=True)
+    """
+
+    def __init__(
+        self,
+        initial: int = AUTO_INITIAL,
+        min_limit: int = 1,
+        max_limit: int = AUTO_MAX_WORKERS,
+        decrease: float = 0.5,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = min(max(initial, min_limit), self.max_limit)
+        self.decrease = decrease
+        self.active = 0
+        self.condition = asyncio.Condition()
+
+        # 当前窗口的统计
+        self.window_started = time.monotonic()
+        self.completed = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        # 上个窗口的吞吐，以及见过的最低平均延迟（基线）
+        self.throughput = 0.0
+        self.base_latency: float | None = None
+        self.peak = self.limit
+        self.slow_start = True
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+    def on_complete(self, size: int, seconds: float, ok: bool = True) -> None:
+        """
+        :param size: 本次传输的字节数
+        :param seconds: 本次下载耗时
+        :param ok: False 表示因拥塞类错误失败（超时、429、5xx），404 之类不算
+        """
+
+        self.completed += 1
+        self.errors += not ok
+        self.bytes += size
+        self.seconds += seconds
+
+        if self.completed >= self.limit:
+            self.adjust(time.monotonic())
+
+    def adjust(self, now: float) -> None:
+        elapsed = max(now - self.window_started, 1e-6)
+        throughput = self.bytes / elapsed
+        latency = self.seconds / self.completed
+        error_rate = self.errors / self.completed
+
+        if self.base_latency is None or latency < self.base_latency:
+            self.base_latency = latency
+
+        previous = self.limit
+
+        if error_rate > ERROR_THRESHOLD:
+            self.limit = max(self.min_limit, int(self.limit * self.decrease))
+            self.slow_start = False
+        elif (
+            throughput >= self.throughput * (1 + THROUGHPUT_GAIN)
+            or latency <= self.base_latency * LATENCY_FACTOR
+        ):
+            step = self.limit if self.slow_start else 1
+            self.limit = min(self.max_limit, self.limit + step)
+        else:
+            self.limit = max(self.min_limit, self.limit - 1)
+            self.slow_start = False
+
+        self.peak = max(self.peak, self.limit)
+        metrics.observe("download_concurrency", self.limit)
+
+        if self.limit != previous:
+            logger.debug(
+                f"🤹 并发 {previous} -> {self.limit}（吞吐 {throughput / 1024:.0f} KiB/s，"
+                f"延迟 {latency:.2f}s，失败率 {error_rate:.0%}）"
+            )
+
+        self.throughput = throughput
+        self.window_started = now
+        self.completed = self.errors = self.bytes = 0
+        self.seconds = 0.0
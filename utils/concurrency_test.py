@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from .concurrency import AdaptiveConcurrency, fd_budget
+from .rate_limit import BandwidthLimiter, parse_bandwidth
+
+
+def complete_window(limiter: AdaptiveConcurrency, size: int, seconds: float, ok=True):
+    for _ in range(limiter.limit):
+        limiter.on_complete(size, seconds, ok)
+
+
+def test_adaptive_concurrency_grows_and_backs_off():
+    limiter = AdaptiveConcurrency(initial=4, max_limit=64)
+
+    # 慢启动：吞吐增长、延迟稳定时每个窗口翻倍
+    complete_window(limiter, 1024 * 1024, 0.1)
+    complete_window(limiter, 1024 * 1024, 0.1)
+
+    assert limiter.limit == 16
+
+    # 失败率超过阈值：减半并退出慢启动
+    complete_window(limiter, 0, 1.0, ok=False)
+
+    assert limiter.limit == 8
+    assert limiter.peak == 16
+
+    # 之后每个窗口只加一
+    complete_window(limiter, 1024 * 1024, 0.1)
+
+    assert limiter.limit == 9
+
+
+def test_adaptive_concurrency_shrinks_when_latency_rises_without_throughput():
+    limiter = AdaptiveConcurrency(initial=4, max_limit=8)
+    limiter.throughput = float("inf")
+    limiter.base_latency = 0.1
+
+    # 吞吐没有增长，延迟是基线的 10 倍：说明在排队，减一
+    complete_window(limiter, 1, 1.0)
+
+    assert limiter.limit == 3
+
+
+def test_adaptive_concurrency_slot_respects_limit():
+    limiter = AdaptiveConcurrency(initial=2, max_limit=2)
+    peak = 0
+
+    async def job():
+        nonlocal peak
+
+        async with limiter.slot():
+            peak = max(peak, limiter.active)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(job() for _ in range(6)))
+
+    asyncio.run(main())
+
+    assert peak == 2
+    assert limiter.active == 0
+
+
+def test_fd_budget():
+    budget = fd_budget()
+
+    assert budget is None or budget >= 1
+
+
+def test_bandwidth_limiter():
+    limiter = BandwidthLimiter(parse_bandwidth("100K"))
+
+    async def main():
+        start = time.perf_counter()
+
+        # 桶里有一秒的量，再传 20 KiB 需要约 0.2 秒
+        for _ in range(6):
+            await limiter.consume(20 * 1024)
+
+        return time.perf_counter() - start
+
+    assert 0.15 < asyncio.run(main()) < 0.5
+
+
+def test_parse_bandwidth():
+    assert parse_bandwidth("500K") == 500 * 1024
+    assert parse_bandwidth("1.5MB/s") == 1.5 * 1024 * 1024
+    assert parse_bandwidth("2048") == 2048
@@ -1,35 +1,196 @@
 import asyncio
-from datetime import datetime
+import contextvars
+import hashlib
+import json
+import sys
+import time
+from collections import Counter
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, aclosing, nullcontext
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import NamedTuple
+from typing import Any, NamedTuple, Self, TextIO
+from uuid import uuid4
 
 import httpx
-import requests
 from bs4 import BeautifulSoup, Tag
 from rich import print
-from rich.progress import Progress, TaskID
-
-from utils import ask_ai_for_image_name, extract_filename
-
+from rich.progress import Progress
+
+from .ai import Img, NameBatcher, sanitize_name
+from .archive import ArchiveSink
+from .cli_args import CLIArgs
+from .concurrency import AUTO_MAX_WORKERS, AdaptiveConcurrency, fd_budget
+from .frontier import Frontier, crawl
+from .hedge import hedge_delay, hedged
+from .html_stream import StreamExtractor, StreamSelector, compile_stream_selectors
+from .http_cache import HttpCache, conditional_headers, expires_at, is_storable
+from .http_client import CHUNK_SIZE, ClientRegistry, HostLimiter, create_client
 from .logger import logger
-from .cli_args import get_args
+from .manifest import Manifest, ManifestRecord
+from .name_cache import NameCache, default_cache_dir
+from .naming_backends import KimiBackend, NamingBackend, create_backend
+from .naming_heuristic import is_descriptive_filename
+from .near_dup import NearDupIndex, PhashRecord, Signature, dhash
+from .postprocess import PostProcessOptions, PostProcessor
+from .rate_limit import AdaptiveRateLimiter, BandwidthLimiter
+from .retry import (
+    DEFAULT_RETRIES,
+    CircuitBreaker,
+    RetryQueue,
+    is_retryable,
+    with_retry,
+)
+from .sources import Preference, parse_preference, select_source
 
 # from .logging_config import logging
-from .url import get_full_url
+from .timing import Metrics, current_metrics, metrics, timing
+from .url import extract_filename, get_full_url
+from .writer import FileWriter, update_digest
 
 # logger = logger.getLogger(__name__)
 
+# 待下载队列的容量为并发数的倍数，队列满时页面解析暂停
+QUEUE_FACTOR = 2
+
+# 超过截止时间后转入后台的命名请求最多再等多久
+LATE_NAMING_TIMEOUT = 120.0
+
 
 class DownloadResult(NamedTuple):
     img_name: str
     img_url: str
     full_path: Path
+    # 保存下来的文件字节数（后处理之后）
+    size: int = 0
+    # 从开始处理这张图片到落盘的秒数
+    seconds: float = 0.0
+    # 名字的来源，见 `Naming`；沿用已有文件（跳过、304、内容重复、近似重复）时为 existing
+    naming: str = "existing"
+
+
+class Naming(NamedTuple):
+    name: str
+    # 命名后端的名字（kimi / openai / local）、cache、descriptive、src（未开启 AI 命名）
+    # 或 fallback（命名失败或超过截止时间，沿用 src 中的文件名）
+    source: str
+
+
+class Job(NamedTuple):
+    index: int
+    img: Tag
+    page_url: str
+
+
+class Fetched(NamedTuple):
+    part_path: Path
+    size: int
+    digest: str
+    etag: str | None = None
+    last_modified: str | None = None
+    expires_at: float = 0.0
+
+
+class NotModified(NamedTuple):
+    """条件请求返回 304 时服务器下发的校验头和新鲜期。"""
+
+    etag: str | None
+    last_modified: str | None
+    expires_at: float
+
+
+@dataclass
+class RunContext:
+    """
+    一次运行共享的资源，由 `start()` 创建后传给每个下载任务。
+    """
+
+    client: httpx.AsyncClient
+    host_limiter: HostLimiter
+    naming_semaphore: asyncio.Semaphore
+    naming_backend: NamingBackend = field(default_factory=KimiBackend)
+    # 只约束 AI 命名请求，下载不受影响
+    rate_limiter: AdaptiveRateLimiter = field(default_factory=AdaptiveRateLimiter)
+    name_cache: NameCache | None = None
+    name_batcher: NameBatcher | None = None
+    manifest: Manifest | None = None
+    http_cache: HttpCache | None = None
+    skip_descriptive: bool = True
+    # 跳过清单中已完成的图片，并用 Range 续传上次未下载完的文件
+    resume: bool = True
+    # 已完成的图片过了新鲜期后发条件请求确认远端是否变化
+    revalidate: bool = True
+    # 下载失败时的重试次数，以及按域名的熔断器
+    retries: int = DEFAULT_RETRIES
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    # 重试后仍然失败的图片，运行结束时写入 output_dir 供 `--retry-failed` 重放
+    retry_queue: RetryQueue | None = None
+    # 下载完成后在进程池中处理图片
+    postprocessor: PostProcessor | None = None
+    # 在线程池中写临时文件并原子地发布为最终文件名
+    writer: FileWriter = field(default_factory=FileWriter)
+    # 不为空时图片追加到 tar / zip 归档，`full_path` 为 `<output_dir>/<分片>/<成员名>`
+    archive: ArchiveSink | None = None
+    # 感知哈希索引，近似重复的图片只保留最大的版本
+    near_dups: NearDupIndex | None = None
+    near_dup_skip_naming: bool = False
+    # 从 srcset / `<picture>` / 懒加载属性中按偏好挑选地址，None 时沿用 data-src 或 src
+    prefer: Preference | None = None
+    # 挑选前并发 HEAD 候选地址比较 Content-Length
+    probe_sources: bool = False
+    # AI 命名最多等多少秒，超时立即回退到 src 中的文件名，None 表示一直等
+    naming_deadline: float | None = None
+    # 超时的命名请求留在后台，AI 答复后再重命名已保存的文件
+    late_rename: bool = False
+    # 单张命名超过历史 p95 耗时仍未返回时再发一次同样的请求，取先返回的
+    hedge: bool = False
+
+    # 超过截止时间、仍在后台等待 AI 答复的命名，按图片地址索引
+    late_names: dict[str, asyncio.Future[str | None]] = field(default_factory=dict)
+    # 后台重命名任务，运行结束前全部等待完成
+    renames: set[asyncio.Task[None]] = field(default_factory=set)
+
+    # `--concurrency auto` 时按吞吐、延迟和失败率伸缩下载并发，None 时固定为 `concurrency`
+    auto_concurrency: AdaptiveConcurrency | None = None
+    # 所有下载共享的带宽上限
+    bandwidth: BandwidthLimiter | None = None
+    # `--output-format jsonl` 时每张图片完成（或失败）立即写一行 JSON，结束时写汇总；None 时用 Rich 输出
+    records: TextIO | None = None
+
+    # 正在下载的 URL，同一 URL 重复出现时不共用续传临时文件
+    fetching: set[str] = field(default_factory=set)
+    # succeeded / failed / ai_calls_saved / skipped / not_modified / updated / resumed / deduped 等计数
+    stats: Counter[str] = field(default_factory=Counter)
+    # 本次运行的各阶段指标，并发的运行互不干扰
+    metrics: Metrics = field(default_factory=Metrics)
 
 
 async def download(
-    img: Tag, index: int, save_dir: str, progress: Progress, url: str, ai_naming: bool
+    img: Tag,
+    index: int,
+    save_dir: str,
+    progress: Progress,
+    url: str,
+    ai_naming: bool,
+    ctx: RunContext,
 ) -> None | DownloadResult:
-    img_url = img.get("data-src", img.get("src"))
+    """
+    三个阶段：下载字节到临时文件和 AI 命名同时进行，两者都完成后原子地重命名到 `save_dir`。
+    总耗时约为 max(下载, 命名) 而不是两者之和。
+
+    清单中已完成的图片：新鲜期内或没有校验头时直接跳过；否则发条件请求，304 时什么都不做，
+    远端内容变了则覆盖原文件，沿用原来的名字。
+    """
+
+    if ctx.prefer is None:
+        img_url = img.get("data-src", img.get("src"))
+    else:
+        img_url = await select_source(
+            img,
+            url,
+            ctx.prefer,
+            (ctx.client, ctx.host_limiter) if ctx.probe_sources else None,
+        )
 
     # progress.console.print(f"Working on job #{index + 1}...")
 
@@ -37,169 +198,1481 @@ async def download(
         logger.warning(f"🚫 #{index + 1} no src found", img)
         return
 
-    img_url = str(img_url)
-    img_name = await get_name(img, img_url, progress, ai_naming=ai_naming)
+    # 缓存以完整 URL 为键，避免不同站点的相对路径互相冲突
+    img_url = get_full_url(url, str(img_url))
+
+    if (
+        ctx.resume
+        and ctx.manifest is not None
+        and (record := ctx.manifest.completed(img_url)) is not None
+    ):
+        return await revalidate(img_url, record, save_dir, ctx)
+
+    def start_naming() -> asyncio.Task[Naming]:
+        return asyncio.create_task(get_name(img, img_url, progress, ai_naming, ctx))
+
+    # 要先确认不是近似重复再决定是否请求 AI 时，命名推迟到下载之后
+    naming = (
+        None
+        if ctx.near_dups is not None and ctx.near_dup_skip_naming
+        else start_naming()
+    )
+
+    try:
+        fetched = await with_retry(
+            img_url,
+            lambda: fetch_stage(img_url, save_dir, ctx),
+            ctx.retries,
+            ctx.breaker,
+        )
+        # 没有条件请求头，不会是 304
+        assert isinstance(fetched, Fetched)
+
+        phash_record = None
+
+        if ctx.near_dups is not None:
+            with metrics.time("phash_seconds"):
+                signature = await asyncio.to_thread(dhash, fetched.part_path)
+
+            if signature is not None:
+                phash_record, duplicate = await ctx.near_dups.claim(signature, img_url)
+
+                if duplicate:
+                    if naming is not None:
+                        naming.cancel()
+
+                    try:
+                        return await keep_largest(
+                            img_url, fetched, signature, phash_record, ctx
+                        )
+                    finally:
+                        ctx.near_dups.release(phash_record)
+    except BaseException:
+        if naming is not None:
+            naming.cancel()
+        raise
+
+    try:
+        img_name, naming_source = await (naming or start_naming())
+
+        logger.debug(f"{img_url, img_name}")
+
+        full_path, created = await commit_stage(fetched, save_dir, img_name, ctx)
+        size = fetched.size
+
+        if created and ctx.postprocessor is not None:
+            full_path = await postprocess(full_path, ctx)
+            # 清单记录处理后的大小用于校验文件完好，哈希仍是下载内容的，用于去重
+            size = full_path.stat().st_size
+    except BaseException:
+        if phash_record is not None:
+            ctx.near_dups.discard(phash_record)
+        raise
+
+    if phash_record is not None:
+        if created:
+            ctx.near_dups.publish(phash_record, full_path)
+        else:
+            ctx.near_dups.discard(phash_record)
+            phash_record = None
+
+    if ctx.manifest is not None:
+        ctx.manifest.add(
+            img_url,
+            full_path,
+            size,
+            fetched.digest,
+            fetched.etag,
+            fetched.last_modified,
+            fetched.expires_at,
+        )
+
+    if ai_naming and ctx.name_cache is not None:
+        ctx.name_cache.set_digest(img_url, get_alt(img), fetched.digest)
+
+    if (late := ctx.late_names.pop(img_url, None)) is not None:
+        if created:
+            task = asyncio.create_task(
+                rename_late(late, img, img_url, full_path, phash_record, ctx)
+            )
+            ctx.renames.add(task)
+            task.add_done_callback(ctx.renames.discard)
+        else:
+            # 内容和已有文件相同，文件名不归这张图片管
+            late.cancel()
+
+    return DownloadResult(
+        full_path.name,
+        img_url,
+        full_path,
+        size,
+        naming=naming_source if created else "existing",
+    )
+
 
-    logger.debug(f"{img_url, img_name}")
+async def rename_late(
+    naming: asyncio.Future[str | None],
+    img: Tag,
+    img_url: str,
+    full_path: Path,
+    phash_record: PhashRecord | None,
+    ctx: RunContext,
+) -> None:
+    """
+    命名超过截止时间的图片先以 src 中的文件名保存，AI 稍后答复时再改成 AI 起的名字，
+    清单、感知哈希索引和命名缓存随之更新。扩展名沿用已保存的文件（后处理可能转换过格式），缩略图保持原名。
+    """
+
+    try:
+        async with asyncio.timeout(LATE_NAMING_TIMEOUT):
+            img_name = await naming
+    # 超时，或者后端抛出的任何错误，已保存的文件保持原名
+    except Exception as error:  # noqa: BLE001
+        logger.debug(f"⌛ {full_path.name} 的 AI 命名在后台也没有完成：{error!r}")
+        return
 
-    full_path: Path = Path(save_dir) / img_name
+    if not img_name:
+        return
 
-    if Path.exists(full_path):
-        logger.debug(f"{full_path} already exists")
-        img_name = gen_uniq_filename(img_name)
+    target = full_path.with_name(Path(img_name).stem + full_path.suffix)
 
-    full_path: Path = Path(save_dir) / img_name
+    if target == full_path or not full_path.exists():
+        return
 
-    logger.debug(f"📥 {img_url} -> {full_path}")
+    target, _ = await ctx.writer.commit(full_path, target)
+    ctx.stats["renamed_late"] += 1
+    logger.info(f"✏️ {full_path.name} -> {target.name}（AI 命名迟到）")
+
+    if ctx.records is not None:
+        write_record(
+            ctx.records,
+            {
+                "type": "rename",
+                "url": img_url,
+                "name": target.name,
+                "path": str(target),
+                "previous_path": str(full_path),
+            },
+        )
+
+    record = ctx.manifest.by_url.get(img_url) if ctx.manifest is not None else None
+
+    if ctx.manifest is not None and record is not None:
+        ctx.manifest.add(
+            img_url,
+            target,
+            record["size"],
+            record["sha256"],
+            record["etag"],
+            record["last_modified"],
+            record.get("expires_at", 0.0),
+        )
+
+    if ctx.near_dups is not None and phash_record is not None:
+        ctx.near_dups.update(
+            phash_record, target, phash_record["pixels"], phash_record["url"]
+        )
+
+    if ctx.name_cache is not None:
+        ctx.name_cache.put(
+            img_url, get_alt(img), img_name, record["sha256"] if record else None
+        )
+
+
+async def keep_largest(
+    img_url: str,
+    fetched: Fetched,
+    signature: Signature,
+    match: PhashRecord,
+    ctx: RunContext,
+) -> DownloadResult:
+    """
+    近似重复的图片只保留像素最多的版本。更大的新版本覆盖旧文件并沿用旧文件名（扩展名随新内容，
+    换扩展名后的名字被别的文件占用时另起一个不冲突的名字），否则丢弃新下载的文件。
+    两个 URL 在清单中都指向保留下来的文件。调用方已经用 `NearDupIndex.claim()` 占住了 `match`。
+    """
+
+    assert ctx.near_dups is not None
+
+    existing = ctx.near_dups.full_path(match)
+    previous_url = match["url"]
+    replaced = signature.pixels > match["pixels"]
+
+    if replaced:
+        logger.debug(f"🪞 {img_url} is a larger variant of {match['path']}, replace it")
+        ctx.stats["near_dups_replaced"] += 1
+
+        suffix = Path(extract_filename(img_url)).suffix or existing.suffix
+
+        if suffix == existing.suffix:
+            full_path = existing
+            await ctx.writer.replace(fetched.part_path, full_path)
+        else:
+            full_path, _ = await ctx.writer.commit(
+                fetched.part_path, existing.with_suffix(suffix)
+            )
+            existing.unlink(missing_ok=True)
+
+        if ctx.postprocessor is not None:
+            full_path = await postprocess(full_path, ctx)
+
+        ctx.near_dups.update(match, full_path, signature.pixels, img_url)
+    else:
+        logger.debug(f"🪞 {img_url} is a near duplicate of {match['path']}, skip it")
+        ctx.stats["near_dups"] += 1
+
+        fetched.part_path.unlink()
+        full_path = existing
+
+    size = full_path.stat().st_size
+
+    if ctx.manifest is not None:
+        ctx.manifest.add(
+            img_url,
+            full_path,
+            size,
+            fetched.digest,
+            fetched.etag,
+            fetched.last_modified,
+            fetched.expires_at,
+        )
+
+        # 被替换的旧 URL 改为指向新文件，下次运行不会把它当成丢失重新下载
+        if replaced and (previous := ctx.manifest.by_url.get(previous_url)):
+            ctx.manifest.add(
+                previous_url,
+                full_path,
+                size,
+                previous["sha256"],
+                previous["etag"],
+                previous["last_modified"],
+                previous.get("expires_at", 0.0),
+            )
+
+    return DownloadResult(full_path.name, img_url, full_path, size)
+
+
+async def revalidate(
+    img_url: str, record: ManifestRecord, save_dir: str, ctx: RunContext
+) -> DownloadResult:
+    assert ctx.manifest is not None
+
+    full_path = ctx.manifest.full_path(record)
+    validators = conditional_headers(record["etag"], record["last_modified"])
+
+    if (
+        not ctx.revalidate
+        or not validators
+        or time.time() < record.get("expires_at", 0.0)
+    ):
+        logger.debug(f"⏭️ {img_url} already downloaded to {record['path']}")
+        ctx.stats["skipped"] += 1
 
-    img_url = get_full_url(url, img_url)
+        return DownloadResult(full_path.name, img_url, full_path, record["size"])
 
-    img_r = requests.get(img_url)
+    fetched = await with_retry(
+        img_url,
+        lambda: fetch_stage(img_url, save_dir, ctx, validators),
+        ctx.retries,
+        ctx.breaker,
+    )
 
-    with open(full_path, "wb") as f:
-        f.write(img_r.content)
+    if isinstance(fetched, NotModified):
+        logger.debug(f"🆗 {img_url} not modified since {record['path']}")
+        ctx.stats["not_modified"] += 1
+
+        etag = fetched.etag or record["etag"]
+        last_modified = fetched.last_modified or record["last_modified"]
+
+        # 服务器下发了新的新鲜期或校验头才记下来，下次连条件请求都省了；否则不必再追加一行
+        if fetched.expires_at or (etag, last_modified) != (
+            record["etag"],
+            record["last_modified"],
+        ):
+            ctx.manifest.add(
+                img_url,
+                full_path,
+                record["size"],
+                record["sha256"],
+                etag,
+                last_modified,
+                fetched.expires_at,
+            )
+
+        return DownloadResult(full_path.name, img_url, full_path, record["size"])
+
+    logger.debug(f"🔄 {img_url} changed, overwrite {record['path']}")
+    ctx.stats["updated"] += 1
+
+    if ctx.archive is not None:
+        # 归档只能追加，新内容作为新成员写入，清单改为指向它
+        full_path = await ctx.archive.add(fetched.part_path, full_path.name)
+    else:
+        await ctx.writer.replace(fetched.part_path, full_path)
+
+    if ctx.postprocessor is not None:
+        full_path = await postprocess(full_path, ctx)
+        fetched = fetched._replace(size=full_path.stat().st_size)
+
+    ctx.manifest.add(
+        img_url,
+        full_path,
+        fetched.size,
+        fetched.digest,
+        fetched.etag or record["etag"],
+        fetched.last_modified or record["last_modified"],
+        fetched.expires_at,
+    )
 
-    return DownloadResult(img_name, img_url, full_path)
+    return DownloadResult(full_path.name, img_url, full_path, fetched.size)
+
+
+async def fetch_stage(
+    img_url: str,
+    save_dir: str,
+    ctx: RunContext,
+    validators: dict[str, str] | None = None,
+) -> Fetched | NotModified:
+    """
+    流式下载到 `save_dir` 下的隐藏临时文件，此时还不知道最终文件名。写盘在 `ctx.writer` 的线程池中进行。
+
+    临时文件名由 URL 决定，中断后再次运行时用 `Range` + `If-Range` 续传；
+    服务器不支持或文件已变化时返回 200，从头下载。
+
+    :param validators: 条件请求头，服务器返回 304 时不下载，返回 `NotModified`
+    """
+
+    if img_url in ctx.fetching:
+        part_path = Path(save_dir) / f".{uuid4().hex}.part"
+    else:
+        part_path = (
+            Path(save_dir) / f".{hashlib.sha1(img_url.encode()).hexdigest()}.part"
+        )
+
+    meta_path = part_path.with_name(part_path.name + ".json")
+    sha256 = hashlib.sha256()
+    size = 0
+    headers: dict[str, str] = dict(validators or {})
+
+    if (
+        not validators
+        and ctx.resume
+        and part_path.exists()
+        and (part_validator := read_part_validator(meta_path))
+    ):
+        headers = {
+            "range": f"bytes={part_path.stat().st_size}-",
+            "if-range": part_validator,
+        }
+
+    while True:
+        logger.debug(f"📥 {img_url} -> {part_path} {headers}")
+
+        ctx.fetching.add(img_url)
+        start = time.perf_counter()
+        transferred = 0
+
+        try:
+            # 流式写盘，不把整张图片留在内存里，也不阻塞事件循环
+            async with (
+                ctx.host_limiter(img_url),
+                ctx.client.stream("GET", img_url, headers=headers) as img_r,
+            ):
+                # 只有续传的 Range 请求才是临时文件的问题；重来时不带 Range，最多重来一次
+                restart = (
+                    img_r.status_code == httpx.codes.REQUESTED_RANGE_NOT_SATISFIABLE
+                    and "range" in headers
+                )
+
+                if restart:
+                    # 临时文件已损坏或比远端还长，丢弃后从头下载
+                    part_path.unlink(missing_ok=True)
+                    meta_path.unlink(missing_ok=True)
+                else:
+                    if img_r.status_code == httpx.codes.NOT_MODIFIED:
+                        return NotModified(
+                            img_r.headers.get("etag"),
+                            img_r.headers.get("last-modified"),
+                            expires_at(img_r.headers),
+                        )
+
+                    img_r.raise_for_status()
+
+                    etag = img_r.headers.get("etag")
+                    last_modified = img_r.headers.get("last-modified")
+                    fresh_until = expires_at(img_r.headers)
+                    resumed = img_r.status_code == httpx.codes.PARTIAL_CONTENT
+                    length = img_r.headers.get("content-length", "")
+                    expected = (
+                        int(length)
+                        if ctx.writer.preallocate and not resumed and length.isdigit()
+                        else None
+                    )
+
+                    if resumed:
+                        logger.debug(f"⏯️ resume {img_url} from {headers['range']}")
+                        ctx.stats["resumed"] += 1
+                        size = await ctx.writer.run(update_digest, part_path, sha256)
+                    elif (etag or last_modified) and expected is None:
+                        # 预分配的临时文件中断后长度不可信，不留校验头，下次从头下载
+                        await ctx.writer.run(
+                            meta_path.write_text, etag or last_modified, "utf-8"
+                        )
+
+                    async with ctx.writer.open(
+                        part_path, append=resumed, size=expected
+                    ) as f:
+                        async for chunk in img_r.aiter_bytes(CHUNK_SIZE):
+                            await f.write(chunk)
+                            sha256.update(chunk)
+                            size += len(chunk)
+                            transferred += len(chunk)
+
+                            if ctx.bandwidth is not None:
+                                await ctx.bandwidth.consume(len(chunk))
+
+                    write_seconds = f.seconds
+        except BaseException:
+            # 有校验头的临时文件留着下次续传
+            if not meta_path.exists():
+                part_path.unlink(missing_ok=True)
+            raise
+        finally:
+            ctx.fetching.discard(img_url)
+
+        if not restart:
+            break
+
+        # 退出流和域名并发名额之后再重来，`--per-host-limit 1` 时不会等自己占着的名额
+        headers = dict(validators or {})
+
+    meta_path.unlink(missing_ok=True)
+
+    elapsed = time.perf_counter() - start
+    metrics.observe("download_seconds", elapsed)
+    metrics.observe("write_seconds", write_seconds)
+    metrics.incr("download_bytes_total", transferred)
+    if elapsed > 0:
+        metrics.observe("download_bytes_per_second", transferred / elapsed)
+
+    return Fetched(
+        part_path, size, sha256.hexdigest(), etag, last_modified, fresh_until
+    )
 
 
-def gen_uniq_filename(filename: str) -> str:
-    stem = Path(filename).stem
-    suffix = Path(filename).suffix
+def read_part_validator(meta_path: Path) -> str | None:
+    """读取临时文件对应的 ETag 或 Last-Modified，没有校验头无法安全续传。"""
 
-    return stem + "-" + gen_time() + suffix
+    try:
+        return meta_path.read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
 
 
-def gen_time() -> str:
-    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+async def commit_stage(
+    fetched: Fetched, save_dir: str, img_name: str, ctx: RunContext
+) -> tuple[Path, bool]:
+    """
+    把临时文件原子地发布为最终文件名，半截的图片永远不会以最终文件名出现。
+    内容和已有文件完全相同时不再另存一份带时间戳的副本，同名而内容不同时由 `ctx.writer` 换一个名字。
 
+    :return: (最终路径, 是否新建了文件)
+    """
+
+    part_path = fetched.part_path
+
+    if ctx.manifest is not None and (
+        duplicate := ctx.manifest.find_by_hash(fetched.digest)
+    ):
+        logger.debug(f"🔁 {img_name} is identical to {duplicate['path']}")
+        ctx.stats["deduped"] += 1
+        part_path.unlink()
+
+        return ctx.manifest.full_path(duplicate), False
+
+    if ctx.archive is not None:
+        return await ctx.archive.add(part_path, img_name), True
+
+    full_path, created = await ctx.writer.commit(
+        part_path, Path(save_dir) / img_name, fetched.digest
+    )
+
+    if not created:
+        logger.debug(f"🔁 {full_path} already exists with identical content")
+        ctx.stats["deduped"] += 1
+
+    return full_path, created
+
+
+async def postprocess(full_path: Path, ctx: RunContext) -> Path:
+    """在进程池中转换格式、缩放、生成缩略图，处理失败时保留原图。"""
+
+    assert ctx.postprocessor is not None
+
+    try:
+        with metrics.time("postprocess_seconds"):
+            processed = await ctx.postprocessor(full_path, ctx.writer)
+    # 无法解码或写入（OSError）、参数不支持（ValueError）、进程池崩溃（BrokenProcessPool 是 RuntimeError）
+    except (OSError, ValueError, RuntimeError) as error:
+        logger.warning(f"⚠️ 处理 {full_path.name} 失败，保留原图：{error!r}")
+        ctx.stats["postprocess_failed"] += 1
+        return full_path
+
+    ctx.stats["postprocessed"] += 1
+
+    return processed.path
+
+
+def get_alt(img: Tag) -> str:
+    return str(img.get("alt") or "")
+
+
+def tag_attrs(img: Tag) -> dict[str, str]:
+    # bs4 把 class 等多值属性解析成列表
+    return {
+        name: " ".join(value) if isinstance(value, list) else str(value)
+        for name, value in img.attrs.items()
+    }
+
+
+@timing(metric="get_name_seconds")
+async def get_name(
+    img: Tag, img_url: str, progress: Progress, ai_naming: bool, ctx: RunContext
+) -> Naming:
+    """
+    命名阶段，和下载阶段同时进行。文件名已经可读或命中命名缓存时完全不访问网络。
+    """
 
-# @timing()
-async def get_name(img: Tag, img_url: str, progress: Progress, ai_naming: bool) -> str:
     img_url = str(img_url)
     filename = extract_filename(img_url)
 
     # for performance
     if not ai_naming:
-        return filename
+        return Naming(filename, "src")
 
-    img_name = await ask_ai_for_image_name(img, filename, progress) or filename
+    if ctx.skip_descriptive and is_descriptive_filename(filename):
+        logger.debug(f"📖 {filename} is already descriptive, skip AI naming")
+        ctx.stats["ai_calls_saved"] += 1
+        return Naming(filename, "descriptive")
 
-    # 发送频率过高，请稍后再试.
-    # await asyncio.sleep(0.5)
+    alt = get_alt(img)
 
-    return img_name
+    # 修复前缓存的名字可能没有清理过
+    if ctx.name_cache is not None and (
+        cached := sanitize_name(ctx.name_cache.get(img_url, alt) or "")
+    ):
+        logger.debug(f"🗃️ {filename} -> {cached} (cached)")
+        return Naming(cached, "cache")
 
+    img_name = await name_with_deadline(img, img_url, filename, ctx)
 
-def sleep_gap_factory(*, gap: float, iters: int = 100_0000):
-    sleep_gaps = (round(x * gap, 3) for x in range(0, iters))
+    # 发送频率过高，请稍后再试.
+    # await asyncio.sleep(0.5)
 
-    async def sleep():
-        gap = next(sleep_gaps)
-        # print("sleep", gap)
-        await asyncio.sleep(gap)
+    if not img_name:
+        return Naming(filename, "fallback")
+
+    if ctx.name_cache is not None:
+        ctx.name_cache.put(img_url, alt, img_name)
+
+    return Naming(img_name, ctx.naming_backend.name)
+
+
+async def name_with_deadline(
+    img: Tag, img_url: str, filename: str, ctx: RunContext
+) -> str | None:
+    """
+    向命名后端请求名字，最多等 `ctx.naming_deadline` 秒（包括攒批和排队等并发名额的时间），
+    超时返回 None，由调用方立即回退到 src 中的文件名，单张图片的命名耗时因此有上界。
+    开启 `late_rename` 时请求留在后台继续，AI 答复后由 `rename_late()` 重命名已保存的文件。
+    """
+
+    if ctx.name_batcher is not None:
+        naming = asyncio.ensure_future(ctx.name_batcher.name(img, filename))
+    else:
+        naming = asyncio.ensure_future(name_one(img, filename, ctx))
+
+    try:
+        done, _ = await asyncio.wait({naming}, timeout=ctx.naming_deadline)
+    except BaseException:
+        naming.cancel()
+        raise
+
+    if done:
+        try:
+            return naming.result()
+        # 图片照常下载，后端的任何错误（比如畸形的 SSE 事件）都只是回退到 src 中的文件名
+        except Exception as error:  # noqa: BLE001
+            logger.error(f"❌ AI 命名 {filename} 失败，沿用原文件名：{error!r}")
+            metrics.incr("ai_failures_total")
+            return None
+
+    logger.warning(f"⌛ AI 命名超过 {ctx.naming_deadline}s，{filename} 先沿用原文件名")
+    metrics.incr("ai_deadline_exceeded_total")
+    ctx.stats["naming_deadline_exceeded"] += 1
+
+    if ctx.late_rename:
+        ctx.late_names[img_url] = naming
+    else:
+        naming.cancel()
+
+    return None
+
+
+async def name_one(img: Tag, filename: str, ctx: RunContext) -> str | None:
+    backend = ctx.naming_backend
+    rate_limiter = ctx.rate_limiter if backend.rate_limited else None
+    # 历史样本不足时不对冲
+    delay = (
+        hedge_delay(metrics.histograms.get("ai_naming_seconds")) if ctx.hedge else None
+    )
 
-    return sleep
+    async with ctx.naming_semaphore:
+        return await hedged(
+            lambda: backend.name_one(img, filename, rate_limiter), delay
+        )
 
 
-sleep_gap = sleep_gap_factory(gap=0.3)
+@timing(metric="crawl_html_seconds")
+async def crawl_html(
+    url: str, client: httpx.AsyncClient, http_cache: HttpCache | None = None
+) -> str:
+    cached = http_cache.get(url) if http_cache is not None else None
 
+    if cached is not None and cached.fresh:
+        assert http_cache is not None
+        http_cache.fresh_hits += 1
+        return cached.body
 
-async def crawl_html(url: str) -> str:
-    headers = {
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36",
-    }
+    headers = conditional_headers(cached.etag, cached.last_modified) if cached else {}
+    r = await client.get(url, headers=headers)
+
+    if r.status_code == httpx.codes.NOT_MODIFIED and cached is not None:
+        assert http_cache is not None
+        http_cache.refresh(url, r.headers)
+        return cached.body
 
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=headers)
-        html = r.text
+    r.raise_for_status()
+    html = r.text
 
     # print("HTML:", html)
 
-    return html
+    if http_cache is not None:
+        http_cache.put(url, r.headers, html)
 
+    return html
 
-async def start() -> list[DownloadResult | None] | None:
-    args = get_args()
 
-    url = args.url
-    selector = args.selector
-    save_dir = args.output_dir
-    concurrency = args.concurrency
-    ai_naming = args.ai_naming
-    count = args.count
+async def stream_html(
+    url: str,
+    client: httpx.AsyncClient,
+    selectors: dict[str, StreamSelector],
+    http_cache: HttpCache | None = None,
+) -> AsyncIterator[tuple[str, Tag]]:
+    """
+    流式读取页面并增量解析，按文档顺序产出匹配到的 `(选择器名, Tag)`。
+    页面命中 HTTP 缓存（新鲜期内或 304）时解析缓存的正文。
+    """
+
+    extractor = StreamExtractor(selectors)
+    cached = http_cache.get(url) if http_cache is not None else None
+    # 解析和下载交织进行，只累计花在 feed 上的时间
+    parse_seconds = 0.0
+
+    if cached is not None and cached.fresh:
+        assert http_cache is not None
+        http_cache.fresh_hits += 1
+        extractor.feed(cached.body)
+    else:
+        headers = (
+            conditional_headers(cached.etag, cached.last_modified) if cached else {}
+        )
+
+        async with client.stream("GET", url, headers=headers) as r:
+            if r.status_code == httpx.codes.NOT_MODIFIED and cached is not None:
+                assert http_cache is not None
+                http_cache.refresh(url, r.headers)
+                extractor.feed(cached.body)
+            else:
+                r.raise_for_status()
+
+                # 只有完整读完的页面才写入缓存，提前停止的不算
+                chunks: list[str] | None = (
+                    [] if http_cache is not None and is_storable(r.headers) else None
+                )
+
+                async for chunk in r.aiter_text():
+                    feed_start = time.perf_counter()
+                    extractor.feed(chunk)
+                    parse_seconds += time.perf_counter() - feed_start
+
+                    if chunks is not None:
+                        chunks.append(chunk)
+
+                    for match in extractor.drain():
+                        yield match
+
+                if http_cache is not None and chunks is not None:
+                    http_cache.put(url, r.headers, "".join(chunks))
+
+    extractor.close()
+    metrics.observe("select_seconds", parse_seconds)
+
+    for match in extractor.drain():
+        yield match
+
+
+def create_name_batcher(
+    batch_size: int,
+    naming_semaphore: asyncio.Semaphore,
+    rate_limiter: AdaptiveRateLimiter,
+    backend: NamingBackend,
+    timeout: float | None = None,
+) -> NameBatcher | None:
+    """
+    :param timeout: 一批请求最多占用并发名额多少秒，超时整批回退到 src 中的文件名
+    """
+
+    # 批大小不超过后端单次请求能处理的图片数
+    batch_size = min(batch_size, backend.max_batch_size)
+
+    if batch_size <= 1:
+        return None
+
+    async def send(imgs: list[Tag | Img], filenames: list[str]) -> list[str | None]:
+        async with naming_semaphore, asyncio.timeout(timeout):
+            return await backend.name_many(
+                imgs, filenames, rate_limiter if backend.rate_limited else None
+            )
+
+    return NameBatcher(batch_size, send=send)
+
+
+def open_name_cache(args: CLIArgs) -> NameCache | None:
+    if not args.ai_naming or not args.cache:
+        return None
+
+    return NameCache(args.cache_dir or default_cache_dir())
+
+
+def open_postprocessor(args: CLIArgs) -> PostProcessor | None:
+    options = PostProcessOptions(
+        convert=args.convert,
+        max_size=args.max_size,
+        thumbs=args.thumbs,
+        strip_exif=args.strip_exif,
+    )
 
-    if not url or not selector or not Path(save_dir).exists():
-        details = {
-            "url": url,
-            "selector": selector,
-            "save_dir": save_dir,
-            "save_dir_exists?": Path(save_dir).exists(),
-        }
-        logger.error(f"❌ url, imgs selector, and save_dir are required! {details}")
+    if not options.enabled:
+        return None
+
+    return PostProcessor(options, workers=args.postprocess_workers)
+
+
+def open_http_cache(args: CLIArgs) -> HttpCache | None:
+    if not args.http_cache:
+        return None
+
+    return HttpCache(args.cache_dir or default_cache_dir())
+
+
+class Downloader:
+    """
+    可复用的下载器，配置显式传入而不是读全局变量。HTTP 连接池、域名并发限制、熔断器、AI 限流、
+    命名 / 页面缓存、写盘线程池和后处理进程池归下载器所有，多次（包括并发的）`run()` 共用，适合嵌入长期运行的 asyncio 服务；
+    清单、失败队列、感知哈希索引和统计按每次运行的 `output_dir` 单独维护。
+
+    .. code-block:: python
+        config = CLIArgs(url="https://example.com/post/1", selector="img", output_dir="output", progress=False)
+
+        async with Downloader(config) as downloader:
+            async for result in downloader.run():
+                print(result.img_name)
+
+            # 复用已经建立的连接，覆盖部分配置再跑一次
+            async for result in downloader.run(urls=["https://example.com/post/2"], output_dir="post-2"):
+                ...
+
+    :param config: 运行配置，`run()` 的关键字参数可以按次覆盖其中与单次运行相关的字段
+    :param client: 外部传入的 `httpx.AsyncClient`（多个下载器共享连接池时），由调用方负责关闭
+    :param records: `output_format="jsonl"` 时 JSON 记录写到哪里，默认标准输出
+    """
+
+    def __init__(
+        self,
+        config: CLIArgs,
+        client: httpx.AsyncClient | None = None,
+        records: TextIO | None = None,
+    ) -> None:
+        self.config = config
+        self.records = records
+        self.client = client
+        self.owns_client = client is None
+        self.host_limiter = HostLimiter(config.per_host_limit)
+        self.breaker = CircuitBreaker()
+        self.bandwidth = (
+            BandwidthLimiter(config.max_bandwidth) if config.max_bandwidth else None
+        )
+        self.naming_backend = create_backend(
+            config.naming_backend,
+            base_url=config.naming_base_url,
+            model=config.naming_model,
+            ttft_timeout=config.naming_ttft_timeout,
+        )
+        # 命名并发不超过后端声明的上限
+        self.naming_concurrency = min(
+            config.naming_concurrency or config.concurrency,
+            self.naming_backend.max_concurrency,
+        )
+        self.naming_semaphore = asyncio.Semaphore(self.naming_concurrency)
+        self.rate_limiter = AdaptiveRateLimiter(rate=config.ai_rate)
+        self.name_cache: NameCache | None = None
+        self.http_cache: HttpCache | None = None
+        self.postprocessor: PostProcessor | None = None
+        self.writer: FileWriter | None = None
+        self.ai_clients: ClientRegistry | None = None
+        self.opened = False
+        # `async with` 和临时打开的 `run()` 各持有一份，最后一个释放时关闭；手动 `open()` 的由调用方关闭
+        self.holders = 0
+
+    async def __aenter__(self) -> Self:
+        self.hold()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.release()
+
+    def hold(self) -> None:
+        # 打开失败（比如命名后端缺少配置）时不算持有
+        self.open()
+        self.holders += 1
+
+    async def release(self) -> None:
+        self.holders -= 1
+
+        if not self.holders:
+            await self.aclose()
+
+    def open(self) -> None:
+        if self.opened:
+            return
+
+        config = self.config
+
+        if config.ai_naming:
+            # 在下载任何东西之前校验命名后端的配置，而不是每张图片命名时各失败一次
+            self.naming_backend.check()
+            # AI 请求和图片下载分开建连接池：SSE 的首 token 可能很慢，读超时要更长；
+            # 对冲请求会让同时进行的请求翻倍
+            self.ai_clients = ClientRegistry(
+                self.naming_concurrency * 2,
+                connect_timeout=config.connect_timeout,
+                read_timeout=config.naming_read_timeout,
+            )
+            self.naming_backend.clients = self.ai_clients
+
+        if self.client is None:
+            self.client = create_client(
+                max_workers(config) + config.page_concurrency,
+                connect_timeout=config.connect_timeout,
+                read_timeout=config.read_timeout,
+            )
+
+        self.name_cache = (
+            open_name_cache(config) if self.naming_backend.cacheable else None
+        )
+        self.http_cache = open_http_cache(config)
+        self.postprocessor = open_postprocessor(config)
+        self.writer = FileWriter(
+            config.write_threads, fsync=config.fsync, preallocate=config.preallocate
+        )
+        self.opened = True
+
+    async def aclose(self) -> None:
+        if not self.opened:
+            return
+
+        self.opened = False
+
+        if self.postprocessor is not None:
+            self.postprocessor.close()
+
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+        if self.name_cache is not None:
+            self.name_cache.close()
+
+        if self.http_cache is not None:
+            self.http_cache.close()
+
+        if self.ai_clients is not None:
+            self.naming_backend.clients = None
+            await self.ai_clients.aclose()
+            self.ai_clients = None
+
+        if self.owns_client and self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def run(self, **overrides: Any) -> AsyncIterator[DownloadResult]:
+        """
+        按完成顺序逐个产出下载结果。未进入 `async with` 时为本次运行临时打开、结束后关闭。
+
+        :param overrides: 覆盖 `config` 中的字段，比如 `urls`、`output_dir`、`selector`、`count`
+        """
+
+        args = replace(self.config, **overrides)
+
+        if "urls" in overrides and "url" not in overrides:
+            args.url = next(iter(args.urls), "")
+
+        url = args.url or next(iter(args.urls), "")
+        save_dir = args.output_dir
+
+        if not url or not args.selector or not Path(save_dir).exists():
+            details = {
+                "url": url,
+                "selector": args.selector,
+                "save_dir": save_dir,
+                "save_dir_exists?": Path(save_dir).exists(),
+            }
+            logger.error(f"❌ url, imgs selector, and save_dir are required! {details}")
+            return
+
+        # 中途出错时已经打开的清单、归档等也要关闭，按打开的相反顺序
+        async with AsyncExitStack() as stack:
+            # 并发的临时运行共用同一次打开，不会在别的运行还在下载时关掉连接池
+            if not self.opened or self.holders > 0:
+                self.hold()
+                stack.push_async_callback(self.release)
+
+            assert self.client is not None and self.writer is not None
+
+            started = time.perf_counter()
+            archive = None
+
+            if args.output_archive:
+                archive = ArchiveSink(
+                    save_dir, args.output_archive, args.archive_shard_size
+                )
+                stack.callback(archive.close)
+
+            manifest = Manifest(save_dir, archive.index if archive else None)
+            stack.callback(manifest.close)
+            retry_queue = RetryQueue(save_dir)
+            stack.callback(retry_queue.save)
+
+            if args.near_dup:
+                near_dups = NearDupIndex(save_dir, args.near_dup_threshold)
+                stack.callback(near_dups.close)
+            else:
+                near_dups = None
+
+            ctx = RunContext(
+                client=self.client,
+                host_limiter=self.host_limiter,
+                naming_semaphore=self.naming_semaphore,
+                naming_backend=self.naming_backend,
+                rate_limiter=self.rate_limiter,
+                name_cache=self.name_cache,
+                name_batcher=create_name_batcher(
+                    args.naming_batch_size,
+                    self.naming_semaphore,
+                    self.rate_limiter,
+                    self.naming_backend,
+                    # 迟到的名字还有用时让整批请求继续，否则到截止时间就释放并发名额
+                    LATE_NAMING_TIMEOUT
+                    if args.naming_late_rename
+                    else args.naming_deadline,
+                ),
+                manifest=manifest,
+                http_cache=self.http_cache,
+                skip_descriptive=args.skip_descriptive,
+                resume=args.resume,
+                revalidate=args.http_cache,
+                retries=args.retries,
+                breaker=self.breaker,
+                retry_queue=retry_queue,
+                postprocessor=self.postprocessor,
+                writer=self.writer,
+                archive=archive,
+                near_dups=near_dups,
+                near_dup_skip_naming=args.near_dup_skip_naming,
+                prefer=parse_preference(args.prefer) if args.prefer else None,
+                probe_sources=args.probe_sources,
+                naming_deadline=args.naming_deadline,
+                late_rename=args.naming_late_rename,
+                hedge=args.naming_hedge,
+                auto_concurrency=AdaptiveConcurrency(
+                    initial=args.concurrency, max_limit=max_workers(args)
+                )
+                if args.auto_concurrency
+                else None,
+                bandwidth=self.bandwidth,
+                records=(self.records or sys.stdout)
+                if args.output_format == "jsonl"
+                else None,
+            )
+
+            finished = False
+
+            try:
+                async with aclosing(_start(args, ctx)) as results:
+                    async for result in results:
+                        yield result
+
+                finished = True
+            finally:
+                # 清单等要在重命名之后关闭；提前结束的运行不再等 AI
+                await settle_late_names(ctx, wait=finished)
+
+                if ctx.records is not None:
+                    write_record(
+                        ctx.records, summary_record(ctx, time.perf_counter() - started)
+                    )
+                else:
+                    print_summary(ctx)
+
+                if args.metrics_file:
+                    ctx.metrics.dump(args.metrics_file)
+                    print(f"📊 各阶段指标已写入 {args.metrics_file}")
+
+
+async def settle_late_names(ctx: RunContext, wait: bool) -> None:
+    """运行结束时等待后台重命名完成，`wait` 为 False 时直接取消。"""
+
+    # 剩下的都是没有保存下来的图片（失败、近似重复），名字用不上了
+    for naming in ctx.late_names.values():
+        naming.cancel()
+
+    ctx.late_names.clear()
+
+    if not ctx.renames:
         return
 
-    html = await crawl_html(url)
-    soup = BeautifulSoup(html, "html.parser")
+    if wait:
+        print(f"✏️ 等待 {len(ctx.renames)} 个迟到的 AI 命名...")
+    else:
+        for task in ctx.renames:
+            task.cancel()
 
-    imgs = soup.css.select(selector)
+    await asyncio.gather(*ctx.renames, return_exceptions=True)
 
-    if (img_count := len(imgs)) == 0:
-        logger.warning(f"🤔 没有找到任何图片，请检查选择器是否正确 {selector=} {url=}")
 
-        return
+async def start(
+    args: CLIArgs, records: TextIO | None = None
+) -> AsyncIterator[DownloadResult]:
+    """命令行入口：一次运行，按完成顺序逐个产出下载结果。"""
+
+    async with (
+        Downloader(args, records=records) as downloader,
+        aclosing(downloader.run()) as results,
+    ):
+        async for result in results:
+            yield result
 
-    if count and count > img_count:
-        count = img_count
 
-    info = (
-        f"找到 {img_count} 张图片。"
-        if count is None
-        else f"找到 {img_count} 张图片，抓取前 {count} 张。"
+def max_workers(args: CLIArgs) -> int:
+    """
+    常驻下载 worker 的数量：固定并发时就是 `concurrency`，自动并发时是伸缩的上限。
+    两者都不超过文件描述符预算，避免大并发时 “Too many open files”。
+    """
+
+    workers = (
+        args.max_concurrency or AUTO_MAX_WORKERS
+        if args.auto_concurrency
+        else args.concurrency
     )
 
-    if count is not None:
-        imgs = imgs[:count]
+    if (budget := fd_budget()) is not None:
+        workers = min(workers, budget)
+
+    return max(1, workers)
+
+
+def write_record(out: TextIO, record: dict[str, Any]) -> None:
+    # 逐行 flush，下游不必等整个运行结束
+    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    out.flush()
+
+
+def result_record(result: DownloadResult) -> dict[str, Any]:
+    return {
+        "type": "image",
+        "url": result.img_url,
+        "name": result.img_name,
+        "path": str(result.full_path),
+        "bytes": result.size,
+        "seconds": round(result.seconds, 3),
+        "naming": result.naming,
+        "error": None,
+    }
+
+
+def summary_record(ctx: RunContext, seconds: float) -> dict[str, Any]:
+    """`print_summary()` 的机器可读版本，作为 jsonl 输出的最后一行。"""
+
+    queue = ctx.retry_queue
+    cache = ctx.name_cache
+
+    return {
+        "type": "summary",
+        "succeeded": ctx.stats["succeeded"],
+        "failed": ctx.stats["failed"],
+        "seconds": round(seconds, 3),
+        "stats": dict(ctx.stats),
+        "concurrency": ctx.auto_concurrency.limit if ctx.auto_concurrency else None,
+        "ai_throttled": ctx.rate_limiter.throttled,
+        "ai_batch_requests": ctx.name_batcher.requests if ctx.name_batcher else 0,
+        "name_cache_hit_rate": cache.hit_rate
+        if cache is not None and cache.hits + cache.misses
+        else None,
+        "retry_file": str(queue.path) if queue is not None and queue.items else None,
+    }
+
+
+def print_summary(ctx: RunContext) -> None:
+    if ctx.stats["succeeded"] or ctx.stats["failed"]:
+        print(f"✅ 成功 {ctx.stats['succeeded']} 张，❌ 失败 {ctx.stats['failed']} 张")
 
-    print(f"{info:^160}\n")
+    if (queue := ctx.retry_queue) is not None and queue.items:
+        for item in queue.items:
+            error = item["error"].splitlines()[0]
+            print(f"[red]  - {item['attrs'].get('src')}: {error}[/red]")
 
-    semaphore = asyncio.Semaphore(concurrency)
+        print(f"🔁 失败的图片已记录到 {queue.path}，可用 `--retry-failed` 重新下载")
 
-    async def worker(
-        semaphore: asyncio.Semaphore,
-        img: Tag,
-        index: int,
-        save_dir: str,
-        task: TaskID,
-        progress: Progress,
-        url: str,
+    if ctx.stats["skipped"]:
+        print(f"⏭️ {ctx.stats['skipped']} 张图片上次已下载，跳过")
+
+    if ctx.stats["not_modified"] or ctx.stats["updated"]:
+        print(
+            f"🆗 {ctx.stats['not_modified']} 张图片未变化（304），{ctx.stats['updated']} 张远端有更新已重新下载"
+        )
+
+    if (http_cache := ctx.http_cache) is not None and (
+        http_cache.fresh_hits or http_cache.not_modified
     ):
-        async with semaphore:
-            # start_time = time.perf_counter()
-            await sleep_gap()
-            # end_time = time.perf_counter()
+        print(
+            f"📄 {http_cache.fresh_hits} 个页面命中缓存，{http_cache.not_modified} 个页面未变化（304）"
+        )
 
-            # print(f"{(end_time - start_time):.2f} s")
+    if ctx.stats["postprocessed"] or ctx.stats["postprocess_failed"]:
+        print(
+            f"🖼️ 处理 {ctx.stats['postprocessed']} 张图片，{ctx.stats['postprocess_failed']} 张处理失败保留原图"
+        )
 
-            result = await download(img, index, save_dir, progress, url, ai_naming)
+    if ctx.stats["near_dups"] or ctx.stats["near_dups_replaced"]:
+        print(
+            f"🪞 {ctx.stats['near_dups'] + ctx.stats['near_dups_replaced']} 张图片是近似重复，其中 {ctx.stats['near_dups_replaced']} 张更大的版本替换了已有文件"
+        )
 
-            logger.debug(f"Downloaded {index}")
-            progress.update(task, advance=1)
-            return result
+    if ctx.stats["resumed"]:
+        print(f"⏯️ {ctx.stats['resumed']} 张图片断点续传")
 
-    with Progress() as progress:
-        task1 = progress.add_task("⏳ Downloading...", total=len(imgs))
-        tasks = [
-            worker(semaphore, img, index, save_dir, task1, progress, url)
-            for index, img in enumerate(imgs)
-        ]
+    if ctx.stats["deduped"]:
+        print(f"🔁 {ctx.stats['deduped']} 张图片与已有文件内容相同，未重复保存")
 
-        print(f"⏳ Executing {len(tasks)} tasks with concurrency {concurrency} 🤹...")
+    if (auto := ctx.auto_concurrency) is not None:
+        print(f"🤹 自动并发：最终 {auto.limit} 个 worker，最多 {auto.peak} 个")
 
-        results = await asyncio.gather(*tasks)
+    if ctx.rate_limiter.throttled:
+        print(
+            f"🐢 AI 限流 {ctx.rate_limiter.throttled} 次，最终速率 {ctx.rate_limiter.rate:.2f} 次/秒"
+        )
 
-        progress.update(task1, description="🎉 Downloaded")
+    if ctx.stats["naming_deadline_exceeded"]:
+        print(
+            f"⌛ {ctx.stats['naming_deadline_exceeded']} 张图片 AI 命名超时，先沿用原文件名，其中 {ctx.stats['renamed_late']} 张在 AI 答复后重命名"
+        )
+
+    if (batcher := ctx.name_batcher) is not None and batcher.requests:
+        print(f"📦 批量命名共请求 AI {batcher.requests} 次")
+
+    if ctx.stats["ai_calls_saved"]:
+        print(
+            f"📖 {ctx.stats['ai_calls_saved']} 张图片文件名已具备描述性，省下 AI 调用"
+        )
+
+    if (cache := ctx.name_cache) is not None and cache.hits + cache.misses:
+        print(
+            f"🗃️ 命名缓存命中 {cache.hits}/{cache.hits + cache.misses}（{cache.hit_rate:.0%}）"
+        )
 
-        return results
+
+async def _start(args: CLIArgs, ctx: RunContext) -> AsyncIterator[DownloadResult]:
+    """
+    生产者 / 消费者：页面 worker 边抓取边解析，把图片放入有界队列，`concurrency` 个常驻下载 worker 从队列取图片。
+    队列满时解析暂停（背压一直传到页面的 socket），下载结果边完成边产出，内存占用与图片总数无关。
+    """
+
+    selector = args.selector
+    save_dir = args.output_dir
+    # 自动并发时按上限启动 worker，由 `ctx.auto_concurrency` 控制同时下载的数量
+    concurrency = max_workers(args)
+    ai_naming = args.ai_naming
+    count = args.count
+    seeds = args.urls or [args.url]
+
+    if not args.auto_concurrency and concurrency < args.concurrency:
+        logger.warning(
+            f"⚠️ 文件描述符上限只够 {concurrency} 个并发下载，--concurrency {args.concurrency} 已下调，可用 `ulimit -n` 调高"
+        )
+
+    frontier = Frontier(max_depth=args.max_depth if args.next_page else 0)
+    retry_items = (
+        ctx.retry_queue.load()
+        if args.retry_failed and ctx.retry_queue is not None
+        else []
+    )
+
+    # 重放失败队列时不再抓取页面
+    if not retry_items:
+        for seed in seeds:
+            frontier.add(seed)
+
+    jobs: asyncio.Queue[Job | None] = asyncio.Queue(maxsize=concurrency * QUEUE_FACTOR)
+    results: asyncio.Queue[DownloadResult] = asyncio.Queue(maxsize=concurrency)
+    pages: list[str] = []
+    discovered = 0
+
+    stream_selectors = (
+        compile_stream_selectors(img=selector, next=args.next_page)
+        if args.stream_parse
+        else None
+    )
+
+    def is_full() -> bool:
+        return count is not None and discovered >= count
+
+    with Progress(
+        disable=not args.progress or args.output_format == "jsonl"
+    ) as progress:
+        task1 = progress.add_task("⏳ Downloading...", total=0)
+
+        async def worker() -> None:
+            auto = ctx.auto_concurrency
+
+            while (job := await jobs.get()) is not None:
+                # 排队等并发名额的时间不算进这张图片的耗时
+                async with auto.slot() if auto is not None else nullcontext():
+                    result = await handle_job(job, time.perf_counter())
+
+                if result is not None:
+                    await results.put(result)
+
+        async def handle_job(job: Job, job_start: float) -> DownloadResult | None:
+            auto = ctx.auto_concurrency
+
+            try:
+                result = await download(
+                    job.img,
+                    job.index,
+                    save_dir,
+                    progress,
+                    job.page_url,
+                    ai_naming,
+                    ctx,
+                )
+            # 网络错误、熔断、磁盘错误、无法解析的地址或内容，以及任何意外错误：
+            # 让 worker 退出的话 `gather` 会中止整个运行
+            except Exception as error:  # noqa: BLE001
+                # 单张图片失败不影响其他图片，记下来供 `--retry-failed` 重放
+                logger.error(
+                    f"❌ #{job.index + 1} {job.img.get('src')} 下载失败：{error!r}"
+                )
+                metrics.incr("download_failures_total")
+                ctx.stats["failed"] += 1
+
+                if ctx.retry_queue is not None:
+                    ctx.retry_queue.add(job.page_url, tag_attrs(job.img), error)
+
+                if ctx.records is not None:
+                    src = job.img.get("data-src", job.img.get("src"))
+                    write_record(
+                        ctx.records,
+                        {
+                            "type": "image",
+                            "url": src and get_full_url(job.page_url, str(src)),
+                            "name": None,
+                            "path": None,
+                            "bytes": 0,
+                            "seconds": round(time.perf_counter() - job_start, 3),
+                            "naming": None,
+                            "error": repr(error),
+                        },
+                    )
+
+                if auto is not None:
+                    # 404 之类的错误和并发无关，不算拥塞
+                    auto.on_complete(
+                        0, time.perf_counter() - job_start, ok=not is_retryable(error)
+                    )
+
+                result = None
+
+            logger.debug(f"Downloaded {job.index}")
+            progress.update(task1, advance=1)
+
+            if result is None:
+                return None
+
+            result = result._replace(seconds=time.perf_counter() - job_start)
+            ctx.stats["succeeded"] += 1
+
+            if ctx.records is not None:
+                write_record(ctx.records, result_record(result))
+
+            if auto is not None:
+                # 跳过、304 等沿用已有文件的结果没有传输，不计入吞吐
+                auto.on_complete(
+                    result.size if result.naming != "existing" else 0, result.seconds
+                )
+
+            return result
+
+        async def schedule(img: Tag, page_url: str) -> None:
+            nonlocal discovered
+
+            index = discovered
+            discovered += 1
+            progress.update(task1, total=discovered)
+
+            if is_full():
+                # 数量够了，排队的种子和下一页都不再抓取
+                frontier.close()
+
+            # 队列满时在这里等待，页面解析随之暂停
+            await jobs.put(Job(index, img, page_url))
+
+        def follow(link: Tag, page_url: str, depth: int) -> None:
+            if is_full():
+                return
+
+            if href := link.get("href"):
+                frontier.add(get_full_url(page_url, str(href)), depth + 1)
+
+        @timing(metric="page_seconds")
+        async def handle_page(page_url: str, depth: int) -> None:
+            # 出队之后、数量才够的页面
+            if is_full():
+                return
+
+            pages.append(page_url)
+            found = 0
+
+            if stream_selectors is None:
+                html = await crawl_html(page_url, ctx.client, ctx.http_cache)
+
+                with metrics.time("select_seconds"):
+                    soup = BeautifulSoup(html, "html.parser")
+
+                # 惰性匹配，`--count` 够了就不再匹配剩下的元素
+                imgs = soup.css.iselect(selector)
+
+                links = soup.css.select(args.next_page) if args.next_page else []
+
+                # 不限数量时先把下一页交给页面 worker，不必等本页图片全部入队；
+                # 限制了数量时等本页图片入队后再决定是否翻页，够了就不再请求下一页
+                if count is None:
+                    for link in links:
+                        follow(link, page_url, depth)
+
+                for img in imgs:
+                    if is_full():
+                        break
+                    await schedule(img, page_url)
+                    found += 1
+
+                if count is not None:
+                    for link in links:
+                        follow(link, page_url, depth)
+            else:
+                # 边下载边解析，匹配到图片立即交给下载 worker；数量够了就不再读剩下的页面
+                async with aclosing(
+                    stream_html(page_url, ctx.client, stream_selectors, ctx.http_cache)
+                ) as matches:
+                    async for key, tag in matches:
+                        if is_full():
+                            break
+
+                        if key == "img":
+                            await schedule(tag, page_url)
+                            found += 1
+                        else:
+                            follow(tag, page_url, depth)
+
+            logger.info(f"📄 {page_url} 找到 {found} 张图片")
+
+        async def produce() -> None:
+            for item in retry_items:
+                if is_full():
+                    break
+                await schedule(Tag(name="img", attrs=item["attrs"]), item["page_url"])
+
+            if not is_full():
+                await crawl(frontier, handle_page, concurrency=args.page_concurrency)
+
+            if not discovered:
+                logger.warning(
+                    f"🤔 没有找到任何图片，请检查选择器是否正确 {selector=} {seeds=}"
+                )
+                return
+
+            info = f"{len(pages)} 个页面共抓取 {discovered} 张图片。"
+            print(f"{info:^160}\n")
+
+        async def run() -> None:
+            workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+
+            try:
+                await produce()
+
+                for _ in workers:
+                    await jobs.put(None)
+
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+
+        if ctx.auto_concurrency is not None:
+            print(
+                f"⏳ Downloading with {ctx.auto_concurrency.limit}-{concurrency} workers (auto) 🤹..."
+            )
+        else:
+            print(f"⏳ Downloading with {concurrency} workers 🤹...")
+        # 下载任务在单独的上下文中运行，其中的 `metrics` 都记到本次运行自己的实例
+        context = contextvars.copy_context()
+        context.run(current_metrics.set, ctx.metrics)
+        runner = asyncio.create_task(run(), context=context)
+
+        try:
+            # 结果队列同样有界，消费慢时 worker 会等待；runner 结束即所有结果都已入队
+            while True:
+                getter = asyncio.ensure_future(results.get())
+                await asyncio.wait(
+                    {getter, runner}, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not getter.done():
+                    getter.cancel()
+                    break
+
+                yield getter.result()
+
+            while not results.empty():
+                yield results.get_nowait()
+
+            # 生产者或 worker 中未捕获的异常在这里抛出
+            await runner
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+
+        progress.update(task1, description="🎉 Downloaded")
 
 
 if __name__ == "__main__":
@@ -208,7 +1681,3 @@ if __name__ == "__main__":
     # print(numbers)
     # print((float("inf")))
     print(int(float("inf")))
-    # sleep_gap = sleep_gap_factory(0.05)
-
-    # for _ in range(10):
-    #     sleep_gap()
@@ -0,0 +1,525 @@
+import asyncio
+import hashlib
+import io
+import json
+import time
+
+import httpx
+import pytest
+
+from .archive import ArchiveIndex
+from .cli_args import CLIArgs
+from .download import Downloader, DownloadResult, Fetched, RunContext, keep_largest
+from .http_client import HostLimiter
+from .manifest import Manifest
+from .naming_backends import NamingBackend
+from .near_dup import NearDupIndex, Signature
+
+PAGES = {
+    "/a.html": '<div class="c"><img src="/img/a1.jpg"><img src="/img/a2.jpg"></div>',
+    "/b.html": '<div class="c"><img src="/img/b1.jpg"></div>',
+    "/broken.html": '<div class="c"><img src="/img/ok.jpg"><img src="/img/gone.jpg"></div>',
+    "/p1.html": '<div class="c"><img src="/img/p1a.jpg"><img src="/img/p1b.jpg"></div><a class="next" href="/p2.html">next</a>',
+    "/p2.html": '<div class="c"><img src="/img/p2.jpg"></div>',
+}
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if (page := PAGES.get(request.url.path)) is not None:
+        return httpx.Response(200, text=page, headers={"content-type": "text/html"})
+
+    if request.url.path == "/img/gone.jpg":
+        return httpx.Response(404)
+
+    return httpx.Response(200, content=request.url.path.encode())
+
+
+def test_downloader_runs_concurrently_with_shared_client(tmp_path):
+    transport = httpx.MockTransport(handler)
+    config = CLIArgs(
+        url="",
+        selector=".c img",
+        output_dir="",
+        ai_naming=False,
+        progress=False,
+        cache=False,
+        http_cache=False,
+        concurrency=2,
+    )
+
+    async def collect(downloader: Downloader, page: str) -> list[str]:
+        output_dir = tmp_path / page
+        output_dir.mkdir()
+
+        contents = [
+            result.full_path.read_text()
+            async for result in downloader.run(
+                urls=[f"https://example.com/{page}.html"],
+                output_dir=str(output_dir),
+            )
+        ]
+
+        return sorted(contents)
+
+    async def main() -> tuple[list[str], list[str]]:
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with Downloader(config, client=client) as downloader:
+                a, b = await asyncio.gather(
+                    collect(downloader, "a"), collect(downloader, "b")
+                )
+
+            # 外部传入的连接池由调用方关闭
+            assert not client.is_closed
+
+        return a, b
+
+    assert asyncio.run(main()) == (["/img/a1.jpg", "/img/a2.jpg"], ["/img/b1.jpg"])
+
+
+class SlowBackend(NamingBackend):
+    name = "slow"
+    rate_limited = False
+
+    async def name_one(self, img, filename, rate_limiter=None):
+        await asyncio.sleep(0.3)
+        return f"named-{filename}"
+
+
+def test_naming_deadline_falls_back_and_renames_later(tmp_path):
+    transport = httpx.MockTransport(handler)
+    config = CLIArgs(
+        url="https://example.com/a.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        progress=False,
+        cache=False,
+        http_cache=False,
+        skip_descriptive=False,
+        concurrency=2,
+        naming_deadline=0.05,
+        naming_late_rename=True,
+    )
+
+    async def main() -> list[str]:
+        async with httpx.AsyncClient(transport=transport) as client:
+            downloader = Downloader(config, client=client)
+            downloader.naming_backend = SlowBackend()
+
+            return sorted([result.img_name async for result in downloader.run()])
+
+    # 不等 AI，先用 src 中的文件名保存；run() 结束前等后台命名完成再重命名
+    assert asyncio.run(main()) == ["a1.jpg", "a2.jpg"]
+    assert sorted(path.name for path in tmp_path.glob("*.jpg")) == [
+        "named-a1.jpg",
+        "named-a2.jpg",
+    ]
+    assert Manifest(tmp_path).by_url["https://example.com/img/a1.jpg"]["path"] == (
+        "named-a1.jpg"
+    )
+
+
+class BrokenBackend(NamingBackend):
+    name = "broken"
+    rate_limited = False
+
+    async def name_one(self, img, filename, rate_limiter=None):
+        # 比如 SSE 事件缺少 text
+        raise KeyError("text")
+
+
+def test_naming_error_falls_back_to_src_name(tmp_path):
+    config = CLIArgs(
+        url="https://example.com/a.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        progress=False,
+        cache=False,
+        http_cache=False,
+        skip_descriptive=False,
+    )
+
+    async def main() -> list[DownloadResult]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            downloader = Downloader(config, client=client)
+            downloader.naming_backend = BrokenBackend()
+
+            return sorted([result async for result in downloader.run()])
+
+    results = asyncio.run(main())
+
+    assert [(result.img_name, result.naming) for result in results] == [
+        ("a1.jpg", "fallback"),
+        ("a2.jpg", "fallback"),
+    ]
+    assert (tmp_path / "a1.jpg").read_bytes() == b"/img/a1.jpg"
+
+
+def test_jsonl_records(tmp_path):
+    transport = httpx.MockTransport(handler)
+    records = io.StringIO()
+    config = CLIArgs(
+        url="https://example.com/broken.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        ai_naming=False,
+        cache=False,
+        http_cache=False,
+        retries=0,
+        output_format="jsonl",
+    )
+
+    async def main() -> None:
+        async with (
+            httpx.AsyncClient(transport=transport) as client,
+            Downloader(config, client=client, records=records) as downloader,
+        ):
+            async for _ in downloader.run():
+                pass
+
+    asyncio.run(main())
+
+    lines = [json.loads(line) for line in records.getvalue().splitlines()]
+    images = sorted(lines[:-1], key=lambda record: record["url"])
+
+    assert [
+        (record["url"], record["bytes"], record["naming"]) for record in images
+    ] == [
+        ("https://example.com/img/gone.jpg", 0, None),
+        ("https://example.com/img/ok.jpg", len(b"/img/ok.jpg"), "src"),
+    ]
+    assert "404" in images[0]["error"]
+    assert images[1]["path"] == str(tmp_path / "ok.jpg")
+    assert lines[-1]["type"] == "summary"
+    assert (lines[-1]["succeeded"], lines[-1]["failed"]) == (1, 1)
+
+
+def test_unexpected_error_fails_only_its_image(tmp_path):
+    def faulty_handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/img/gone.jpg":
+            raise KeyError("text")
+
+        return handler(request)
+
+    records = io.StringIO()
+    config = CLIArgs(
+        url="https://example.com/broken.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        ai_naming=False,
+        cache=False,
+        http_cache=False,
+        retries=0,
+        output_format="jsonl",
+        concurrency=1,
+    )
+
+    async def main() -> list[str]:
+        async with (
+            httpx.AsyncClient(transport=httpx.MockTransport(faulty_handler)) as client,
+            Downloader(config, client=client, records=records) as downloader,
+        ):
+            return [result.img_name async for result in downloader.run()]
+
+    assert asyncio.run(main()) == ["ok.jpg"]
+
+    lines = [json.loads(line) for line in records.getvalue().splitlines()]
+    [failed] = [record for record in lines if record.get("error")]
+
+    assert failed["url"] == "https://example.com/img/gone.jpg"
+    assert "KeyError" in failed["error"]
+    assert (lines[-1]["succeeded"], lines[-1]["failed"]) == (1, 1)
+
+
+def test_output_archive(tmp_path):
+    transport = httpx.MockTransport(handler)
+    config = CLIArgs(
+        url="https://example.com/a.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        ai_naming=False,
+        progress=False,
+        cache=False,
+        http_cache=False,
+        output_archive="out.tar",
+    )
+
+    async def main() -> list[DownloadResult]:
+        async with (
+            httpx.AsyncClient(transport=transport) as client,
+            Downloader(config, client=client) as downloader,
+        ):
+            return [result async for result in downloader.run()]
+
+    results = sorted(asyncio.run(main()))
+    index = ArchiveIndex(tmp_path)
+
+    assert [result.full_path for result in results] == [
+        tmp_path / "out.tar" / "a1.jpg",
+        tmp_path / "out.tar" / "a2.jpg",
+    ]
+    assert index.read(results[0].full_path) == b"/img/a1.jpg"
+    assert not list(tmp_path.glob("*.jpg")) and not list(tmp_path.glob(".*.part"))
+
+    # 清单按归档索引确认成员完好，再次运行直接跳过
+    again = sorted(asyncio.run(main()))
+
+    assert [result.full_path for result in again] == [
+        result.full_path for result in results
+    ]
+    assert [result.naming for result in again] == ["existing", "existing"]
+    assert len(ArchiveIndex(tmp_path).by_path) == 2
+
+
+def test_range_not_satisfiable_restarts_outside_host_slot(tmp_path):
+    url = "https://example.com/img/a1.jpg"
+    part = tmp_path / f".{hashlib.sha1(url.encode()).hexdigest()}.part"
+    part.write_bytes(b"stale and too long")
+    part.with_name(part.name + ".json").write_text('"v1"')
+
+    def range_handler(request: httpx.Request) -> httpx.Response:
+        if "range" in request.headers:
+            return httpx.Response(416)
+
+        return handler(request)
+
+    config = CLIArgs(
+        url="https://example.com/a.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        ai_naming=False,
+        progress=False,
+        cache=False,
+        http_cache=False,
+        per_host_limit=1,
+    )
+
+    async def main() -> list[str]:
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(range_handler)
+        ) as client:
+            downloader = Downloader(config, client=client)
+
+            # 在名额里递归重来时会一直等自己占着的名额
+            async with asyncio.timeout(5):
+                return sorted([r.img_name async for r in downloader.run()])
+
+    assert asyncio.run(main()) == ["a1.jpg", "a2.jpg"]
+    assert (tmp_path / "a1.jpg").read_bytes() == b"/img/a1.jpg"
+
+
+def test_range_not_satisfiable_without_range_fails(tmp_path):
+    requested: list[str] = []
+
+    def range_handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/img/"):
+            requested.append(request.url.path)
+            return httpx.Response(416)
+
+        return handler(request)
+
+    config = CLIArgs(
+        url="https://example.com/b.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        ai_naming=False,
+        progress=False,
+        cache=False,
+        http_cache=False,
+        retries=0,
+    )
+
+    async def main() -> list[DownloadResult]:
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(range_handler)
+        ) as client:
+            return [result async for result in Downloader(config, client=client).run()]
+
+    # 没有发 Range 的 416 不是临时文件的问题，不重来
+    assert asyncio.run(main()) == []
+    assert requested == ["/img/b1.jpg"]
+
+
+@pytest.mark.parametrize("stream_parse", [True, False])
+def test_count_stops_page_discovery(tmp_path, stream_parse):
+    requested: list[str] = []
+
+    def tracking_handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        return handler(request)
+
+    config = CLIArgs(
+        url="https://example.com/p1.html",
+        urls=["https://example.com/p1.html", "https://example.com/b.html"],
+        selector=".c img",
+        next_page="a.next",
+        output_dir=str(tmp_path),
+        ai_naming=False,
+        progress=False,
+        cache=False,
+        http_cache=False,
+        page_concurrency=1,
+        stream_parse=stream_parse,
+        count=2,
+    )
+
+    async def main() -> list[str]:
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(tracking_handler)
+        ) as client:
+            downloader = Downloader(config, client=client)
+            return sorted([r.img_name async for r in downloader.run()])
+
+    assert asyncio.run(main()) == ["p1a.jpg", "p1b.jpg"]
+    # 数量够了以后排队的种子和下一页都不再请求
+    assert [path for path in requested if path.endswith(".html")] == ["/p1.html"]
+
+
+def test_not_modified_keeps_new_expiry(tmp_path):
+    requested: list[str] = []
+
+    def cache_handler(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+
+        if request.url.path.startswith("/img/"):
+            if "if-none-match" in request.headers:
+                return httpx.Response(
+                    304, headers={"etag": '"v1"', "cache-control": "max-age=3600"}
+                )
+
+            return httpx.Response(
+                200, content=request.url.path.encode(), headers={"etag": '"v1"'}
+            )
+
+        return handler(request)
+
+    config = CLIArgs(
+        url="https://example.com/b.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        ai_naming=False,
+        progress=False,
+        cache=False,
+        cache_dir=str(tmp_path),
+    )
+
+    async def main() -> None:
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(cache_handler)
+        ) as client:
+            async for _ in Downloader(config, client=client).run():
+                pass
+
+    for _ in range(3):
+        asyncio.run(main())
+
+    # 第二次 304 带回了新鲜期，第三次连条件请求都不发
+    assert requested.count("/img/b1.jpg") == 2
+    assert (
+        Manifest(tmp_path).by_url["https://example.com/img/b1.jpg"]["expires_at"]
+        > time.time()
+    )
+
+
+def test_concurrent_temporary_runs_keep_their_own_metrics(tmp_path):
+    config = CLIArgs(
+        url="",
+        selector=".c img",
+        output_dir="",
+        ai_naming=False,
+        progress=False,
+        cache=False,
+        http_cache=False,
+    )
+
+    async def collect(downloader: Downloader, page: str) -> list[str]:
+        output_dir = tmp_path / page
+        output_dir.mkdir()
+
+        return [
+            result.img_name
+            async for result in downloader.run(
+                urls=[f"https://example.com/{page}.html"],
+                output_dir=str(output_dir),
+                metrics_file=str(tmp_path / f"{page}.json"),
+            )
+        ]
+
+    async def main() -> None:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            # 没有进入 `async with`，两次运行共用一次临时打开，先结束的不会关掉写盘线程池
+            downloader = Downloader(config, client=client)
+            await asyncio.gather(collect(downloader, "a"), collect(downloader, "b"))
+
+            assert not downloader.opened
+
+    asyncio.run(main())
+
+    for page, count in (("a", 2), ("b", 1)):
+        report = json.loads((tmp_path / f"{page}.json").read_text())
+        assert report["histograms"]["download_seconds"]["count"] == count
+
+
+def test_larger_near_dup_does_not_overwrite_unrelated_files(tmp_path):
+    duck = tmp_path / "duck.jpg"
+    duck.write_bytes(b"small duck")
+    # 换扩展名后的名字已被另一张无关的图片占用
+    unrelated = tmp_path / "duck.webp"
+    unrelated.write_bytes(b"unrelated")
+    part = tmp_path / ".big.part"
+    part.write_bytes(b"big duck")
+
+    async def main() -> DownloadResult:
+        ctx = RunContext(
+            client=httpx.AsyncClient(),
+            host_limiter=HostLimiter(None),
+            naming_semaphore=asyncio.Semaphore(),
+            near_dups=NearDupIndex(tmp_path),
+        )
+        assert ctx.near_dups is not None
+        match = ctx.near_dups.add(
+            Signature(0xFF00, 100), duck, "https://a.com/duck.jpg"
+        )
+
+        try:
+            return await keep_largest(
+                "https://a.com/duck.webp",
+                Fetched(part, 8, "digest"),
+                Signature(0xFF01, 400),
+                match,
+                ctx,
+            )
+        finally:
+            ctx.near_dups.close()
+            ctx.writer.close()
+            await ctx.client.aclose()
+
+    result = asyncio.run(main())
+
+    assert result.full_path.suffix == ".webp" and result.full_path != unrelated
+    assert result.full_path.read_bytes() == b"big duck"
+    assert unrelated.read_bytes() == b"unrelated"
+    assert not duck.exists()
+
+
+def test_archive_conflicts_are_rejected_per_run(tmp_path):
+    config = CLIArgs(
+        url="https://example.com/a.html",
+        selector=".c img",
+        output_dir=str(tmp_path),
+        ai_naming=False,
+        progress=False,
+        output_archive="out.tar",
+    )
+
+    with pytest.raises(ValueError, match="--near-dup"):
+        CLIArgs(**{**vars(config), "near_dup": True})
+
+    async def main() -> None:
+        downloader = Downloader(config)
+
+        # 按次覆盖的配置同样校验，不只是命令行
+        async for _ in downloader.run(naming_late_rename=True):
+            pass
+
+    with pytest.raises(ValueError, match="--naming-late-rename"):
+        asyncio.run(main())
@@ -1,3 +1,5 @@
+import functools
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
 
@@ -27,7 +29,10 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env")
 
 
+@functools.cache
 def get_settings() -> Settings:
+    """读取并校验 `.env`，每个进程只做一次。"""
+
     settings = Settings()  # type: ignore
     return settings
 
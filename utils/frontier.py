@@ -0,0 +1,93 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+import httpx
+
+from .http_client import HostLimiter
+from .logger import logger
+from .timing import metrics
+from .url import normalize_url
+
+# 同一站点同时抓取的页面数，避免翻页时把对方打挂
+MAX_PAGES_PER_HOST = 2
+
+
+class Frontier:
+    """
+    待抓取页面的队列：按规范化 URL 去重，超过 `max_depth` 的链接不再入队。
+    种子 URL 深度为 0，每跟随一次“下一页”深度加 1。
+
+    .. code-block:: python
+        frontier = Frontier(max_depth=10)
+        frontier.add("https://www.zcool.com.cn/work/foo.html")
+    """
+
+    def __init__(self, max_depth: int = 0) -> None:
+        self.max_depth = max_depth
+        self.queue: asyncio.Queue[tuple[str, int]] = asyncio.Queue()
+        self.seen: set[str] = set()
+        self.closed = False
+
+    def add(self, url: str, depth: int = 0) -> bool:
+        if self.closed or depth > self.max_depth:
+            return False
+
+        if (key := normalize_url(url)) in self.seen:
+            return False
+
+        self.seen.add(key)
+        self.queue.put_nowait((url, depth))
+
+        return True
+
+    def close(self) -> None:
+        """不再接收新页面，丢弃还在排队的页面（`--count` 已够时）。正在处理的页面不受影响。"""
+
+        self.closed = True
+
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+
+
+async def crawl(
+    frontier: Frontier,
+    handle_page: Callable[[str, int], Awaitable[None]],
+    concurrency: int,
+    per_host_limit: int = MAX_PAGES_PER_HOST,
+) -> None:
+    """
+    用 `concurrency` 个页面 worker 消费 frontier，直到队列为空且没有页面在处理。
+    单个页面失败只记录日志，不影响其他页面。
+
+    :param handle_page: `handle_page(page_url, depth)` 抓取并解析页面，负责调度图片下载、把下一页加入 frontier
+    """
+
+    host_limiter = HostLimiter(per_host_limit)
+
+    async def worker():
+        while True:
+            page_url, depth = await frontier.queue.get()
+
+            try:
+                async with host_limiter(page_url):
+                    await handle_page(page_url, depth)
+            except httpx.HTTPError as error:
+                logger.error(f"❌ 抓取页面失败 {page_url}: {error!r}")
+                metrics.incr("page_failures_total")
+            except Exception:  # noqa: BLE001
+                # 畸形的下一页链接等意外错误也不能让 worker 退出，否则队列里的页面没人处理，join() 永远等下去
+                logger.exception(f"❌ 处理页面失败 {page_url}")
+                metrics.incr("page_failures_total")
+            finally:
+                frontier.queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+
+    try:
+        await frontier.queue.join()
+    finally:
+        for task in workers:
+            task.cancel()
+
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,72 @@
+import asyncio
+
+from .frontier import Frontier, crawl
+
+
+def test_frontier_dedupe_and_depth():
+    async def main():
+        frontier = Frontier(max_depth=1)
+
+        assert frontier.add("https://a.com/1?x=1&y=2")
+        assert not frontier.add("HTTPS://A.com/1?y=2&x=1#top")
+        assert frontier.add("https://a.com/2", depth=1)
+        assert not frontier.add("https://a.com/3", depth=2)
+
+        return frontier.queue.qsize()
+
+    assert asyncio.run(main()) == 2
+
+
+def test_crawl_follows_pages_concurrently():
+    # 1 -> 2 -> 3 -> 1（循环链接只抓一次），4 为另一个种子
+    links = {"/1": "/2", "/2": "/3", "/3": "/1", "/4": None}
+    visited: list[str] = []
+    in_flight = 0
+    max_in_flight = 0
+
+    async def main():
+        frontier = Frontier(max_depth=10)
+
+        async def handle_page(page_url: str, depth: int):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+            visited.append(page_url)
+            if next_page := links[page_url]:
+                frontier.add(next_page, depth + 1)
+
+        frontier.add("/1")
+        frontier.add("/4")
+        await crawl(frontier, handle_page, concurrency=4, per_host_limit=4)
+
+    asyncio.run(main())
+
+    assert sorted(visited) == ["/1", "/2", "/3", "/4"]
+    assert max_in_flight == 2
+
+
+def test_crawl_survives_unexpected_page_errors():
+    visited: list[str] = []
+
+    async def main():
+        frontier = Frontier()
+
+        async def handle_page(page_url: str, depth: int):
+            visited.append(page_url)
+
+            if page_url == "/bad":
+                raise ValueError("malformed next page href")
+
+        for url in ("/bad", "/1", "/2"):
+            frontier.add(url)
+
+        # 唯一的 worker 遇到意外错误后也要继续处理剩下的页面
+        async with asyncio.timeout(5):
+            await crawl(frontier, handle_page, concurrency=1)
+
+    asyncio.run(main())
+
+    assert visited == ["/bad", "/1", "/2"]
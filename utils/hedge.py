@@ -0,0 +1,61 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from .timing import Histogram, metrics
+
+# 样本太少时 p95 不可靠，宁可不对冲
+HEDGE_MIN_SAMPLES = 20
+HEDGE_QUANTILE = 0.95
+
+
+async def hedged[T](
+    call: Callable[[], Awaitable[T | None]], delay: float | None
+) -> T | None:
+    """
+    对冲请求：先发一次 `call()`，`delay` 秒后还没有结果就再发一次，取先成功的结果并取消另一个。
+    返回 None 或抛出异常都算失败，会继续等另一个；两个都失败时返回最后一个的结果（或抛出它的异常）。
+    `delay` 为 None 时不对冲。
+
+    .. code-block:: python
+        name = await hedged(lambda: backend.name_one(img, filename), hedge_delay(histogram))
+    """
+
+    first = asyncio.ensure_future(call())
+
+    if delay is None:
+        return await first
+
+    pending: set[asyncio.Future[T | None]] = {first}
+
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+
+        if not done:
+            metrics.incr("hedged_requests_total")
+            pending.add(asyncio.ensure_future(call()))
+
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for future in done:
+                if not future.exception() and (result := future.result()) is not None:
+                    return result
+
+            if not pending:
+                return future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def hedge_delay(
+    histogram: Histogram | None, min_samples: int = HEDGE_MIN_SAMPLES
+) -> float | None:
+    """按历史耗时的 p95 决定何时发对冲请求，只有最慢的 5% 会多花一次调用。"""
+
+    if histogram is None or histogram.count < min_samples:
+        return None
+
+    return histogram.percentile(HEDGE_QUANTILE)
@@ -0,0 +1,60 @@
+import asyncio
+
+from .hedge import hedge_delay, hedged
+from .timing import Histogram
+
+
+def test_hedged_uses_the_first_answer():
+    calls = []
+
+    async def call():
+        calls.append(len(calls))
+        # 第一次请求卡住，对冲的第二次很快返回
+        await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+        return f"answer-{len(calls)}"
+
+    async def main():
+        start = asyncio.get_running_loop().time()
+        result = await hedged(call, delay=0.05)
+
+        return result, asyncio.get_running_loop().time() - start
+
+    result, elapsed = asyncio.run(main())
+
+    assert result == "answer-2"
+    assert len(calls) == 2
+    assert elapsed < 0.5
+
+
+def test_hedged_waits_for_the_other_when_one_fails():
+    answers = iter([None, "slow"])
+
+    async def call():
+        answer = next(answers)
+        await asyncio.sleep(0.1 if answer else 0.05)
+        return answer
+
+    # 第一次在对冲发出后失败，等第二次的结果
+    assert asyncio.run(hedged(call, delay=0.01)) == "slow"
+
+
+def test_hedged_without_delay_calls_once():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "only"
+
+    assert asyncio.run(hedged(call, delay=None)) == "only"
+    assert calls == [1]
+
+
+def test_hedge_delay():
+    histogram = Histogram()
+
+    for value in range(1, 101):
+        histogram.observe(value / 100)
+
+    assert hedge_delay(histogram) == 0.95
+    assert hedge_delay(histogram, min_samples=1000) is None
+    assert hedge_delay(None) is None
@@ -0,0 +1,261 @@
+import re
+from html.parser import HTMLParser
+
+from bs4 import Tag
+
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+
+# 一个复合选择器：可选标签名，后跟任意个 #id、.class、[attr]、[attr=value]
+COMPOUND = re.compile(
+    r"""
+    (?P<tag>[a-zA-Z][\w-]*|\*)?
+    (?P<rest>(?:\#[\w-]+|\.[\w-]+|\[\s*[\w-]+\s*(?:[~^$*|]?=\s*(?:"[^"]*"|'[^']*'|[^\]\s]+)\s*)?\])*)
+    """,
+    re.VERBOSE,
+)
+PART = re.compile(
+    r"""\#(?P<id>[\w-]+)|\.(?P<cls>[\w-]+)|\[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[~^$*|]?=)\s*(?P<value>"[^"]*"|'[^']*'|[^\]\s]+)\s*)?\]""",
+    re.VERBOSE,
+)
+
+Element = tuple[str, dict[str, str]]
+
+
+class UnsupportedSelector(ValueError):
+    """选择器超出流式解析支持的子集（伪类、兄弟选择器等），需回退到 BeautifulSoup。"""
+
+
+class Compound:
+    def __init__(self, text: str) -> None:
+        match = COMPOUND.fullmatch(text)
+        if not text or match is None:
+            raise UnsupportedSelector(text)
+
+        tag = match.group("tag")
+        self.tag = None if tag in (None, "*") else tag.lower()
+        self.id: str | None = None
+        self.classes: list[str] = []
+        self.attrs: list[tuple[str, str | None, str | None]] = []
+
+        for part in PART.finditer(match.group("rest")):
+            if part.group("id"):
+                self.id = part.group("id")
+            elif part.group("cls"):
+                self.classes.append(part.group("cls"))
+            else:
+                value = part.group("value")
+                if value and value[0] in "\"'":
+                    value = value[1:-1]
+                self.attrs.append((part.group("attr").lower(), part.group("op"), value))
+
+    def matches(self, element: Element) -> bool:
+        tag, attrs = element
+
+        if self.tag is not None and tag != self.tag:
+            return False
+
+        if self.id is not None and attrs.get("id") != self.id:
+            return False
+
+        if self.classes:
+            classes = attrs.get("class", "").split()
+            if any(cls not in classes for cls in self.classes):
+                return False
+
+        for name, op, value in self.attrs:
+            if (actual := attrs.get(name)) is None:
+                return False
+            if op is None or value is None:
+                continue
+            if not match_attr(actual, op, value):
+                return False
+
+        return True
+
+
+def match_attr(actual: str, op: str, value: str) -> bool:
+    match op:
+        case "=":
+            return actual == value
+        case "~=":
+            return value in actual.split()
+        case "^=":
+            return actual.startswith(value)
+        case "$=":
+            return actual.endswith(value)
+        case "*=":
+            return value in actual
+        case "|=":
+            return actual == value or actual.startswith(value + "-")
+
+    return False
+
+
+class StreamSelector:
+    """
+    CSS 选择器的子集：类型、#id、.class、属性选择器，以及后代（空格）和子（>）组合符，逗号分隔多组。
+    根据当前元素及其祖先栈判断是否匹配，不需要完整的文档树。
+
+    .. code-block:: python
+        selector = StreamSelector(".md-content img")
+        selector.matches([("div", {"class": "md-content"}), ("p", {}), ("img", {"src": "a.png"})]) # => True
+    """
+
+    def __init__(self, selector: str) -> None:
+        self.groups: list[list[tuple[str, Compound]]] = []
+
+        for group in selector.split(","):
+            tokens = re.findall(r">|[^\s>]+", group)
+            if not tokens or tokens[0] == ">" or tokens[-1] == ">":
+                raise UnsupportedSelector(selector)
+
+            steps: list[tuple[str, Compound]] = []
+            combinator = " "
+
+            for token in tokens:
+                if token == ">":
+                    combinator = ">"
+                    continue
+
+                steps.append((combinator, Compound(token)))
+                combinator = " "
+
+            self.groups.append(steps)
+
+    def matches(self, stack: list[Element]) -> bool:
+        return any(self.match_steps(steps, stack) for steps in self.groups)
+
+    @staticmethod
+    def match_steps(steps: list[tuple[str, Compound]], stack: list[Element]) -> bool:
+        # 最后一个复合选择器必须匹配当前元素，其余从右往左在祖先中回溯匹配
+        def match_from(step: int, position: int) -> bool:
+            if not steps[step][1].matches(stack[position]):
+                return False
+            if step == 0:
+                return True
+
+            combinator = steps[step][0]
+
+            if combinator == ">":
+                return position > 0 and match_from(step - 1, position - 1)
+
+            return any(
+                match_from(step - 1, ancestor)
+                for ancestor in range(position - 1, -1, -1)
+            )
+
+        return match_from(len(steps) - 1, len(stack) - 1)
+
+
+class StreamExtractor(HTMLParser):
+    """
+    增量 HTML 解析：边 `feed()` 响应分块边匹配选择器，匹配到的元素立即可以 `drain()` 取走，
+    不构建完整文档树。匹配结果是只有属性、没有子节点的 bs4 `Tag`；
+    `<picture>` 里的元素会挂在一个只含此前 `<source>` 的 `picture` 父节点下，和 BeautifulSoup 一样可以读 `tag.parent`。
+
+    .. code-block:: python
+        extractor = StreamExtractor({"img": StreamSelector(".md-content img")})
+        async for chunk in response.aiter_text():
+            extractor.feed(chunk)
+            for key, tag in extractor.drain():
+                ...
+    """
+
+    def __init__(self, selectors: dict[str, StreamSelector]) -> None:
+        super().__init__(convert_charrefs=True)
+        self.selectors = selectors
+        self.stack: list[Element] = []
+        self.matched: list[tuple[str, Tag]] = []
+        # 当前 `<picture>` 中已经出现的 `<source>`，不在 `<picture>` 内时为 None
+        self.sources: list[dict[str, str]] | None = None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        element = (tag, {name: value or "" for name, value in attrs})
+        self.stack.append(element)
+        self.remember(element)
+        self.match(element)
+
+        if tag in VOID_ELEMENTS:
+            self.stack.pop()
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.stack.append((tag, {name: value or "" for name, value in attrs}))
+        self.remember(self.stack[-1])
+        self.match(self.stack[-1])
+        self.stack.pop()
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "picture":
+            self.sources = None
+
+        # 容忍未闭合的标签：弹出到最近的同名元素
+        for position in range(len(self.stack) - 1, -1, -1):
+            if self.stack[position][0] == tag:
+                del self.stack[position:]
+                return
+
+    def remember(self, element: Element) -> None:
+        tag, attrs = element
+
+        if tag == "picture":
+            self.sources = []
+        elif tag == "source" and self.sources is not None:
+            self.sources.append(attrs)
+
+    def match(self, element: Element) -> None:
+        for key, selector in self.selectors.items():
+            if selector.matches(self.stack):
+                tag, attrs = element
+                matched = Tag(
+                    name=tag,
+                    attrs=dict(attrs),
+                    can_be_empty_element=tag in VOID_ELEMENTS,
+                )
+
+                if self.sources is not None and tag != "picture":
+                    picture = Tag(name="picture")
+                    for source in self.sources:
+                        picture.append(
+                            Tag(
+                                name="source",
+                                attrs=dict(source),
+                                can_be_empty_element=True,
+                            )
+                        )
+                    picture.append(matched)
+
+                self.matched.append((key, matched))
+
+    def drain(self) -> list[tuple[str, Tag]]:
+        matched, self.matched = self.matched, []
+        return matched
+
+
+def compile_stream_selectors(
+    **selectors: str | None,
+) -> dict[str, StreamSelector] | None:
+    """全部选择器都在支持的子集内才走流式解析，否则返回 None。"""
+
+    try:
+        return {
+            key: StreamSelector(selector)
+            for key, selector in selectors.items()
+            if selector
+        }
+    except UnsupportedSelector:
+        return None
@@ -0,0 +1,50 @@
+from .html_stream import StreamExtractor, StreamSelector, compile_stream_selectors
+
+
+def test_stream_selector():
+    div = ("div", {"class": "md-content main"})
+    p = ("p", {})
+    img = ("img", {"src": "a.png", "data-type": "photo"})
+
+    assert StreamSelector(".md-content img").matches([div, p, img])
+    assert not StreamSelector(".md-content > img").matches([div, p, img])
+    assert StreamSelector("div.main > p > img").matches([div, p, img])
+    assert StreamSelector("img[data-type=photo]").matches([img])
+    assert StreamSelector('img[src$=".png"]').matches([img])
+    assert not StreamSelector("img[alt]").matches([img])
+    assert StreamSelector("picture img, .md-content img").matches([div, p, img])
+
+
+def test_compile_stream_selectors_falls_back():
+    assert compile_stream_selectors(img="img:nth-child(2)") is None
+    assert compile_stream_selectors(img="h1 + img") is None
+    assert compile_stream_selectors(img="img", next=".next:not(.disabled)") is None
+
+    selectors = compile_stream_selectors(img=".md-content img", next=None)
+    assert selectors is not None and list(selectors) == ["img"]
+
+
+def test_stream_extractor_chunks():
+    html = (
+        '<html><body><div class="md-content"><p><img src="a.png" alt="A">'
+        '<br><img src="b.png"/></p></div><img src="c.png">'
+        '<a class="next" href="/2">next</a></body></html>'
+    )
+    extractor = StreamExtractor(
+        {"img": StreamSelector(".md-content img"), "next": StreamSelector("a.next")}
+    )
+
+    matched = []
+    # 故意把标签切在分块边界上
+    for start in range(0, len(html), 7):
+        extractor.feed(html[start : start + 7])
+        matched += extractor.drain()
+    extractor.close()
+    matched += extractor.drain()
+
+    assert [(key, tag.get("src") or tag.get("href")) for key, tag in matched] == [
+        ("img", "a.png"),
+        ("img", "b.png"),
+        ("next", "/2"),
+    ]
+    assert matched[0][1].get("alt") == "A"
@@ -0,0 +1,191 @@
+import re
+import sqlite3
+import time
+from collections.abc import Mapping
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import NamedTuple
+
+from .logger import logger
+from .url import normalize_url
+
+DEFAULT_MAX_ENTRIES = 10_000
+
+
+class CachedPage(NamedTuple):
+    body: str
+    etag: str | None
+    last_modified: str | None
+    # 在此之前无需向服务器确认，0 表示每次都要重新验证
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+
+def conditional_headers(etag: str | None, last_modified: str | None) -> dict[str, str]:
+    """
+    条件请求头，资源未变化时服务器只返回 304。
+
+    .. code-block:: python
+        conditional_headers('"v1"', None) # => {"if-none-match": '"v1"'}
+    """
+
+    headers: dict[str, str] = {}
+
+    if etag:
+        headers["if-none-match"] = etag
+    if last_modified:
+        headers["if-modified-since"] = last_modified
+
+    return headers
+
+
+def cache_directives(headers: Mapping[str, str]) -> dict[str, str | None]:
+    directives: dict[str, str | None] = {}
+
+    for part in headers.get("cache-control", "").split(","):
+        if match := re.match(r"\s*([\w-]+)\s*(?:=\s*\"?([^\",]*)\"?)?", part):
+            directives[match.group(1).lower()] = match.group(2)
+
+    return directives
+
+
+def expires_at(headers: Mapping[str, str], now: float | None = None) -> float:
+    """
+    根据 Cache-Control `max-age` 或 Expires 计算新鲜期截止时间，`no-cache` 或没有缓存头时返回 0。
+
+    .. code-block:: python
+        expires_at({"cache-control": "public, max-age=60"}, now=100) # => 160
+    """
+
+    now = time.time() if now is None else now
+    directives = cache_directives(headers)
+
+    if "no-cache" in directives or "no-store" in directives:
+        return 0.0
+
+    if (max_age := directives.get("max-age")) is not None:
+        try:
+            return now + max(0, int(max_age))
+        except ValueError:
+            return 0.0
+
+    if expires := headers.get("expires"):
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+
+    return 0.0
+
+
+def is_storable(headers: Mapping[str, str]) -> bool:
+    """有校验头或新鲜期、且没有 `no-store` 的响应才值得缓存。"""
+
+    if "no-store" in cache_directives(headers):
+        return False
+
+    return bool(
+        headers.get("etag") or headers.get("last-modified") or expires_at(headers)
+    )
+
+
+class HttpCache:
+    """
+    页面响应的磁盘缓存（SQLite），保存正文和 ETag / Last-Modified / 新鲜期。
+    新鲜期内直接使用缓存；过期后带 If-None-Match / If-Modified-Since 重新验证，304 时沿用缓存的正文。
+    图片的校验头记在 `output_dir` 的清单里，见 `Manifest`。
+
+    .. code-block:: python
+        cache = HttpCache("~/.cache/picture-downloader-ai")
+        cache.put(url, response.headers, response.text)
+        cache.get(url)  # => CachedPage | None
+    """
+
+    def __init__(
+        self, cache_dir: str | Path, max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        cache_dir = Path(cache_dir).expanduser()
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.path = cache_dir / "pages.sqlite3"
+        self.max_entries = max_entries
+        self.not_modified = 0
+        self.fresh_hits = 0
+
+        self.db = sqlite3.connect(self.path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                stored_at REAL NOT NULL
+            )
+            """
+        )
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS pages_stored_at ON pages (stored_at)"
+        )
+        self.db.commit()
+
+    def get(self, url: str) -> CachedPage | None:
+        row = self.db.execute(
+            "SELECT body, etag, last_modified, expires_at FROM pages WHERE url = ?",
+            (normalize_url(url),),
+        ).fetchone()
+
+        return None if row is None else CachedPage(*row)
+
+    def put(self, url: str, headers: Mapping[str, str], body: str) -> None:
+        if not is_storable(headers):
+            return
+
+        self.db.execute(
+            "INSERT OR REPLACE INTO pages (url, body, etag, last_modified, expires_at, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                normalize_url(url),
+                body,
+                headers.get("etag"),
+                headers.get("last-modified"),
+                expires_at(headers),
+                time.time(),
+            ),
+        )
+        self.db.commit()
+        self.evict()
+
+    def refresh(self, url: str, headers: Mapping[str, str]) -> None:
+        """304 之后更新新鲜期，服务器下发了新的校验头时一并更新。"""
+
+        self.not_modified += 1
+        self.db.execute(
+            "UPDATE pages SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), expires_at = ?, stored_at = ? WHERE url = ?",
+            (
+                headers.get("etag"),
+                headers.get("last-modified"),
+                expires_at(headers),
+                time.time(),
+                normalize_url(url),
+            ),
+        )
+        self.db.commit()
+
+    def evict(self) -> None:
+        size = self.db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+        if (overflow := size - self.max_entries) > 0:
+            self.db.execute(
+                "DELETE FROM pages WHERE url IN (SELECT url FROM pages ORDER BY stored_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.db.commit()
+            logger.debug(f"🧹 page cache evicted {overflow} entries")
+
+    def close(self) -> None:
+        self.db.close()
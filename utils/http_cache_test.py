@@ -0,0 +1,37 @@
+from .http_cache import HttpCache, conditional_headers, expires_at, is_storable
+
+
+def test_expires_at():
+    assert expires_at({"cache-control": "public, max-age=60"}, now=100) == 160
+    assert expires_at({"cache-control": "no-cache, max-age=60"}, now=100) == 0
+    assert expires_at({"expires": "Thu, 01 Jan 1970 00:01:40 GMT"}, now=0) == 100
+    assert expires_at({"expires": "0"}, now=0) == 0
+    assert expires_at({}, now=100) == 0
+
+
+def test_is_storable():
+    assert is_storable({"etag": '"v1"'})
+    assert is_storable({"cache-control": "max-age=60"})
+    assert not is_storable({"etag": '"v1"', "cache-control": "no-store"})
+    assert not is_storable({})
+
+
+def test_http_cache(tmp_path):
+    cache = HttpCache(tmp_path)
+    url = "https://a.com/gallery?page=1"
+
+    cache.put(url, {"etag": '"v1"'}, "<html>v1</html>")
+    cache.put("https://a.com/no-validator", {}, "<html></html>")
+
+    assert (cached := cache.get(url)) is not None
+    assert cached.body == "<html>v1</html>"
+    assert not cached.fresh
+    assert conditional_headers(cached.etag, cached.last_modified) == {
+        "if-none-match": '"v1"'
+    }
+    assert cache.get("https://a.com/no-validator") is None
+
+    cache.refresh(url, {"cache-control": "max-age=60"})
+    assert (cached := cache.get(url)) is not None
+    assert cached.fresh and cached.etag == '"v1"'
+    assert cache.not_modified == 1
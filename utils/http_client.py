@@ -0,0 +1,118 @@
+import asyncio
+import contextlib
+from importlib.util import find_spec
+from urllib.parse import urlparse
+
+import httpx
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36"
+
+# 流式下载时每次写盘的块大小
+CHUNK_SIZE = 64 * 1024
+
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 30.0
+KEEPALIVE_EXPIRY = 30.0
+
+
+def create_client(
+    max_connections: int,
+    connect_timeout: float = CONNECT_TIMEOUT,
+    read_timeout: float = READ_TIMEOUT,
+    keepalive_expiry: float = KEEPALIVE_EXPIRY,
+) -> httpx.AsyncClient:
+    """
+    创建一次运行共享的 `httpx.AsyncClient`：连接池 + keep-alive，安装了 `h2` 时启用 HTTP/2。
+
+    :param max_connections: 连接池最大连接数，一般等于并发数
+    :param connect_timeout: 建立连接的超时秒数
+    :param read_timeout: 两次读到数据之间的超时秒数，大图片整体下载时间不受限
+    :param keepalive_expiry: 空闲连接保留的秒数
+    """
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+
+    return httpx.AsyncClient(
+        http2=find_spec("h2") is not None,
+        limits=limits,
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        headers={"user-agent": USER_AGENT},
+        follow_redirects=True,
+    )
+
+
+class HostLimiter:
+    """
+    按域名限制同时进行的请求数，`httpx.Limits` 只能限制整个连接池。
+
+    .. code-block:: python
+        limiter = HostLimiter(4)
+        async with limiter("https://img.zcool.cn/community/foo.jpg"):
+            ...
+    """
+
+    def __init__(self, limit: int | None) -> None:
+        self.limit = limit
+        self.semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def __call__(self, url: str) -> asyncio.Semaphore | contextlib.nullcontext[None]:
+        if not self.limit:
+            return contextlib.nullcontext()
+
+        host = urlparse(url).netloc
+
+        if (semaphore := self.semaphores.get(host)) is None:
+            semaphore = self.semaphores[host] = asyncio.Semaphore(self.limit)
+
+        return semaphore
+
+
+class ClientRegistry:
+    """
+    按上游（scheme + host + port）复用 `httpx.AsyncClient`：每个上游一个 keep-alive / HTTP/2 连接池，
+    限额和超时单独配置，不和图片下载抢连接。一次运行内的请求共用，结束时 `aclose()` 统一关闭。
+
+    .. code-block:: python
+        clients = ClientRegistry(max_connections=8, read_timeout=60)
+        client = clients.get("https://kimi.moonshot.cn/api/chat/xxx/completion/stream")
+        ...
+        await clients.aclose()
+
+    :param max_connections: 每个上游的最大连接数
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 10,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        keepalive_expiry: float = KEEPALIVE_EXPIRY,
+    ) -> None:
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.clients: dict[str, httpx.AsyncClient] = {}
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+
+        if (client := self.clients.get(origin)) is None:
+            client = self.clients[origin] = create_client(
+                self.max_connections,
+                connect_timeout=self.connect_timeout,
+                read_timeout=self.read_timeout,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+
+        return client
+
+    async def aclose(self) -> None:
+        clients, self.clients = self.clients, {}
+
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, TypedDict
+
+from .logger import logger
+
+if TYPE_CHECKING:
+    from .archive import ArchiveIndex
+
+MANIFEST_NAME = ".picture-downloader-manifest.jsonl"
+
+
+class ManifestRecord(TypedDict):
+    url: str
+    # 相对 output_dir 的文件名
+    path: str
+    size: int
+    sha256: str
+    etag: str | None
+    last_modified: str | None
+    # Cache-Control / Expires 给出的新鲜期截止时间，之前的清单没有这个字段
+    expires_at: float
+    finished_at: float
+
+
+class Manifest:
+    """
+    `output_dir` 下的任务清单（JSON Lines，只追加），记录每张已完成图片的 URL → 文件、大小、哈希和缓存校验头。
+    重新运行时据此跳过已完成的图片，并按内容哈希去重。
+
+    .. code-block:: python
+        manifest = Manifest(output_dir)
+        manifest.completed("https://img.zcool.cn/community/foo.jpg") # => ManifestRecord | None
+
+    :param archive: 图片写进归档（`--output-archive`）时，按归档索引确认成员完好
+    """
+
+    def __init__(
+        self, save_dir: str | Path, archive: "ArchiveIndex | None" = None
+    ) -> None:
+        self.save_dir = Path(save_dir)
+        self.archive = archive
+        self.path = self.save_dir / MANIFEST_NAME
+        self.by_url: dict[str, ManifestRecord] = {}
+        self.by_hash: dict[str, ManifestRecord] = {}
+
+        if self.path.exists():
+            self.load()
+
+        # 整次运行追加写，由 `close()` 关闭
+        self.file = open(self.path, "a", encoding="utf-8")  # noqa: SIM115
+
+    def load(self) -> None:
+        lines = 0
+
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+
+                try:
+                    record: ManifestRecord = json.loads(line)
+                except json.JSONDecodeError:
+                    # 上次运行写到一半被杀掉，最后一行可能不完整
+                    logger.warning(f"⚠️ 忽略清单中损坏的一行 {line[:80]!r}")
+                    continue
+
+                self.index(record)
+
+        # 同一 URL 重新验证、更新后会追加新的一行，过期的行多了就重写一遍
+        if lines > 2 * len(self.by_url):
+            self.compact()
+
+    def compact(self) -> None:
+        """每个 URL 只保留最新的一行。先写临时文件再替换，中途被杀掉也不会丢失清单。"""
+
+        tmp = self.path.with_name(self.path.name + ".tmp")
+
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(
+                json.dumps(record, ensure_ascii=False) + "\n"
+                for record in self.by_url.values()
+            )
+
+        os.replace(tmp, self.path)
+
+    def index(self, record: ManifestRecord) -> None:
+        self.by_url[record["url"]] = record
+        self.by_hash[record["sha256"]] = record
+
+    def full_path(self, record: ManifestRecord) -> Path:
+        return self.save_dir / record["path"]
+
+    def is_intact(self, record: ManifestRecord) -> bool:
+        full_path = self.full_path(record)
+
+        if (
+            self.archive is not None
+            and (size := self.archive.size(full_path)) is not None
+        ):
+            return size == record["size"]
+
+        return full_path.exists() and full_path.stat().st_size == record["size"]
+
+    def completed(self, url: str) -> ManifestRecord | None:
+        """该 URL 已下载且文件仍完好。"""
+
+        if (record := self.by_url.get(url)) is not None and self.is_intact(record):
+            return record
+
+        return None
+
+    def find_by_hash(self, sha256: str) -> ManifestRecord | None:
+        if (record := self.by_hash.get(sha256)) is not None and self.is_intact(record):
+            return record
+
+        return None
+
+    def add(
+        self,
+        url: str,
+        full_path: Path,
+        size: int,
+        sha256: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        expires_at: float = 0.0,
+    ) -> ManifestRecord:
+        record = ManifestRecord(
+            url=url,
+            path=full_path.relative_to(self.save_dir).as_posix(),
+            size=size,
+            sha256=sha256,
+            etag=etag,
+            last_modified=last_modified,
+            expires_at=expires_at,
+            finished_at=time.time(),
+        )
+
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.index(record)
+
+        return record
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
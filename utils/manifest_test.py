@@ -0,0 +1,42 @@
+from .manifest import MANIFEST_NAME, Manifest, file_digest
+
+
+def test_manifest(tmp_path):
+    image = tmp_path / "duck.jpg"
+    image.write_bytes(b"duck")
+
+    manifest = Manifest(tmp_path)
+    manifest.add("https://a.com/1.jpg", image, 4, file_digest(image), etag='"v1"')
+    manifest.close()
+
+    # 模拟上次运行写到一半被杀掉
+    with open(tmp_path / MANIFEST_NAME, "a") as f:
+        f.write('{"url": "https://a.com/2.jpg", "pa')
+
+    manifest = Manifest(tmp_path)
+
+    assert (record := manifest.completed("https://a.com/1.jpg")) is not None
+    assert record["path"] == "duck.jpg"
+    assert record["etag"] == '"v1"'
+    assert manifest.find_by_hash(file_digest(image)) == record
+    assert manifest.completed("https://a.com/2.jpg") is None
+
+    # 文件被删除或被改动后不再算完成
+    image.write_bytes(b"duckling")
+    assert manifest.completed("https://a.com/1.jpg") is None
+
+
+def test_manifest_compacts_superseded_lines(tmp_path):
+    image = tmp_path / "duck.jpg"
+    image.write_bytes(b"duck")
+
+    manifest = Manifest(tmp_path)
+    for expires_at in range(1, 6):
+        manifest.add("https://a.com/1.jpg", image, 4, "x", expires_at=expires_at)
+    manifest.close()
+
+    manifest = Manifest(tmp_path)
+    manifest.close()
+
+    assert (tmp_path / MANIFEST_NAME).read_text().count("\n") == 1
+    assert manifest.by_url["https://a.com/1.jpg"]["expires_at"] == 5
@@ -0,0 +1,183 @@
+"""
+确定性的模拟命名服务：同时实现 Kimi 和 OpenAI 兼容的 SSE 流式接口，按可配置的首 token 延迟和 token 间隔逐段返回，
+同一张图片永远得到同一个名字。用于基准测试和离线联调，不访问真实模型。
+
+.. code-block:: bash
+    uv run python -m utils.mock_sse --port 8081 --ttft 0.3
+    uv run main.py ... --naming-backend openai --naming-base-url http://127.0.0.1:8081/v1
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse
+
+# 兼容 `<img src="...">` 和 `{'src': '...'}` 两种写法
+SRC_PATTERN = re.compile(r"""\bsrc["']?\s*[=:]\s*["']([^"']+)["']""")
+KIMI_PATH = re.compile(r"^/api/chat/[^/]+/completion/stream$")
+
+
+@dataclass
+class MockOptions:
+    """
+    :param ttft: 收到请求到第一个 token 的秒数
+    :param token_delay: 相邻 token 的间隔秒数
+    :param token_size: 每个 token 的字符数
+    :param throttle_every: 每第 N 个请求返回 429（`Retry-After: 0`），0 表示从不限流
+    """
+
+    ttft: float = 0.2
+    token_delay: float = 0.005
+    token_size: int = 4
+    throttle_every: int = 0
+
+
+def mock_name(src: str) -> str:
+    suffix = Path(urlparse(src).path).suffix or ".jpg"
+    return f"mock-{hashlib.sha1(src.encode()).hexdigest()[:8]}{suffix}"
+
+
+def mock_answer(question: str) -> str:
+    """单张图片回答文件名，批量命名（提示词要求 JSON 数组）回答带编号的 JSON。"""
+
+    # 命名规则里也有 src 示例，只看最后一个代码块中的图片
+    fences = question.split("```")
+    srcs = SRC_PATTERN.findall(fences[-2] if len(fences) >= 3 else question)
+
+    if "JSON" not in question:
+        return mock_name(srcs[0] if srcs else question)
+
+    return json.dumps(
+        [{"i": index, "name": mock_name(src)} for index, src in enumerate(srcs, 1)]
+    )
+
+
+class MockServer(ThreadingHTTPServer):
+    # 默认 backlog 只有 5，高并发时会丢弃 SYN 反而成为瓶颈
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def __init__(self, options: MockOptions, port: int = 0) -> None:
+        super().__init__(("127.0.0.1", port), Handler)
+        self.options = options
+        self.requests = 0
+        # 新建的 TCP 连接数，用于观察客户端是否复用连接
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    # 分块传输，连接可以 keep-alive 复用
+    protocol_version = "HTTP/1.1"
+    server: MockServer
+
+    def setup(self) -> None:
+        super().setup()
+
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["content-length"] or 0)))
+        options = self.server.options
+
+        with self.server.lock:
+            self.server.requests += 1
+            throttled = (
+                options.throttle_every
+                and self.server.requests % options.throttle_every == 0
+            )
+
+        path = urlparse(self.path).path
+        openai = path.endswith("/chat/completions")
+
+        if not openai and not KIMI_PATH.match(path):
+            self.send_error(404)
+            return
+
+        if throttled:
+            payload = b'{"error": "rate limit"}'
+            self.send_response(429)
+            self.send_header("retry-after", "0")
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        question = body["messages"][-1]["content"]
+        answer = mock_answer(question)
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+
+        time.sleep(options.ttft)
+
+        for start in range(0, len(answer), options.token_size):
+            token = answer[start : start + options.token_size]
+            event = (
+                {"choices": [{"index": 0, "delta": {"content": token}}]}
+                if openai
+                else {"event": "cmpl", "text": token}
+            )
+            self.write_chunk(f"data: {json.dumps(event)}\n\n")
+            time.sleep(options.token_delay)
+
+        self.write_chunk(
+            "data: [DONE]\n\n" if openai else 'data: {"event": "all_done"}\n\n'
+        )
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text: str) -> None:
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(options: MockOptions | None = None, port: int = 0) -> MockServer:
+    """在后台线程启动模拟服务，`server.base_url` 为地址，用完调用 `server.shutdown()`。"""
+
+    server = MockServer(options or MockOptions(), port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockServer(
+        MockOptions(
+            ttft=args.ttft,
+            token_delay=args.token_delay,
+            throttle_every=args.throttle_every,
+        ),
+        args.port,
+    )
+    print(f"mock naming server on {server.base_url} (OpenAI: /v1/chat/completions)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from .logger import logger
+from .url import normalize_url
+
+# 缓存的名字 30 天后过期
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+def default_cache_dir() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / (
+        "picture-downloader-ai"
+    )
+
+
+class NameCache:
+    """
+    AI 命名的磁盘缓存（SQLite），键为规范化的图片 URL + alt，可选附带内容摘要。
+    过期时间 TTL，超过 `max_entries` 按最近访问时间淘汰（LRU）。
+    命中时只在内存中记下访问时间，淘汰前或 `close()` 时一次事务写回，查缓存不用每次等磁盘同步。
+
+    .. code-block:: python
+        cache = NameCache("~/.cache/picture-downloader-ai")
+        cache.put(img_url, alt, "duck-puppy-me-aside.jpg")
+        cache.get(img_url, alt)  # => "duck-puppy-me-aside.jpg"
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ) -> None:
+        cache_dir = Path(cache_dir).expanduser()
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.path = cache_dir / "names.sqlite3"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # 还没写回的访问时间，key -> accessed_at
+        self.accessed: dict[str, float] = {}
+
+        # 多个 cron 进程可能同时读写
+        self.db = sqlite3.connect(self.path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS names (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                alt TEXT NOT NULL,
+                digest TEXT,
+                name TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS names_digest ON names (digest)")
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS names_accessed_at ON names (accessed_at)"
+        )
+        self.db.commit()
+
+        self.size: int = self.db.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+
+    def get(self, url: str, alt: str, digest: str | None = None) -> str | None:
+        """先按 URL + alt 查找，找不到再按内容摘要查找。"""
+
+        now = time.time()
+        row = self.db.execute(
+            "SELECT key, name, created_at FROM names WHERE key = ?",
+            (self.key(url, alt),),
+        ).fetchone()
+
+        if row is None and digest:
+            row = self.db.execute(
+                "SELECT key, name, created_at FROM names WHERE digest = ? ORDER BY accessed_at DESC LIMIT 1",
+                (digest,),
+            ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        key, name, created_at = row
+
+        if now - created_at > self.ttl:
+            self.db.execute("DELETE FROM names WHERE key = ?", (key,))
+            self.db.commit()
+            self.accessed.pop(key, None)
+            self.size -= 1
+            self.misses += 1
+            return None
+
+        self.accessed[key] = now
+        self.hits += 1
+
+        return name
+
+    def put(self, url: str, alt: str, name: str, digest: str | None = None) -> None:
+        now = time.time()
+        key = self.key(url, alt)
+
+        inserted = self.db.execute(
+            "INSERT OR IGNORE INTO names (key, url, alt, digest, name, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, normalize_url(url), alt, digest, name, now, now),
+        ).rowcount
+
+        if not inserted:
+            self.db.execute(
+                "UPDATE names SET name = ?, digest = COALESCE(?, digest), created_at = ?, accessed_at = ? WHERE key = ?",
+                (name, digest, now, now, key),
+            )
+
+        self.db.commit()
+        self.accessed.pop(key, None)
+
+        self.size += inserted
+        if self.size > self.max_entries:
+            self.evict()
+
+    def set_digest(self, url: str, alt: str, digest: str) -> None:
+        """下载完成后补上内容摘要，之后换了 CDN 参数的同一张图也能命中。"""
+
+        self.db.execute(
+            "UPDATE names SET digest = ? WHERE key = ?", (digest, self.key(url, alt))
+        )
+        self.db.commit()
+
+    def flush(self) -> None:
+        """把内存中的访问时间一次写回，淘汰依据的是最新的访问顺序。"""
+
+        if not self.accessed:
+            return
+
+        self.db.executemany(
+            "UPDATE names SET accessed_at = ? WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self.accessed.items()],
+        )
+        self.db.commit()
+        self.accessed.clear()
+
+    def evict(self) -> None:
+        self.flush()
+        self.db.execute(
+            "DELETE FROM names WHERE created_at < ?", (time.time() - self.ttl,)
+        )
+        self.size = self.db.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+
+        if (overflow := self.size - self.max_entries) > 0:
+            self.db.execute(
+                "DELETE FROM names WHERE key IN (SELECT key FROM names ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.size -= overflow
+
+        self.db.commit()
+        logger.debug(f"🧹 name cache evicted down to {self.size} entries")
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+    @staticmethod
+    def key(url: str, alt: str) -> str:
+        return hashlib.sha256(f"{normalize_url(url)}\0{alt}".encode()).hexdigest()
@@ -0,0 +1,85 @@
+import time
+
+from .name_cache import NameCache
+
+URL = "https://img.zcool.cn/community/01vttarjy7ow5sdayn6tah3731.jpg?b=2&a=1"
+
+
+def test_get_put(tmp_path):
+    cache = NameCache(tmp_path)
+
+    assert cache.get(URL, "鸭子") is None
+    cache.put(URL, "鸭子", "duck.jpg")
+
+    # query 参数顺序不同也能命中
+    assert (
+        cache.get(
+            "https://img.zcool.cn/community/01vttarjy7ow5sdayn6tah3731.jpg?a=1&b=2",
+            "鸭子",
+        )
+        == "duck.jpg"
+    )
+    assert cache.get(URL, "小狗") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    cache.close()
+
+    # 持久化：重新打开后仍然命中
+    assert NameCache(tmp_path).get(URL, "鸭子") == "duck.jpg"
+
+
+def test_digest_lookup(tmp_path):
+    cache = NameCache(tmp_path)
+    cache.put(URL, "", "duck.jpg")
+    cache.set_digest(URL, "", "abc")
+
+    assert (
+        cache.get("https://cdn.example.com/other.jpg", "", digest="abc") == "duck.jpg"
+    )
+
+
+def test_ttl(tmp_path):
+    cache = NameCache(tmp_path, ttl=0.01)
+    cache.put(URL, "", "duck.jpg")
+    time.sleep(0.02)
+
+    assert cache.get(URL, "") is None
+    assert cache.size == 0
+
+
+def test_lru_eviction(tmp_path):
+    cache = NameCache(tmp_path, max_entries=2)
+    cache.put("https://a.com/1.jpg", "", "1.jpg")
+    cache.put("https://a.com/2.jpg", "", "2.jpg")
+
+    # 访问 1 之后 2 是最久未使用的
+    time.sleep(0.01)
+    cache.get("https://a.com/1.jpg", "")
+    cache.put("https://a.com/3.jpg", "", "3.jpg")
+
+    assert cache.size == 2
+    assert cache.get("https://a.com/2.jpg", "") is None
+    assert cache.get("https://a.com/1.jpg", "") == "1.jpg"
+    assert cache.get("https://a.com/3.jpg", "") == "3.jpg"
+
+
+def test_accessed_at_is_written_back_on_close(tmp_path):
+    cache = NameCache(tmp_path)
+    cache.put(URL, "", "duck.jpg")
+    (accessed_at,) = cache.db.execute("SELECT accessed_at FROM names").fetchone()
+
+    time.sleep(0.01)
+    cache.get(URL, "")
+
+    # 命中不写库
+    assert cache.db.execute("SELECT accessed_at FROM names").fetchone() == (
+        accessed_at,
+    )
+    assert cache.db.in_transaction is False
+
+    cache.close()
+
+    reopened = NameCache(tmp_path)
+    assert reopened.db.execute("SELECT accessed_at FROM names").fetchone()[0] > (
+        accessed_at
+    )
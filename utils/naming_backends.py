@@ -0,0 +1,240 @@
+import os
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Sequence
+from pathlib import Path
+from typing import ClassVar
+
+import bs4
+import httpx
+
+from .ai import (
+    KIMI_BASE_URL,
+    Img,
+    ask_ai_for_image_name,
+    ask_ai_for_image_names,
+    ask_kimi,
+    ask_openai,
+)
+from .http_client import ClientRegistry
+from .rate_limit import AdaptiveRateLimiter
+
+BACKENDS = ("kimi", "openai", "local")
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+OPENAI_MODEL = "gpt-4o-mini"
+
+# 本地命名最多保留的词数，和 AI 命名规则一致
+MAX_WORDS = 12
+
+
+class NamingBackend(ABC):
+    """
+    命名后端：给一张或一批图片起名字，失败时返回 None 由调用方回退到 src 中的文件名。
+    每个后端声明自己能承受的并发数和单次请求的图片数，调度器据此确定命名并发和批大小。
+    """
+
+    name: ClassVar[str]
+    # 同时进行的命名请求数上限
+    max_concurrency: int = 4
+    # 一次请求最多命名几张图片，1 表示不支持批量
+    max_batch_size: int = 1
+    # 是否经过共享的 AI 限速器
+    rate_limited: bool = True
+    # 名字是否值得写入命名缓存，本地计算的名字重算比查缓存还快
+    cacheable: bool = True
+    # 一次运行共用的连接池，None 时每次请求临时建立连接
+    clients: ClientRegistry | None = None
+
+    def check(self) -> None:
+        """开始下载前校验配置，有问题时抛出异常，而不是每张图片命名时各失败一次。"""
+
+    @abstractmethod
+    async def name_one(
+        self,
+        img: bs4.Tag | Img,
+        filename: str,
+        rate_limiter: AdaptiveRateLimiter | None = None,
+    ) -> str | None: ...
+
+    async def name_many(
+        self,
+        imgs: Sequence[bs4.Tag | Img],
+        filenames: Sequence[str],
+        rate_limiter: AdaptiveRateLimiter | None = None,
+    ) -> list[str | None]:
+        return [
+            await self.name_one(img, filename, rate_limiter)
+            for img, filename in zip(imgs, filenames)
+        ]
+
+
+class ChatBackend(NamingBackend):
+    """通过对话模型命名，提示词和回答解析在 `ai.py`，子类只负责 `ask()` 这一次流式问答。"""
+
+    max_batch_size = 20
+    # 领到令牌后多少秒内没有第一个 token 就放弃，None 表示一直等
+    ttft_timeout: float | None = None
+    base_url: str
+
+    @property
+    def client(self) -> httpx.AsyncClient | None:
+        return self.clients.get(self.base_url) if self.clients is not None else None
+
+    @abstractmethod
+    def ask(
+        self, question: str, rate_limiter: AdaptiveRateLimiter | None = None
+    ) -> AsyncIterator[str]: ...
+
+    async def name_one(self, img, filename, rate_limiter=None):
+        return await ask_ai_for_image_name(
+            img, filename, rate_limiter=rate_limiter, ask=self.ask
+        )
+
+    async def name_many(self, imgs, filenames, rate_limiter=None):
+        return await ask_ai_for_image_names(
+            imgs, filenames, rate_limiter=rate_limiter, ask=self.ask
+        )
+
+
+class KimiBackend(ChatBackend):
+    """
+    Kimi 网页版的 SSE 对话接口，`chat_id`、`authorization` 默认从 `.env` 读取。
+    网页版限流严格，并发不宜超过 4。
+    """
+
+    name = "kimi"
+    max_concurrency = 4
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        chat_id: str | None = None,
+        authorization: str | None = None,
+    ) -> None:
+        self.base_url = base_url or KIMI_BASE_URL
+        self.chat_id = chat_id
+        self.authorization = authorization
+
+    def check(self) -> None:
+        if self.chat_id is None or self.authorization is None:
+            from .env_settings import get_settings
+
+            get_settings()
+
+    def ask(self, question, rate_limiter=None):
+        return ask_kimi(
+            question,
+            rate_limiter,
+            base_url=self.base_url,
+            chat_id=self.chat_id,
+            authorization=self.authorization,
+            ttft_timeout=self.ttft_timeout,
+            client=self.client,
+        )
+
+
+class OpenAIBackend(ChatBackend):
+    """
+    任意 OpenAI 兼容的 `/chat/completions` 接口：OpenAI，或者本地的 llama.cpp server、vLLM。
+    `api_key` 默认读环境变量 `OPENAI_API_KEY`，本地服务可以不设。
+    """
+
+    name = "openai"
+    max_concurrency = 16
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        model: str | None = None,
+        api_key: str | None = None,
+    ) -> None:
+        self.base_url = base_url or OPENAI_BASE_URL
+        self.model = model or OPENAI_MODEL
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+
+    def check(self) -> None:
+        if self.base_url == OPENAI_BASE_URL and not self.api_key:
+            raise ValueError("OPENAI_API_KEY is required for api.openai.com")
+
+    def ask(self, question, rate_limiter=None):
+        return ask_openai(
+            question,
+            rate_limiter,
+            base_url=self.base_url,
+            model=self.model,
+            api_key=self.api_key,
+            ttft_timeout=self.ttft_timeout,
+            client=self.client,
+        )
+
+
+class LocalBackend(NamingBackend):
+    """
+    完全离线：把 alt（没有时用 title）转写成 slug，拉丁字母去掉变音符号，中日韩文字原样保留。
+    没有 alt 时返回 None，沿用 src 中的文件名。
+
+    .. code-block:: python
+        await LocalBackend().name_one(Img(alt="Crème brûlée 食谱", src="a.jpg"), "a.jpg")
+        # => "creme-brulee-食谱.jpg"
+    """
+
+    name = "local"
+    max_concurrency = 64
+    rate_limited = False
+    cacheable = False
+
+    async def name_one(self, img, filename, rate_limiter=None):
+        text = str(img.get("alt") or img.get("title") or "")
+
+        if not (stem := slugify(text)):
+            return None
+
+        return stem + (Path(filename).suffix.lower() or ".jpg")
+
+
+def slugify(text: str, max_words: int = MAX_WORDS) -> str:
+    """
+    .. code-block:: python
+        slugify("A Duck & a Puppy!") # => "a-duck-a-puppy"
+        slugify("远方有虫鸣鸟叫，我的鸭子") # => "远方有虫鸣鸟叫-我的鸭子"
+    """
+
+    # NFKD 把 é 拆成 e + 组合符号，去掉组合符号即完成转写；全角字符也会变成半角
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    words = re.findall(r"\w+", stripped.lower())
+
+    return "-".join(words[:max_words])
+
+
+def create_backend(
+    kind: str = "kimi",
+    base_url: str | None = None,
+    model: str | None = None,
+    api_key: str | None = None,
+    ttft_timeout: float | None = None,
+) -> NamingBackend:
+    """
+    .. code-block:: python
+        create_backend("openai", base_url="http://127.0.0.1:8080/v1", model="qwen2.5-7b-instruct")
+    """
+
+    backend: ChatBackend
+
+    match kind:
+        case "kimi":
+            backend = KimiBackend(base_url)
+        case "openai":
+            backend = OpenAIBackend(base_url, model, api_key)
+        case "local":
+            return LocalBackend()
+        case _:
+            raise ValueError(
+                f"unknown naming backend {kind!r}, expected one of {BACKENDS}"
+            )
+
+    backend.ttft_timeout = ttft_timeout
+
+    return backend
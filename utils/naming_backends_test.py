@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from .ai import Img
+from .http_client import ClientRegistry
+from .mock_sse import MockOptions, mock_name, serve
+from .naming_backends import (
+    KimiBackend,
+    LocalBackend,
+    OpenAIBackend,
+    create_backend,
+    slugify,
+)
+from .rate_limit import AdaptiveRateLimiter
+
+
+def test_slugify():
+    assert slugify("A Duck & a Puppy!") == "a-duck-a-puppy"
+    assert slugify("Crème brûlée 食谱") == "creme-brulee-食谱"
+    assert slugify("远方有虫鸣鸟叫，我的鸭子") == "远方有虫鸣鸟叫-我的鸭子"
+    assert slugify(" ") == ""
+
+
+def test_local_backend():
+    backend = LocalBackend()
+
+    assert (
+        asyncio.run(backend.name_one(Img(alt="My Duck", src="x.PNG"), "x.PNG"))
+        == "my-duck.png"
+    )
+    assert asyncio.run(backend.name_one(Img(alt="", src="x.png"), "x.png")) is None
+
+
+@pytest.fixture
+def mock_server():
+    server = serve(MockOptions(ttft=0, token_delay=0, throttle_every=2))
+    yield server
+    server.shutdown()
+
+
+def test_chat_backends_against_mock_server(mock_server):
+    imgs = [Img(alt="", src=f"https://example.com/{index}.jpg") for index in range(3)]
+    filenames = [f"{index}.jpg" for index in range(3)]
+    expected = [mock_name(img["src"]) for img in imgs]
+
+    backends = [
+        OpenAIBackend(base_url=f"{mock_server.base_url}/v1", model="mock"),
+        KimiBackend(mock_server.base_url, chat_id="mock", authorization="Bearer mock"),
+    ]
+
+    async def main():
+        # 模拟服务每第二个请求返回 429，限速器退避后重试
+        limiter = AdaptiveRateLimiter(rate=1000, max_rate=1000)
+
+        for backend in backends:
+            assert await backend.name_one(imgs[0], filenames[0], limiter) == expected[0]
+            assert await backend.name_many(imgs, filenames, limiter) == expected
+
+        return limiter
+
+    limiter = asyncio.run(main())
+
+    # 7 个请求中第 2、4、6 个被限流
+    assert limiter.throttled == 3
+
+
+def test_chat_backends_reuse_connections():
+    server = serve(MockOptions(ttft=0, token_delay=0))
+    backends = [
+        OpenAIBackend(base_url=f"{server.base_url}/v1", model="mock"),
+        KimiBackend(server.base_url, chat_id="mock", authorization="Bearer mock"),
+    ]
+    imgs = [Img(alt="", src=f"https://example.com/{index}.jpg") for index in range(3)]
+
+    async def main():
+        clients = ClientRegistry(max_connections=1)
+
+        for backend in backends:
+            backend.clients = clients
+
+            for img in imgs:
+                assert await backend.name_one(img, "x.jpg") == mock_name(img["src"])
+
+        await clients.aclose()
+
+    try:
+        asyncio.run(main())
+    finally:
+        server.shutdown()
+
+    # 两个后端是同一个上游，6 次命名只建立一个连接
+    assert server.requests == 6
+    assert server.connections == 1
+
+
+def test_create_backend():
+    assert isinstance(create_backend("local"), LocalBackend)
+
+    with pytest.raises(ValueError):
+        create_backend("gpt")
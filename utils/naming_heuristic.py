@@ -0,0 +1,164 @@
+import functools
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from urllib.parse import unquote
+
+WORDS_FILE = Path(__file__).parent / "words.txt"
+
+# 这些词单独出现时不算有描述性，比如 IMG_1234.jpg、photo-01.png、thumbnail.webp
+GENERIC_WORDS = {
+    "img",
+    "image",
+    "images",
+    "photo",
+    "pic",
+    "picture",
+    "screenshot",
+    "thumbnail",
+    "thumb",
+    "file",
+    "default",
+    "copy",
+    "final",
+    "version",
+    "download",
+    "upload",
+    "test",
+    "cover",
+    "preview",
+    "original",
+    "large",
+    "small",
+    "medium",
+    "big",
+    "mini",
+    "new",
+}
+
+MAX_WORD_LENGTH = 20
+
+# 至少这么多比例的字母能被切分成单词才算可读
+MIN_COVERAGE = 0.75
+
+
+@functools.cache
+def load_words() -> frozenset[str]:
+    return frozenset(WORDS_FILE.read_text(encoding="utf-8").split())
+
+
+def is_descriptive_filename(filename: str) -> bool:
+    """
+    判断 src 中的文件名是否已经具备描述性，是则无需 AI 命名。
+
+    .. code-block:: python
+        is_descriptive_filename("httpx-help.png") # => True
+        is_descriptive_filename("sunsetbeach.jpg") # => True
+        is_descriptive_filename("01vttarjy7ow5sdayn6tah3731.jpg") # => False
+        is_descriptive_filename("IMG_1234.jpg") # => False
+    """
+
+    stem = Path(unquote(filename)).stem
+    tokens = tokenize(stem)
+
+    if not tokens or any(looks_like_id(token) for token in tokens):
+        return False
+
+    words: list[str] = []
+    letters = covered = 0
+
+    for token in tokens:
+        alpha = re.sub(r"[^a-z]", "", token)
+        if not alpha:
+            continue
+
+        token_words, token_covered = segment(alpha)
+        words += token_words
+        letters += len(alpha)
+        covered += token_covered
+
+    if not letters or covered / letters < MIN_COVERAGE:
+        return False
+
+    return any(word not in GENERIC_WORDS for word in words)
+
+
+def tokenize(stem: str) -> list[str]:
+    """按分隔符和驼峰拆分，全部转小写。"""
+
+    stem = re.sub(r"([a-z])([A-Z])", r"\1 \2", stem)
+
+    return [token.lower() for token in re.split(r"[\W_]+", stem) if token]
+
+
+def looks_like_id(token: str) -> bool:
+    """
+    识别哈希、UUID 片段、CDN 随机 ID 等无意义的串。
+
+    .. code-block:: python
+        looks_like_id("01vttarjy7ow5sdayn6tah3731") # => True
+        looks_like_id("a3f9c2e1b4d5") # => True
+        looks_like_id("python3") # => False
+    """
+
+    if len(token) < 8:
+        return False
+
+    has_digit = any(char.isdigit() for char in token)
+
+    # 十六进制哈希
+    if has_digit and re.fullmatch(r"[0-9a-f]+", token):
+        return True
+
+    # 字母数字频繁交替，比如 7ow5sdayn6tah
+    if len(re.findall(r"[a-z]+|[0-9]+", token)) >= 4:
+        return True
+
+    # 长且字符分布接近随机
+    return len(token) >= 16 and shannon_entropy(token) > 3.5
+
+
+def shannon_entropy(text: str) -> float:
+    counts = Counter(text)
+
+    return -sum(
+        count / len(text) * math.log2(count / len(text)) for count in counts.values()
+    )
+
+
+def segment(text: str) -> tuple[list[str], int]:
+    """
+    把没有分隔符的串切分成词典里的单词，尽量多地覆盖字母，同等覆盖时单词越少越好。
+
+    :return: (单词列表, 被单词覆盖的字母数)
+
+    .. code-block:: python
+        segment("sunsetbeach") # => (["sunset", "beach"], 11)
+    """
+
+    words = load_words()
+
+    # best[i] 为 text[:i] 的最优切分：(覆盖字母数, -单词数, 单词列表)
+    best: list[tuple[int, int, list[str]]] = [(0, 0, [])]
+
+    for end in range(1, len(text) + 1):
+        # 跳过一个不认识的字母
+        candidate = best[end - 1]
+
+        for start in range(max(0, end - MAX_WORD_LENGTH), end):
+            word = text[start:end]
+            if word not in words:
+                continue
+
+            covered, negative_count, segmented = best[start]
+            option = (covered + len(word), negative_count - 1, segmented + [word])
+
+            if option[:2] > candidate[:2]:
+                candidate = option
+
+        best.append(candidate)
+
+    covered, _, segmented = best[-1]
+
+    return segmented, covered
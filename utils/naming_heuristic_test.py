@@ -0,0 +1,29 @@
+from .naming_heuristic import is_descriptive_filename, looks_like_id, segment
+
+
+def test_is_descriptive_filename():
+    assert is_descriptive_filename("httpx-help.png")
+    assert is_descriptive_filename("puppy-duck-with-me-around.jpg")
+    assert is_descriptive_filename("sunsetbeach.jpg")
+    assert is_descriptive_filename("RedPanda_2024.webp")
+    assert is_descriptive_filename("logo.svg")
+
+    assert not is_descriptive_filename("01vttarjy7ow5sdayn6tah3731.jpg")
+    assert not is_descriptive_filename("a3f9c2e1b4d5e6f7.png")
+    assert not is_descriptive_filename("IMG_1234.jpg")
+    assert not is_descriptive_filename("photo-01.png")
+    assert not is_descriptive_filename("qzxkvbnmwp.jpg")
+    assert not is_descriptive_filename("20250613.jpg")
+
+
+def test_looks_like_id():
+    assert looks_like_id("01vttarjy7ow5sdayn6tah3731")
+    assert looks_like_id("a3f9c2e1b4d5")
+    assert not looks_like_id("python3")
+    assert not looks_like_id("sunflower")
+
+
+def test_segment():
+    assert segment("sunsetbeach") == (["sunset", "beach"], 11)
+    assert segment("redpandagarden") == (["red", "panda", "garden"], 14)
+    assert segment("qzxhelp") == (["help"], 4)
@@ -0,0 +1,259 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import NamedTuple, TypedDict
+from uuid import uuid4
+
+from .logger import logger
+
+NEAR_DUP_INDEX_NAME = ".picture-downloader-phash.jsonl"
+
+HASH_BITS = 64
+# 同一张图的不同尺寸 / CDN 参数，dHash 的汉明距离一般在 4 以内
+DEFAULT_THRESHOLD = 4
+MAX_THRESHOLD = 10
+
+
+class Signature(NamedTuple):
+    phash: int
+    pixels: int
+
+
+class PhashRecord(TypedDict):
+    id: str
+    # 16 位十六进制的 dHash
+    phash: str
+    # 相对 output_dir 的文件名
+    path: str
+    pixels: int
+    url: str
+
+
+def dhash(path: str | Path) -> Signature | None:
+    """
+    差值哈希：缩成 9x8 灰度图，逐行比较相邻像素得到 64 位指纹，对缩放、压缩、格式转换不敏感。
+    不是图片或无法解码时返回 None。需要 Pillow。
+    """
+
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(path) as image:
+            pixels = image.width * image.height
+            # JPEG 可以直接按缩小的尺寸解码，快很多
+            image.draft("L", (64, 64))
+            small = image.convert("L").resize((9, 8), Image.Resampling.BILINEAR)
+    except (UnidentifiedImageError, OSError) as error:
+        logger.debug(f"cannot hash {path}: {error!r}")
+        return None
+
+    data = small.tobytes()
+    phash = 0
+
+    for row in range(8):
+        for col in range(8):
+            phash = (phash << 1) | (data[row * 9 + col] > data[row * 9 + col + 1])
+
+    return Signature(phash, pixels)
+
+
+class HammingIndex:
+    """
+    多索引哈希（multi-index hashing）：把 64 位指纹切成 threshold + 1 段，每段建一张哈希表。
+    汉明距离不超过 threshold 的两个指纹至少有一段完全相同（抽屉原理），只需比较这些候选。
+    10 万张图片、阈值 4 时单次查询约 0.1 毫秒。
+
+    .. code-block:: python
+        index = HammingIndex(threshold=4)
+        index.add(0xF0F0F0F0F0F0F0F0, "duck.jpg")
+        index.search(0xF0F0F0F0F0F0F0F1)  # => [(1, "duck.jpg")]
+    """
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD) -> None:
+        self.threshold = threshold
+        self.slices: list[tuple[int, int]] = []
+        self.tables: list[dict[int, list[tuple[int, str]]]] = []
+
+        segments = threshold + 1
+        width, extra = divmod(HASH_BITS, segments)
+        offset = 0
+
+        for segment in range(segments):
+            bits = width + (segment < extra)
+            self.slices.append((offset, (1 << bits) - 1))
+            self.tables.append({})
+            offset += bits
+
+    def add(self, phash: int, key: str) -> None:
+        entry = (phash, key)
+
+        for table, (offset, mask) in zip(self.tables, self.slices):
+            table.setdefault((phash >> offset) & mask, []).append(entry)
+
+    def remove(self, phash: int, key: str) -> None:
+        entry = (phash, key)
+
+        for table, (offset, mask) in zip(self.tables, self.slices):
+            bucket = table.get((phash >> offset) & mask, [])
+
+            if entry in bucket:
+                bucket.remove(entry)
+
+    def search(self, phash: int) -> list[tuple[int, str]]:
+        """返回距离不超过阈值的 (距离, key)，按距离升序。"""
+
+        found: dict[str, int] = {}
+
+        for table, (offset, mask) in zip(self.tables, self.slices):
+            for candidate, key in table.get((phash >> offset) & mask, ()):
+                if key in found:
+                    continue
+
+                if (distance := (phash ^ candidate).bit_count()) <= self.threshold:
+                    found[key] = distance
+
+        return sorted((distance, key) for key, distance in found.items())
+
+
+class NearDupIndex:
+    """
+    `output_dir` 下的感知哈希索引（JSON Lines，只追加），跨运行查找近似重复的图片。
+    同一 id 的后一行覆盖前一行，用于记录“保留了更大的版本”。
+
+    并发下载时用 `claim()` 查找并占住记录，保存或替换完成前其他近似重复的图片等待，不会都被当成新图片保存。
+
+    .. code-block:: python
+        index = NearDupIndex(output_dir)
+        record, duplicate = await index.claim(signature, img_url)
+
+        if duplicate:
+            ...  # 和 record 比较，保留更大的版本
+            index.release(record)
+        else:
+            index.publish(record, full_path)  # 保存失败时 index.discard(record)
+    """
+
+    def __init__(
+        self, save_dir: str | Path, threshold: int = DEFAULT_THRESHOLD
+    ) -> None:
+        self.save_dir = Path(save_dir)
+        self.path = self.save_dir / NEAR_DUP_INDEX_NAME
+        self.records: dict[str, PhashRecord] = {}
+        self.index = HammingIndex(threshold)
+        # 被占住的记录（正在保存或替换），释放时通知等待的任务
+        self.busy: dict[str, asyncio.Event] = {}
+
+        if self.path.exists():
+            self.load()
+
+        for record in self.records.values():
+            self.index.add(int(record["phash"], 16), record["id"])
+
+        # 整次运行追加写，由 `close()` 关闭
+        self.file = open(self.path, "a", encoding="utf-8")  # noqa: SIM115
+
+    def load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record: PhashRecord = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ 忽略感知哈希索引中损坏的一行 {line[:80]!r}")
+                    continue
+
+                self.records[record["id"]] = record
+
+    def find(self, phash: int) -> PhashRecord | None:
+        """距离最近、且文件仍然存在的近似重复图片。"""
+
+        for _, key in self.index.search(phash):
+            record = self.records[key]
+
+            # 占住的新记录还没有文件
+            if key in self.busy or self.full_path(record).exists():
+                return record
+
+        return None
+
+    async def claim(self, signature: Signature, url: str) -> tuple[PhashRecord, bool]:
+        """
+        查找近似重复并占住它；没有时登记一条还没有文件的新记录并占住。查找和登记之间没有 await，是原子的。
+        找到的记录被别的任务占着时先等它释放，再按释放后的结果重新查找。
+
+        :return: (记录, 是否为近似重复)。调用方用完后必须 `release()`、`publish()` 或 `discard()`
+        """
+
+        while (match := self.find(signature.phash)) is not None and (
+            busy := self.busy.get(match["id"])
+        ) is not None:
+            await busy.wait()
+
+        if match is not None:
+            self.busy[match["id"]] = asyncio.Event()
+            return match, True
+
+        record = PhashRecord(
+            id=uuid4().hex,
+            phash=f"{signature.phash:016x}",
+            path="",
+            pixels=signature.pixels,
+            url=url,
+        )
+        self.records[record["id"]] = record
+        self.index.add(signature.phash, record["id"])
+        self.busy[record["id"]] = asyncio.Event()
+
+        return record, False
+
+    def release(self, record: PhashRecord) -> None:
+        if (busy := self.busy.pop(record["id"], None)) is not None:
+            busy.set()
+
+    def publish(self, record: PhashRecord, full_path: Path) -> None:
+        """`claim()` 登记的新记录保存成功。"""
+
+        record["path"] = full_path.relative_to(self.save_dir).as_posix()
+        self.write(record)
+        self.release(record)
+
+    def discard(self, record: PhashRecord) -> None:
+        """`claim()` 登记的新记录没有保存（下载后处理失败、和已有文件内容相同）。"""
+
+        self.records.pop(record["id"], None)
+        self.index.remove(int(record["phash"], 16), record["id"])
+        self.release(record)
+
+    def add(self, signature: Signature, full_path: Path, url: str) -> PhashRecord:
+        record = PhashRecord(
+            id=uuid4().hex,
+            phash=f"{signature.phash:016x}",
+            path=full_path.relative_to(self.save_dir).as_posix(),
+            pixels=signature.pixels,
+            url=url,
+        )
+
+        self.records[record["id"]] = record
+        self.index.add(signature.phash, record["id"])
+        self.write(record)
+
+        return record
+
+    def update(
+        self, record: PhashRecord, full_path: Path, pixels: int, url: str
+    ) -> None:
+        """近似重复的图片换成了更大的版本，指纹沿用原来的。"""
+
+        record["path"] = full_path.relative_to(self.save_dir).as_posix()
+        record["pixels"] = pixels
+        record["url"] = url
+        self.write(record)
+
+    def full_path(self, record: PhashRecord) -> Path:
+        return self.save_dir / record["path"]
+
+    def write(self, record: PhashRecord) -> None:
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
@@ -0,0 +1,103 @@
+import asyncio
+import random
+
+import pytest
+
+from .near_dup import HammingIndex, NearDupIndex, Signature, dhash
+
+
+def test_hamming_index():
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(1000)]
+    index = HammingIndex(threshold=4)
+
+    for key, phash in enumerate(hashes):
+        index.add(phash, str(key))
+
+    assert index.search(hashes[42] ^ 0b1011) == [(3, "42")]
+    assert index.search(hashes[42] ^ 0b11111) == []
+
+    # 和暴力搜索结果一致
+    query = hashes[7] ^ (1 << 63) ^ 1
+    assert index.search(query) == sorted(
+        ((query ^ phash).bit_count(), str(key))
+        for key, phash in enumerate(hashes)
+        if (query ^ phash).bit_count() <= 4
+    )
+
+
+def test_near_dup_index(tmp_path):
+    duck = tmp_path / "duck.jpg"
+    duck.write_bytes(b"duck")
+
+    index = NearDupIndex(tmp_path)
+    record = index.add(Signature(0xFF00, 100), duck, "https://a.com/duck.jpg")
+    index.close()
+
+    index = NearDupIndex(tmp_path)
+    found = index.find(0xFF01)
+    assert found == record
+
+    bigger = tmp_path / "duck.webp"
+    bigger.write_bytes(b"bigger duck")
+    duck.unlink()
+    index.update(found, bigger, 400, "https://a.com/duck.webp")
+    index.close()
+
+    record = NearDupIndex(tmp_path).find(0xFF00)
+    assert record is not None
+    assert (record["path"], record["pixels"]) == ("duck.webp", 400)
+
+
+def test_dhash(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+
+    picture = Image.effect_mandelbrot((400, 300), (-2, -1.5, 1, 1.5), 100)
+    picture.save(tmp_path / "large.png")
+    picture.resize((100, 75)).save(tmp_path / "small.jpg", quality=70)
+    Image.effect_mandelbrot((400, 300), (-1, -0.5, 0, 0.5), 100).save(
+        tmp_path / "other.png"
+    )
+    (tmp_path / "broken.jpg").write_bytes(b"not an image")
+
+    large = dhash(tmp_path / "large.png")
+    small = dhash(tmp_path / "small.jpg")
+    other = dhash(tmp_path / "other.png")
+
+    assert large is not None and small is not None and other is not None
+    assert large.pixels == 400 * 300
+    assert (large.phash ^ small.phash).bit_count() <= 4
+    assert (large.phash ^ other.phash).bit_count() > 4
+    assert dhash(tmp_path / "broken.jpg") is None
+
+
+def test_claim_is_atomic(tmp_path):
+    index = NearDupIndex(tmp_path)
+    duck = tmp_path / "duck.jpg"
+
+    async def main():
+        first, duplicate = await index.claim(Signature(0xFF00, 100), "a")
+        assert not duplicate
+
+        # 第一张还没保存完，第二张等它保存后作为近似重复
+        second = asyncio.ensure_future(index.claim(Signature(0xFF01, 400), "b"))
+        await asyncio.sleep(0)
+        assert not second.done()
+
+        duck.write_bytes(b"duck")
+        index.publish(first, duck)
+        assert await second == (first, True)
+        index.release(first)
+
+        # 占住的新记录被丢弃后，等待的一方登记自己的记录
+        third, _ = await index.claim(Signature(0x0F0F, 100), "c")
+        fourth = asyncio.ensure_future(index.claim(Signature(0x0F0E, 100), "d"))
+        await asyncio.sleep(0)
+        index.discard(third)
+        record, duplicate = await fourth
+
+        assert not duplicate and record["url"] == "d"
+        assert index.find(0x0F0F) == record
+
+    asyncio.run(main())
+    index.close()
@@ -0,0 +1,161 @@
+import asyncio
+from dataclasses import dataclass
+from importlib.util import find_spec
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from .writer import FileWriter
+
+# 扩展名 -> Pillow 格式名
+FORMATS = {
+    "jpg": "JPEG",
+    "jpeg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP",
+    "avif": "AVIF",
+}
+
+THUMBS_DIR = "thumbs"
+
+
+def has_pillow() -> bool:
+    return find_spec("PIL") is not None
+
+
+@dataclass(frozen=True)
+class PostProcessOptions:
+    """
+    下载完成后的图片处理，需要安装 Pillow（`uv sync --extra image`）。
+
+    :param convert: 转换为该格式，比如 "jpg"、"avif"
+    :param max_size: 长边超过该像素时等比缩小
+    :param thumbs: 在 `thumbs/` 子目录生成长边为该像素的缩略图
+    :param strip_exif: 去掉 EXIF 等元数据（先按 EXIF 方向摆正）
+    """
+
+    convert: str | None = None
+    max_size: int | None = None
+    thumbs: int | None = None
+    strip_exif: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.convert or self.max_size or self.thumbs or self.strip_exif)
+
+
+class Processed(NamedTuple):
+    path: Path
+    thumb: Path | None
+
+
+def process_image(
+    src: str, dst: str, options: PostProcessOptions
+) -> tuple[str, str | None]:
+    """
+    在子进程中执行：按 `dst` 的格式处理 `src`，结果和缩略图写到 `dst` 所在目录的临时文件。
+    发布由事件循环里的 `FileWriter` 完成，子进程不碰最终文件名，不会覆盖同时发布的同名图片。
+    无法处理的图片抛出 OSError 或 ValueError。
+
+    :return: (处理结果的临时文件, 缩略图的临时文件)
+    """
+
+    from PIL import Image, ImageOps
+
+    src_path, dst_path = Path(src), Path(dst)
+    image_format = FORMATS.get(dst_path.suffix.lower().lstrip("."))
+
+    try:
+        opened = Image.open(src_path)
+    except Image.DecompressionBombError as error:
+        # 不是 OSError 的子类，换成 ValueError 让调用方按处理失败对待
+        raise ValueError(str(error)) from None
+
+    with opened:
+        image_format = image_format or opened.format
+        exif = opened.info.get("exif")
+        image = opened
+
+        if options.strip_exif:
+            # 方向信息随 EXIF 一起丢掉之前先把像素摆正
+            image = ImageOps.exif_transpose(image)
+
+        if options.max_size and max(image.size) > options.max_size:
+            image = image.copy()
+            image.thumbnail((options.max_size, options.max_size))
+
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        save_kwargs = {} if options.strip_exif or not exif else {"exif": exif}
+        # 同一目录下 `src` 的文件名唯一，临时文件不会和其他图片的撞车
+        part_path = dst_path.with_name(f".{src_path.name}.part")
+        image.save(part_path, format=image_format, **save_kwargs)
+
+        thumb_part = None
+        if options.thumbs:
+            thumb_part = dst_path.parent / THUMBS_DIR / part_path.name
+            thumb_part.parent.mkdir(exist_ok=True)
+
+            thumb = image.copy()
+            thumb.thumbnail((options.thumbs, options.thumbs))
+            thumb.save(thumb_part, format=image_format)
+
+    return str(part_path), str(thumb_part) if thumb_part else None
+
+
+class PostProcessor:
+    """
+    下载后的 CPU 密集处理（解码、缩放、编码）放到进程池，不阻塞事件循环，也不受 GIL 限制，吞吐随核数增长。
+
+    处理结果通过 `writer` 发布：原地处理时覆盖原图，转换格式时由 `writer.commit()` 换一个不冲突的名字，
+    不会覆盖同时发布的同名图片。
+
+    .. code-block:: python
+        postprocessor = PostProcessor(PostProcessOptions(convert="jpg", max_size=2048))
+        processed = await postprocessor(Path("output/duck.webp"), writer)  # => Processed(path=Path("output/duck.jpg"), thumb=None)
+        postprocessor.close()
+    """
+
+    def __init__(self, options: PostProcessOptions, workers: int | None = None) -> None:
+        # multiprocessing 只在启用后处理时导入
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.options = options
+        self.executor: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=workers)
+
+    async def __call__(self, path: Path, writer: "FileWriter") -> Processed:
+        dst = self.target(path)
+        loop = asyncio.get_running_loop()
+        part, thumb_part = await loop.run_in_executor(
+            self.executor, process_image, str(path), str(dst), self.options
+        )
+
+        try:
+            if dst == path:
+                await writer.replace(Path(part), path)
+            else:
+                dst, _ = await writer.commit(Path(part), dst)
+                await writer.run(path.unlink)
+
+            thumb = None
+            if thumb_part:
+                thumb, _ = await writer.commit(
+                    Path(thumb_part), dst.parent / THUMBS_DIR / dst.name
+                )
+        except BaseException:
+            for leftover in (part, thumb_part):
+                if leftover:
+                    Path(leftover).unlink(missing_ok=True)
+            raise
+
+        return Processed(dst, thumb)
+
+    def target(self, path: Path) -> Path:
+        if not self.options.convert:
+            return path
+
+        return path.with_suffix("." + self.options.convert.lower())
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
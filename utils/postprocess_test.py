@@ -0,0 +1,72 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from .postprocess import PostProcessOptions, PostProcessor, process_image
+from .writer import FileWriter
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def make_webp(path, size=(400, 200)):
+    image = Image.new("RGBA", size, (255, 0, 0, 128))
+    exif = Image.Exif()
+    exif[0x010E] = "duck"  # ImageDescription
+    image.save(path, format="WEBP", exif=exif)
+
+
+def test_process_image(tmp_path):
+    src = tmp_path / "duck.webp"
+    make_webp(src)
+    dst = tmp_path / "duck.jpg"
+
+    part, thumb = process_image(
+        str(src),
+        str(dst),
+        PostProcessOptions(convert="jpg", max_size=100, thumbs=50, strip_exif=True),
+    )
+
+    # 子进程只写临时文件，原图和最终文件名留给事件循环处理
+    assert src.exists() and not dst.exists()
+    with Image.open(part) as image:
+        assert image.format == "JPEG"
+        assert image.size == (100, 50)
+        assert not image.getexif()
+
+    assert thumb is not None and Path(thumb).parent == tmp_path / "thumbs"
+    with Image.open(thumb) as image:
+        assert image.size == (50, 25)
+
+
+def test_post_processor_avoids_collisions(tmp_path):
+    (tmp_path / "duck.jpg").write_bytes(b"another picture")
+    sources = [tmp_path / "duck.webp", tmp_path / "duck.png"]
+
+    for src in sources:
+        make_webp(src)
+
+    async def main():
+        writer = FileWriter()
+        postprocessor = PostProcessor(
+            PostProcessOptions(convert="jpg", thumbs=50), workers=2
+        )
+        try:
+            return await asyncio.gather(
+                *(postprocessor(src, writer) for src in sources)
+            )
+        finally:
+            postprocessor.close()
+            writer.close()
+
+    processed = asyncio.run(main())
+    paths = {result.path for result in processed}
+
+    # 同时转换成同一个名字的两张图片和已有文件互不覆盖
+    assert len(paths) == 2 and tmp_path / "duck.jpg" not in paths
+    assert (tmp_path / "duck.jpg").read_bytes() == b"another picture"
+    assert not any(src.exists() for src in sources)
+    assert {result.thumb.name for result in processed if result.thumb} == {
+        path.name for path in paths
+    }
+    assert not list(tmp_path.rglob(".*.part"))
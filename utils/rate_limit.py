@@ -0,0 +1,174 @@
+import asyncio
+import math
+import time
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+
+from .logger import logger
+
+
+class AdaptiveRateLimiter:
+    """
+    令牌桶 + AIMD：每次成功速率加 `increase`，被限流时速率乘以 `decrease`，
+    并在 Retry-After（或 1 / 新速率）秒内暂停发放令牌。所有 AI 命名请求共享一个实例。
+
+    .. code-block:: python
+        limiter = AdaptiveRateLimiter(rate=1)
+        await limiter.acquire()
+        # 请求成功
+        limiter.on_success()
+        # 或者收到 429
+        limiter.on_throttle(parse_retry_after(response.headers.get("retry-after")))
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        min_rate: float = 0.05,
+        max_rate: float = 5.0,
+        increase: float = 0.1,
+        decrease: float = 0.5,
+    ) -> None:
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+
+        self.tokens = 1.0
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.throttled = 0
+        # 排队的请求按先来后到拿令牌
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.refill(now)
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def refill(self, now: float) -> None:
+        # 桶容量为 1：空闲再久也不会攒出突发流量
+        self.tokens = min(1.0, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def on_success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        self.throttled += 1
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = 0.0
+
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+        logger.warning(
+            f"🐢 AI 请求被限流，速率降为 {self.rate:.2f} 次/秒，暂停 {pause:.1f} 秒"
+        )
+
+
+class BandwidthLimiter:
+    """
+    令牌桶限制下载的总带宽（字节/秒），所有下载共享。桶容量为一秒的流量，允许单次透支，
+    透支多少就等多少时间还上。
+
+    .. code-block:: python
+        bandwidth = BandwidthLimiter(parse_bandwidth("10M"))
+        async for chunk in response.aiter_bytes():
+            await bandwidth.consume(len(chunk))
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def consume(self, amount: int) -> None:
+        async with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.rate, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= amount
+
+            if self.tokens < 0:
+                await asyncio.sleep(-self.tokens / self.rate)
+
+
+def parse_bandwidth(value: str) -> float:
+    """
+    解析带宽，单位为字节/秒，支持 K / M / G 后缀（1024 进制）。
+
+    .. code-block:: python
+        parse_bandwidth("500K") # => 512000.0
+        parse_bandwidth("10M") # => 10485760.0
+    """
+
+    return parse_bytes(value.strip().upper().removesuffix("/S"), "bandwidth")
+
+
+def parse_bytes(value: str, kind: str = "size") -> float:
+    """
+    解析字节数，支持 K / M / G 后缀（1024 进制）。
+
+    .. code-block:: python
+        parse_bytes("1G") # => 1073741824.0
+    """
+
+    text = value.strip().upper().removesuffix("B")
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    multiplier = units.get(text[-1:], 1)
+
+    if text[-1:] in units:
+        text = text[:-1]
+
+    try:
+        amount = float(text) * multiplier
+    except ValueError:
+        raise ValueError(f"invalid {kind} {value!r}, expected e.g. 500K or 10M")
+
+    # float() 也接受 "inf" 和 "nan"
+    if not math.isfinite(amount) or amount <= 0:
+        raise ValueError(f"{kind} must be a positive number, got {value!r}")
+
+    return amount
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    解析 Retry-After 响应头，支持秒数和 HTTP 日期两种格式。
+
+    .. code-block:: python
+        parse_retry_after("3") # => 3.0
+        parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") # => 0.0（已经过去）
+    """
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (date - datetime.now(UTC)).total_seconds())
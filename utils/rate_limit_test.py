@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from .rate_limit import (
+    AdaptiveRateLimiter,
+    parse_bandwidth,
+    parse_bytes,
+    parse_retry_after,
+)
+
+
+def test_aimd():
+    limiter = AdaptiveRateLimiter(rate=1.0, max_rate=1.15, increase=0.1)
+
+    limiter.on_success()
+    assert limiter.rate == 1.1
+    limiter.on_success()
+    assert limiter.rate == 1.15
+
+    limiter.on_throttle(retry_after=0)
+    assert limiter.rate == 0.575
+    assert limiter.throttled == 1
+
+
+def test_acquire_rate():
+    async def main():
+        limiter = AdaptiveRateLimiter(rate=50, max_rate=50)
+        start_time = time.perf_counter()
+
+        for _ in range(6):
+            await limiter.acquire()
+
+        return time.perf_counter() - start_time
+
+    # 第一个令牌立即可用，之后每 20ms 一个
+    assert 0.09 < asyncio.run(main()) < 0.3
+
+
+def test_retry_after_pauses():
+    async def main():
+        limiter = AdaptiveRateLimiter(rate=100)
+        await limiter.acquire()
+        limiter.on_throttle(retry_after=0.1)
+
+        start_time = time.perf_counter()
+        await limiter.acquire()
+
+        return time.perf_counter() - start_time
+
+    assert asyncio.run(main()) >= 0.1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+def test_parse_bytes():
+    assert parse_bytes("1G") == 1024**3
+    assert parse_bytes("500kb") == 500 * 1024
+    assert parse_bandwidth("2M/s") == 2 * 1024**2
+
+
+@pytest.mark.parametrize("value", ["inf", "nan", "-1K", "0", "1e400", "ten"])
+def test_parse_bytes_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_bytes(value)
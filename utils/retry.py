@@ -0,0 +1,211 @@
+import asyncio
+import json
+import random
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import TypedDict
+from urllib.parse import urlparse
+
+import httpx
+
+from .logger import logger
+from .timing import metrics
+
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+# 同一域名连续失败这么多次后熔断，熔断期间直接失败不发请求
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+FAILED_NAME = ".picture-downloader-failed.jsonl"
+
+
+class CircuitOpenError(Exception):
+    """域名处于熔断状态，请求未发出。"""
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = BACKOFF_BASE,
+    cap: float = BACKOFF_CAP,
+    rng: random.Random | None = None,
+) -> float:
+    """
+    指数退避 + 全抖动（full jitter），避免大量失败的请求同时重试。
+
+    .. code-block:: python
+        backoff_delay(0) # => 0 ~ 0.5 秒
+        backoff_delay(3) # => 0 ~ 4 秒
+    """
+
+    return (rng or random).uniform(0, min(cap, base * 2**attempt))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """网络错误、超时、429 和 5xx 值得重试，404 等客户端错误重试也没用。"""
+
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+
+    return isinstance(error, httpx.TransportError)
+
+
+class CircuitBreaker:
+    """
+    按域名熔断：连续失败 `threshold` 次后打开，`reset_timeout` 秒内该域名的请求直接失败；
+    之后放行一个试探请求（半开），成功则关闭，失败则重新计时。
+
+    .. code-block:: python
+        breaker = CircuitBreaker()
+        breaker.check(url)  # 熔断中抛出 CircuitOpenError
+        breaker.on_success(url) / breaker.on_failure(url)
+    """
+
+    def __init__(
+        self, threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT
+    ) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures: dict[str, int] = {}
+        self.opened_at: dict[str, float] = {}
+        self.probing: set[str] = set()
+
+    def check(self, url: str) -> None:
+        host = urlparse(url).netloc
+
+        if (opened_at := self.opened_at.get(host)) is None:
+            return
+
+        if time.monotonic() - opened_at < self.reset_timeout or host in self.probing:
+            raise CircuitOpenError(f"{host} 连续失败 {self.failures[host]} 次，已熔断")
+
+        self.probing.add(host)
+
+    def release(self, url: str) -> None:
+        """试探请求结束（包括被取消、因非网络原因失败），让出半开状态的名额。"""
+
+        self.probing.discard(urlparse(url).netloc)
+
+    def on_success(self, url: str) -> None:
+        host = urlparse(url).netloc
+        self.failures.pop(host, None)
+        self.opened_at.pop(host, None)
+        self.probing.discard(host)
+
+    def on_failure(self, url: str) -> None:
+        host = urlparse(url).netloc
+        self.failures[host] = self.failures.get(host, 0) + 1
+        self.probing.discard(host)
+
+        if self.failures[host] >= self.threshold:
+            if host not in self.opened_at:
+                logger.warning(f"🔌 {host} 连续失败 {self.failures[host]} 次，熔断")
+            self.opened_at[host] = time.monotonic()
+
+
+async def with_retry[T](
+    url: str,
+    request: Callable[[], Awaitable[T]],
+    retries: int = DEFAULT_RETRIES,
+    breaker: CircuitBreaker | None = None,
+) -> T:
+    """
+    执行 `request()`，可重试的错误按指数退避重试最多 `retries` 次；每次尝试都经过熔断器。
+    404 之类的非重试状态码说明域名是通的，对熔断器算作成功。
+    """
+
+    for attempt in range(retries + 1):
+        if breaker is not None:
+            breaker.check(url)
+
+        try:
+            try:
+                result = await request()
+            finally:
+                if breaker is not None:
+                    breaker.release(url)
+        except Exception as error:
+            if breaker is not None:
+                if is_retryable(error):
+                    breaker.on_failure(url)
+                elif isinstance(error, httpx.HTTPStatusError):
+                    breaker.on_success(url)
+
+            if attempt == retries or not is_retryable(error):
+                raise
+
+            delay = backoff_delay(attempt)
+            metrics.incr("download_retries_total")
+            logger.debug(f"🔁 retry {url} in {delay:.2f}s after {error!r}")
+            await asyncio.sleep(delay)
+            continue
+
+        if breaker is not None:
+            breaker.on_success(url)
+
+        return result
+
+    raise AssertionError("unreachable")
+
+
+class FailedItem(TypedDict):
+    page_url: str
+    # 图片标签的属性，重放时据此重建 Tag
+    attrs: dict[str, str]
+    error: str
+    failed_at: float
+
+
+class RetryQueue:
+    """
+    `output_dir` 下失败图片的队列（JSON Lines）。每次运行结束时用本次的失败项覆盖，
+    `--retry-failed` 时只重放这些图片而不再抓取页面。
+
+    .. code-block:: python
+        queue = RetryQueue(output_dir)
+        queue.add(page_url, dict(img.attrs), error)
+        queue.save()
+    """
+
+    def __init__(self, save_dir: str | Path) -> None:
+        self.path = Path(save_dir) / FAILED_NAME
+        self.items: list[FailedItem] = []
+
+    def add(self, page_url: str, attrs: dict[str, str], error: BaseException) -> None:
+        self.items.append(
+            FailedItem(
+                page_url=page_url,
+                attrs=attrs,
+                error=repr(error),
+                failed_at=time.time(),
+            )
+        )
+
+    def load(self) -> list[FailedItem]:
+        if not self.path.exists():
+            return []
+
+        items: list[FailedItem] = []
+
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ 忽略失败队列中损坏的一行 {line[:80]!r}")
+
+        return items
+
+    def save(self) -> None:
+        if not self.items:
+            self.path.unlink(missing_ok=True)
+            return
+
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.writelines(
+                json.dumps(item, ensure_ascii=False) + "\n" for item in self.items
+            )
@@ -0,0 +1,139 @@
+import asyncio
+import random
+
+import httpx
+import pytest
+
+from .retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryQueue,
+    backoff_delay,
+    is_retryable,
+    with_retry,
+)
+
+
+def status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://a.com/1.jpg")
+    response = httpx.Response(status, request=request)
+
+    return httpx.HTTPStatusError(str(status), request=request, response=response)
+
+
+def test_backoff_delay():
+    rng = random.Random(0)
+
+    assert all(0 <= backoff_delay(3, rng=rng) <= 4 for _ in range(100))
+    assert backoff_delay(100, cap=1, rng=rng) <= 1
+
+
+def test_is_retryable():
+    assert is_retryable(httpx.ConnectError("refused"))
+    assert is_retryable(status_error(503))
+    assert is_retryable(status_error(429))
+    assert not is_retryable(status_error(404))
+    assert not is_retryable(ValueError())
+
+
+def test_circuit_breaker(monkeypatch):
+    from . import retry
+
+    now = 0.0
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now)
+    breaker = CircuitBreaker(threshold=2, reset_timeout=10)
+
+    breaker.on_failure("https://a.com/1.jpg")
+    breaker.check("https://a.com/2.jpg")
+    breaker.on_failure("https://a.com/2.jpg")
+
+    with pytest.raises(CircuitOpenError):
+        breaker.check("https://a.com/3.jpg")
+    breaker.check("https://b.com/1.jpg")
+
+    # 过了冷却期只放行一个试探请求
+    now = 11.0
+    breaker.check("https://a.com/4.jpg")
+    with pytest.raises(CircuitOpenError):
+        breaker.check("https://a.com/5.jpg")
+
+    breaker.on_success("https://a.com/4.jpg")
+    breaker.check("https://a.com/6.jpg")
+
+
+def test_half_open_probe_always_releases(monkeypatch):
+    from . import retry
+
+    now = 0.0
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now)
+    breaker = CircuitBreaker(threshold=1, reset_timeout=10)
+    url = "https://a.com/1.jpg"
+
+    async def missing():
+        raise status_error(404)
+
+    async def stuck():
+        await asyncio.sleep(10)
+
+    async def main():
+        nonlocal now
+
+        # 被取消的试探请求让出名额，但熔断器仍是打开的
+        breaker.on_failure(url)
+        now = 11.0
+        probe = asyncio.create_task(with_retry(url, stuck, 0, breaker))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        # 404 说明域名是通的，熔断器关闭
+        with pytest.raises(httpx.HTTPStatusError):
+            await with_retry(url, missing, 0, breaker)
+
+        breaker.check(url)
+
+    asyncio.run(main())
+    assert not breaker.probing and "a.com" not in breaker.opened_at
+
+
+def test_with_retry(monkeypatch):
+    from . import retry
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(retry.asyncio, "sleep", no_sleep)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise httpx.ReadTimeout("timeout")
+        return "ok"
+
+    assert asyncio.run(with_retry("https://a.com/1.jpg", flaky, retries=3)) == "ok"
+    assert len(attempts) == 3
+
+    async def missing():
+        attempts.append(1)
+        raise status_error(404)
+
+    attempts.clear()
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(with_retry("https://a.com/1.jpg", missing, retries=3))
+    assert len(attempts) == 1
+
+
+def test_retry_queue(tmp_path):
+    queue = RetryQueue(tmp_path)
+    queue.add("https://a.com/", {"src": "/1.jpg"}, httpx.ConnectError("refused"))
+    queue.save()
+
+    items = RetryQueue(tmp_path).load()
+    assert [(item["page_url"], item["attrs"]) for item in items] == [
+        ("https://a.com/", {"src": "/1.jpg"})
+    ]
+
+    RetryQueue(tmp_path).save()
+    assert RetryQueue(tmp_path).load() == []
@@ -0,0 +1,241 @@
+import asyncio
+import re
+from typing import Literal, NamedTuple
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+from bs4 import Tag
+
+from .http_client import HostLimiter
+from .logger import logger
+from .url import get_full_url
+
+# 懒加载插件常用的属性，越靠前越可能是真实地址
+LAZY_SRC_ATTRS = (
+    "data-src",
+    "data-original",
+    "data-lazy-src",
+    "data-actualsrc",
+    "data-url",
+    "src",
+)
+SRCSET_ATTRS = ("srcset", "data-srcset", "data-lazy-srcset")
+
+# 七牛等 CDN 用查询串做缩放、转码，去掉查询串就是原图
+CDN_TRANSFORM = re.compile(r"^(imageMogr2|imageView2|x-oss-process|x-image-process)")
+
+
+class Candidate(NamedTuple):
+    url: str
+    # srcset 的 `w` 描述符或 data-expand 给出的宽度，未知为 None
+    width: int | None = None
+    # srcset 的 `x` 描述符
+    density: float | None = None
+
+
+class Preference(NamedTuple):
+    kind: Literal["largest", "smallest", "max-width"]
+    max_width: int | None = None
+
+
+def parse_preference(text: str) -> Preference:
+    """
+    .. code-block:: python
+        parse_preference("largest") # => Preference("largest")
+        parse_preference("max-width=1280") # => Preference("max-width", 1280)
+    """
+
+    if text in ("largest", "smallest"):
+        return Preference(text)
+
+    if match := re.fullmatch(r"max-width=(\d+)", text):
+        return Preference("max-width", int(match.group(1)))
+
+    raise ValueError(f"expected largest, smallest or max-width=N, got {text!r}")
+
+
+def parse_srcset(srcset: str) -> list[Candidate]:
+    """
+    按 HTML 规范解析 srcset：URL 里可以有逗号（CDN 参数常见），以空白结束；描述符到下一个逗号为止。
+
+    .. code-block:: python
+        parse_srcset("a.jpg 640w, b.jpg?x=1,2 1280w")
+        # => [Candidate("a.jpg", 640), Candidate("b.jpg?x=1,2", 1280)]
+    """
+
+    candidates: list[Candidate] = []
+    position = 0
+
+    while True:
+        while position < len(srcset) and (
+            srcset[position].isspace() or srcset[position] == ","
+        ):
+            position += 1
+
+        if position >= len(srcset):
+            return candidates
+
+        end = position
+        while end < len(srcset) and not srcset[end].isspace():
+            end += 1
+
+        url = srcset[position:end]
+        position = end
+        descriptors = ""
+
+        if url.endswith(","):
+            url = url.rstrip(",")
+        else:
+            comma = srcset.find(",", position)
+            comma = len(srcset) if comma == -1 else comma
+            descriptors = srcset[position:comma]
+            position = comma + 1
+
+        width = density = None
+
+        for descriptor in descriptors.split():
+            try:
+                if descriptor.endswith("w"):
+                    width = int(descriptor[:-1])
+                elif descriptor.endswith("x"):
+                    density = float(descriptor[:-1])
+            except ValueError:
+                logger.debug(f"ignore invalid srcset descriptor {descriptor!r}")
+
+        if url:
+            candidates.append(Candidate(url, width, density))
+
+
+def collect_candidates(img: Tag, page_url: str) -> list[Candidate]:
+    """`<picture><source>`、srcset、懒加载属性以及 CDN 原图，去重后全部转成完整 URL。"""
+
+    candidates: list[Candidate] = []
+
+    if isinstance(img.parent, Tag) and img.parent.name == "picture":
+        for source in img.parent.find_all("source", recursive=False):
+            for attr in SRCSET_ATTRS:
+                candidates += parse_srcset(str(source.get(attr) or ""))
+
+    for attr in SRCSET_ATTRS:
+        candidates += parse_srcset(str(img.get(attr) or ""))
+
+    for attr in LAZY_SRC_ATTRS:
+        if src := img.get(attr):
+            candidates.append(Candidate(str(src)))
+
+    expand = str(img.get("data-expand") or "")
+    for candidate in list(candidates):
+        parts = urlsplit(candidate.url)
+
+        if CDN_TRANSFORM.match(parts.query):
+            original = urlunsplit(parts._replace(query=""))
+            candidates.append(
+                Candidate(original, int(expand) if expand.isdigit() else None)
+            )
+
+    unique: dict[str, Candidate] = {}
+
+    for candidate in candidates:
+        url = get_full_url(page_url, candidate.url)
+
+        # 同一 URL 出现多次时保留信息最全的那个
+        if (
+            url not in unique
+            or (candidate.width or candidate.density)
+            and not (unique[url].width or unique[url].density)
+        ):
+            unique[url] = candidate._replace(url=url)
+
+    return list(unique.values())
+
+
+def choose(
+    candidates: list[Candidate],
+    preference: Preference,
+    sizes: dict[str, int] | None = None,
+) -> Candidate:
+    """
+    按偏好选择：先看宽度（`x` 描述符按 1x=1 排序），探测过 Content-Length 时 largest / smallest 以字节数为准。
+    没有任何描述符的候选按宽度 0 处理。
+    """
+
+    sizes = sizes or {}
+
+    def width(candidate: Candidate) -> float:
+        if candidate.width is not None:
+            return candidate.width
+        return candidate.density or 0
+
+    def key(candidate: Candidate) -> tuple[float, float]:
+        return (sizes.get(candidate.url, -1), width(candidate))
+
+    if preference.kind == "largest":
+        return max(candidates, key=key)
+
+    if preference.kind == "smallest":
+        return min(
+            candidates,
+            key=lambda c: (sizes.get(c.url, float("inf")), width(c) or float("inf")),
+        )
+
+    assert preference.max_width is not None
+    fitting = [
+        c for c in candidates if c.width is not None and c.width <= preference.max_width
+    ]
+
+    if fitting:
+        return max(fitting, key=lambda c: c.width or 0)
+
+    # 没有不超过上限的，取最小的
+    return min(
+        candidates, key=lambda c: c.width if c.width is not None else float("inf")
+    )
+
+
+async def probe_sizes(
+    client: httpx.AsyncClient, host_limiter: HostLimiter, candidates: list[Candidate]
+) -> dict[str, int]:
+    """并发 HEAD 所有候选（同样受每域名并发数约束），返回拿到 Content-Length 的 URL → 字节数。"""
+
+    async def head(url: str) -> tuple[str, int | None]:
+        try:
+            async with host_limiter(url):
+                r = await client.head(url)
+            r.raise_for_status()
+        except httpx.HTTPError as error:
+            logger.debug(f"HEAD {url} failed: {error!r}")
+            return url, None
+
+        length = r.headers.get("content-length")
+
+        return url, int(length) if length and length.isdigit() else None
+
+    results = await asyncio.gather(*(head(c.url) for c in candidates))
+
+    return {url: size for url, size in results if size is not None}
+
+
+async def select_source(
+    img: Tag,
+    page_url: str,
+    preference: Preference,
+    probe: tuple[httpx.AsyncClient, HostLimiter] | None = None,
+) -> str | None:
+    """
+    从 `<img>` 的所有候选地址中按偏好选出要下载的一个；传入 `probe` 时先并发 HEAD 探测大小。
+
+    .. code-block:: python
+        await select_source(img, page_url, parse_preference("max-width=1280"))
+    """
+
+    candidates = collect_candidates(img, page_url)
+
+    if not candidates:
+        return None
+
+    if len(candidates) == 1:
+        return candidates[0].url
+
+    sizes = await probe_sizes(*probe, candidates) if probe is not None else {}
+
+    return choose(candidates, preference, sizes).url
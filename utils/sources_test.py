@@ -0,0 +1,88 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from .html_stream import StreamExtractor, StreamSelector
+from .sources import (
+    Candidate,
+    Preference,
+    choose,
+    collect_candidates,
+    parse_preference,
+    parse_srcset,
+)
+
+PAGE = "https://example.com/post/1"
+
+
+def test_parse_srcset():
+    assert parse_srcset("a.jpg 640w, b.jpg?x=1,2 1280w") == [
+        Candidate("a.jpg", 640),
+        Candidate("b.jpg?x=1,2", 1280),
+    ]
+    assert parse_srcset(" a.jpg, b.jpg 2x ,c.jpg 1.5x") == [
+        Candidate("a.jpg"),
+        Candidate("b.jpg", density=2.0),
+        Candidate("c.jpg", density=1.5),
+    ]
+    assert parse_srcset("") == []
+
+
+def test_parse_preference():
+    assert parse_preference("largest") == Preference("largest")
+    assert parse_preference("max-width=1280") == Preference("max-width", 1280)
+
+    with pytest.raises(ValueError):
+        parse_preference("biggest")
+
+
+def test_collect_candidates_from_picture_and_lazy_attrs():
+    html = """
+    <picture>
+      <source srcset="/img/a.avif 2048w" type="image/avif">
+      <img src="/img/placeholder.gif" data-original="/img/a-800.jpg"
+           data-srcset="/img/a-640.jpg 640w, /img/a-1280.jpg 1280w">
+    </picture>
+    """
+    img = BeautifulSoup(html, "html.parser").find("img")
+
+    assert collect_candidates(img, PAGE) == [
+        Candidate("https://example.com/img/a.avif", 2048),
+        Candidate("https://example.com/img/a-640.jpg", 640),
+        Candidate("https://example.com/img/a-1280.jpg", 1280),
+        Candidate("https://example.com/img/a-800.jpg"),
+        Candidate("https://example.com/img/placeholder.gif"),
+    ]
+
+    # 流式解析得到的 Tag 同样带着 <picture> 父节点
+    extractor = StreamExtractor({"img": StreamSelector("picture img")})
+    extractor.feed(html)
+    [(_, streamed)] = extractor.drain()
+
+    assert collect_candidates(streamed, PAGE) == collect_candidates(img, PAGE)
+
+
+def test_collect_candidates_cdn_original():
+    html = '<img src="https://cdn.example.com/a.jpg?imageMogr2/thumbnail/1280x%3e/format/webp" data-expand="2048">'
+    img = BeautifulSoup(html, "html.parser").find("img")
+
+    assert collect_candidates(img, PAGE)[-1] == Candidate(
+        "https://cdn.example.com/a.jpg", 2048
+    )
+
+
+def test_choose():
+    candidates = [
+        Candidate("small.jpg", 640),
+        Candidate("large.jpg", 2048),
+        Candidate("medium.jpg", 1280),
+        Candidate("fallback.jpg"),
+    ]
+
+    assert choose(candidates, Preference("largest")).url == "large.jpg"
+    assert choose(candidates, Preference("smallest")).url == "small.jpg"
+    assert choose(candidates, Preference("max-width", 1500)).url == "medium.jpg"
+    assert choose(candidates, Preference("max-width", 100)).url == "small.jpg"
+
+    # 探测到的字节数优先于描述符
+    sizes = {"fallback.jpg": 9_000_000, "large.jpg": 800_000}
+    assert choose(candidates, Preference("largest"), sizes).url == "fallback.jpg"
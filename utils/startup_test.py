@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ("httpx", "bs4", "pydantic_settings", "requests")
+
+
+@pytest.mark.parametrize("module", ["utils", "utils.cli_args", "main"])
+def test_cold_import_skips_heavy_modules(module):
+    env = {k: v for k, v in os.environ.items() if k not in ("CHAT_ID", "AUTHORIZATION")}
+    code = f"import sys, {module}; print(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+
+    # 没有 Kimi 配置也能导入
+    completed = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert completed.stdout.strip() == "[]"
@@ -1,24 +1,191 @@
 import asyncio
+import bisect
 import functools
+import json
+import math
+import random
 import time
-from typing import Any, Callable
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+METRIC_PREFIX = "picture_downloader_"
+QUANTILES = (0.5, 0.95, 0.99)
+# 每个直方图最多保留的样本数，超过后按蓄水池抽样，分位数变为近似值
+MAX_SAMPLES = 1024
+
+
+class Histogram:
+    """
+    按需计算分位数的直方图。样本超过 `max_samples` 后做蓄水池抽样（Algorithm R），
+    长时间运行的服务内存和每次记录的开销都有上限；count、sum、min、max 始终精确。
+    """
+
+    def __init__(self, max_samples: int = MAX_SAMPLES) -> None:
+        # 有序的样本，最多 `max_samples` 个
+        self.samples: list[float] = []
+        self.max_samples = max_samples
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.random = random.Random()
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if len(self.samples) < self.max_samples:
+            bisect.insort(self.samples, value)
+        elif (victim := self.random.randrange(self.count)) < self.max_samples:
+            # 第 n 个样本以 max_samples / n 的概率替换随机一个旧样本
+            del self.samples[victim]
+            bisect.insort(self.samples, value)
+
+    def percentile(self, quantile: float) -> float:
+        """
+        最近秩法分位数，没有样本时返回 0。
+
+        .. code-block:: python
+            histogram.percentile(0.95)
+        """
+
+        if not self.samples:
+            return 0.0
+
+        rank = max(1, math.ceil(quantile * len(self.samples)))
+
+        return self.samples[rank - 1]
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+            **{f"p{round(q * 100)}": self.percentile(q) for q in QUANTILES},
+        }
+
+
+class Metrics:
+    """
+    各阶段的耗时直方图和计数器，运行结束时可导出 JSON 或 Prometheus 文本格式。
+    每次运行一个实例，通过 `metrics` 和 `timing(metric=...)` 记录。
+
+    .. code-block:: python
+        with metrics.time("select_seconds"):
+            imgs = soup.css.select(selector)
+
+        metrics.incr("ai_retries_total")
+        metrics.dump("metrics.prom")
+    """
+
+    def __init__(self) -> None:
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: Counter[str] = Counter()
+
+    def observe(self, name: str, value: float) -> None:
+        self.histograms.setdefault(name, Histogram()).observe(value)
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        self.histograms.clear()
+        self.counters.clear()
+
+    def report(self) -> dict[str, dict]:
+        return {
+            "histograms": {
+                name: histogram.summary()
+                for name, histogram in sorted(self.histograms.items())
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def to_prometheus(self) -> str:
+        """直方图以 summary 类型导出分位数，计数器以 counter 类型导出。"""
+
+        lines: list[str] = []
+
+        for name, histogram in sorted(self.histograms.items()):
+            metric = METRIC_PREFIX + name
+            lines.append(f"# TYPE {metric} summary")
+            lines += [
+                f'{metric}{{quantile="{q}"}} {histogram.percentile(q)}'
+                for q in QUANTILES
+            ]
+            lines.append(f"{metric}_sum {histogram.sum}")
+            lines.append(f"{metric}_count {histogram.count}")
+
+        for name, value in sorted(self.counters.items()):
+            metric = METRIC_PREFIX + name
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str | Path) -> None:
+        """后缀为 `.prom` 或 `.txt` 时写 Prometheus 文本格式（可供 node_exporter textfile 收集），否则写 JSON。"""
+
+        path = Path(path)
+
+        if path.suffix in (".prom", ".txt"):
+            path.write_text(self.to_prometheus(), encoding="utf-8")
+        else:
+            path.write_text(json.dumps(self.report(), indent=2), encoding="utf-8")
+
+
+# 运行之外（比如单独调用 AI 命名）记到这里
+default_metrics = Metrics()
+current_metrics: ContextVar[Metrics] = ContextVar("current_metrics")
+
+
+class CurrentMetrics:
+    """
+    转发到当前上下文的 `Metrics`。`Downloader.run()` 在自己的 contextvars 上下文中启动下载任务并绑定本次运行的实例，
+    同一进程中并发的运行各记各的；运行之外记到进程级的默认实例。
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(current_metrics.get(default_metrics), name)
+
+
+metrics = CurrentMetrics()
 
 
 def timing(
     precision: int = 2,
     show_func_name: bool = True,
     customizeLabel: None | Callable[[float], str] = None,
+    metric: None | str = None,
 ):
     """
     装饰器，用于计算函数的执行时间。
 
     ## Features
     - 同步和异步函数均可使用。
+    - 传入 `metric` 时把耗时记入 `metrics` 的同名直方图，不再打印。
 
     :param func: 要装饰的函数
     :param precision: 小数点后精度
     :param show_func_name: 是否显示函数名
     :param label: 自定义标签
+    :param metric: 直方图名称，比如 "crawl_html_seconds"
     """
 
     def decorator(func: Callable[..., Any]):
@@ -26,6 +193,10 @@ def timing(
             time = end_time - start_time
             tips = ""
 
+            if metric is not None:
+                metrics.observe(metric, time)
+                return
+
             if customizeLabel is not None:
                 tips = customizeLabel(time)
             else:
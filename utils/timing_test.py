@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from .timing import Histogram, Metrics, metrics, timing
+
+
+def test_histogram_percentile():
+    histogram = Histogram()
+    for value in range(100, 0, -1):
+        histogram.observe(value)
+
+    assert histogram.percentile(0.5) == 50
+    assert histogram.percentile(0.95) == 95
+    assert histogram.percentile(0.99) == 99
+    assert histogram.summary()["max"] == 100
+    assert Histogram().percentile(0.5) == 0
+
+
+def test_histogram_samples_are_bounded():
+    histogram = Histogram(max_samples=100)
+    for value in range(1, 10001):
+        histogram.observe(value)
+
+    assert len(histogram.samples) == 100
+    assert (histogram.count, histogram.sum) == (10000, 10000 * 10001 / 2)
+    assert (histogram.summary()["min"], histogram.summary()["max"]) == (1, 10000)
+    # 抽样后的分位数是近似值
+    assert 3000 < histogram.percentile(0.5) < 7000
+
+
+def test_metrics_dump(tmp_path):
+    registry = Metrics()
+    registry.observe("crawl_html_seconds", 0.5)
+    registry.incr("ai_retries_total", 2)
+
+    registry.dump(tmp_path / "metrics.json")
+    report = json.loads((tmp_path / "metrics.json").read_text())
+    assert report["histograms"]["crawl_html_seconds"]["p95"] == 0.5
+    assert report["counters"] == {"ai_retries_total": 2}
+
+    registry.dump(tmp_path / "metrics.prom")
+    text = (tmp_path / "metrics.prom").read_text()
+    assert 'picture_downloader_crawl_html_seconds{quantile="0.99"} 0.5' in text
+    assert "picture_downloader_ai_retries_total 2" in text
+
+
+def test_timing_metric():
+    @timing(metric="test_sleep_seconds")
+    async def sleep():
+        await asyncio.sleep(0.01)
+
+    metrics.reset()
+    asyncio.run(sleep())
+
+    assert metrics.histograms["test_sleep_seconds"].count == 1
+    assert metrics.histograms["test_sleep_seconds"].sum >= 0.01
@@ -1,4 +1,4 @@
-from urllib.parse import urljoin, urlparse
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse
 import os
 
 
@@ -10,3 +10,22 @@ def extract_filename(url):
 
 def get_full_url(url: str, filename: str) -> str:
     return urljoin(url, filename)
+
+
+def normalize_url(url: str) -> str:
+    """
+    规范化 URL 作为缓存键：scheme 和域名小写，去掉 fragment，query 参数排序。
+
+    .. code-block:: python
+        normalize_url("HTTPS://Img.zcool.cn/a.jpg?b=2&a=1#top") # => "https://img.zcool.cn/a.jpg?a=1&b=2"
+    """
+
+    parsed = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+
+    return parsed._replace(
+        scheme=parsed.scheme.lower(),
+        netloc=parsed.netloc.lower(),
+        query=query,
+        fragment="",
+    ).geturl()
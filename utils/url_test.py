@@ -1,4 +1,4 @@
-from .url import extract_filename, get_full_url
+from .url import extract_filename, get_full_url, normalize_url
 
 
 def test_extract_filename():
@@ -30,3 +30,14 @@ def test_get_full_url():
         )
         == "https://www.python-httpx.org/img/httpx-help.png"
     )
+
+
+def test_normalize_url():
+    assert (
+        normalize_url("HTTPS://Img.zcool.cn/community/a.jpg?b=2&a=1#top")
+        == "https://img.zcool.cn/community/a.jpg?a=1&b=2"
+    )
+    assert (
+        normalize_url("https://img.zcool.cn/community/a.jpg")
+        == "https://img.zcool.cn/community/a.jpg"
+    )
@@ -0,0 +1,287 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, TypeVar
+
+from .http_client import CHUNK_SIZE
+from .manifest import file_digest
+
+T = TypeVar("T")
+
+WRITE_THREADS = 4
+# 所有文件排队待写的字节数上限，写盘跟不上时下载随之放慢
+MAX_PENDING_BYTES = 16 * 1024 * 1024
+# 不支持硬链接时，本进程内的发布串行进行
+PUBLISH_LOCK = threading.Lock()
+
+
+class PartFile:
+    """
+    `FileWriter.open()` 打开的临时文件。同一文件同时只有一次写入在线程池中进行，保证顺序；
+    写入和读取下一块网络数据并行。
+    """
+
+    def __init__(self, writer: "FileWriter", file: IO[bytes], preallocated: bool):
+        self.writer = writer
+        self.file = file
+        self.preallocated = preallocated
+        self.pending: asyncio.Future[None] | None = None
+        # 线程池中实际写盘的耗时
+        self.seconds = 0.0
+
+    async def write(self, chunk: bytes) -> None:
+        await self.writer.reserve(len(chunk))
+
+        try:
+            if self.pending is not None:
+                await self.pending
+        except BaseException:
+            self.writer.release(len(chunk))
+            raise
+
+        self.pending = asyncio.ensure_future(self.writer.run(self.write_sync, chunk))
+        self.pending.add_done_callback(lambda _: self.writer.release(len(chunk)))
+
+    def write_sync(self, chunk: bytes) -> None:
+        start = time.perf_counter()
+        self.file.write(chunk)
+        self.seconds += time.perf_counter() - start
+
+    async def close(self) -> None:
+        try:
+            if self.pending is not None:
+                await self.pending
+        finally:
+            await self.writer.run(
+                close_part, self.file, self.preallocated, self.writer.fsync != "never"
+            )
+
+
+class FileWriter:
+    """
+    在线程池中写文件，慢盘或网络盘（比如 Windows 的 SMB 共享）不会卡住事件循环里的其他下载。
+    所有文件排队待写的字节数合计不超过 `max_pending_bytes`。
+
+    图片先写到隐藏的 `.part` 临时文件，完成后由 `commit()` 发布为最终文件名：
+    同名文件已存在时由写入器换一个不冲突的名字，并发的两张同名图片不会互相覆盖，半截的图片也永远不会以最终文件名出现。
+
+    .. code-block:: python
+        writer = FileWriter(fsync="file", preallocate=True)
+
+        async with writer.open(Path("output/.abc.part"), size=1024) as f:
+            await f.write(chunk)
+
+        full_path, created = await writer.commit(Path("output/.abc.part"), Path("output/duck.jpg"), digest)
+        writer.close()
+
+    :param fsync: never：交给操作系统刷盘；file：发布前 fsync 临时文件；full：发布后再 fsync 目录，掉电也不会丢失重命名
+    :param preallocate: 已知大小时预先分配临时文件，减少碎片；预分配的临时文件中断后长度不可信，不参与断点续传
+    """
+
+    def __init__(
+        self,
+        threads: int = WRITE_THREADS,
+        max_pending_bytes: int = MAX_PENDING_BYTES,
+        fsync: str = "never",
+        preallocate: bool = False,
+    ) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="writer"
+        )
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes = 0
+        self.drained = asyncio.Event()
+        self.fsync = fsync
+        self.preallocate = preallocate
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def reserve(self, amount: int) -> None:
+        # 单块超过上限时等其他写入完成后放行，不会永远等下去
+        while (
+            self.pending_bytes and self.pending_bytes + amount > self.max_pending_bytes
+        ):
+            self.drained.clear()
+            await self.drained.wait()
+
+        self.pending_bytes += amount
+
+    def release(self, amount: int) -> None:
+        self.pending_bytes -= amount
+        self.drained.set()
+
+    @contextlib.asynccontextmanager
+    async def open(
+        self, path: Path, append: bool = False, size: int | None = None
+    ) -> AsyncIterator[PartFile]:
+        """
+        :param append: 续传时追加到已有内容之后
+        :param size: 预期大小，开启 `preallocate` 时预先分配，关闭时截断到实际写入的长度
+        """
+
+        file, preallocated = await self.run(
+            open_part, path, append, size if self.preallocate else None
+        )
+        part = PartFile(self, file, preallocated)
+
+        try:
+            yield part
+        finally:
+            await part.close()
+
+    async def commit(
+        self, src: Path, target: Path, digest: str | None = None
+    ) -> tuple[Path, bool]:
+        """
+        把 `src` 原子地发布为 `target`，不覆盖已有文件。
+
+        :param digest: `target` 已存在且内容的 sha256 相同时删除 `src`，不另存副本
+        :return: (最终路径, 是否新建了文件)
+        """
+
+        return await self.run(publish, src, target, digest, self.fsync == "full")
+
+    async def replace(self, src: Path, target: Path) -> None:
+        """有意覆盖 `target`（远端内容更新、更大的近似重复版本）。"""
+
+        await self.run(replace_file, src, target, self.fsync == "full")
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+
+def open_part(path: Path, append: bool, size: int | None) -> tuple[IO[bytes], bool]:
+    # 交给 `PartFile`，写完由 `close_part()` 关闭
+    file = open(path, "ab" if append else "wb")  # noqa: SIM115
+
+    if not size or append:
+        return file, False
+
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(file.fileno(), 0, size)
+        elif os.name == "nt":
+            # NTFS 扩展文件时按新的长度分配空间
+            file.truncate(size)
+        else:
+            return file, False
+    except OSError:
+        # 文件系统不支持（部分网络盘）时直接写
+        return file, False
+
+    return file, True
+
+
+def close_part(file: IO[bytes], preallocated: bool, fsync: bool) -> None:
+    try:
+        if preallocated:
+            # 实际内容可能比 Content-Length 短（压缩传输、下载中断）
+            file.truncate(file.tell())
+
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+    finally:
+        file.close()
+
+
+def publish(
+    src: Path, target: Path, digest: str | None, fsync_dir: bool
+) -> tuple[Path, bool]:
+    candidate = target
+
+    while True:
+        try:
+            claim(src, candidate)
+            break
+        except FileExistsError:
+            if (
+                digest is not None
+                and candidate == target
+                and file_digest(candidate) == digest
+            ):
+                src.unlink()
+                return candidate, False
+
+            candidate = target.with_name(gen_uniq_filename(target.name))
+
+    if fsync_dir:
+        sync_dir(candidate.parent)
+
+    return candidate, True
+
+
+def claim(src: Path, target: Path) -> None:
+    """
+    硬链接在目标已存在时失败，检查和创建是同一个原子操作，不会有 `exists()` 之后被别人抢先的窗口。
+    `src` 是已经写完的临时文件，最终文件名上不会出现空文件或半截文件。
+    """
+
+    try:
+        os.link(src, target)
+    except FileExistsError:
+        raise
+    except OSError:
+        # 不支持硬链接的文件系统（FAT、部分网络盘）直接重命名：Windows 的 rename 在目标已存在时失败；
+        # 其他系统没有不覆盖的原子重命名，用锁保证本进程内并发的发布不会互相覆盖
+        with PUBLISH_LOCK:
+            if os.name != "nt" and os.path.lexists(target):
+                raise FileExistsError(target) from None
+
+            os.rename(src, target)
+
+        return
+
+    src.unlink()
+
+
+def replace_file(src: Path, target: Path, fsync_dir: bool) -> None:
+    os.replace(src, target)
+
+    if fsync_dir:
+        sync_dir(target.parent)
+
+
+def sync_dir(path: Path) -> None:
+    # Windows 不能打开目录做 fsync，重命名由 NTFS 日志保证
+    if os.name == "nt":
+        return
+
+    fd = os.open(path, os.O_RDONLY)
+
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def update_digest(path: Path, digest: Any) -> int:
+    """续传前把已下载的部分读进 `digest`，返回其长度。"""
+
+    size = 0
+
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+
+    return size
+
+
+def gen_uniq_filename(filename: str) -> str:
+    stem = Path(filename).stem
+    suffix = Path(filename).suffix
+
+    return stem + "-" + gen_time() + suffix
+
+
+def gen_time() -> str:
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import os
+
+from .writer import FileWriter
+
+
+def test_preallocated_part_is_truncated_to_written_length(tmp_path):
+    writer = FileWriter(fsync="file", preallocate=True)
+    part = tmp_path / ".a.part"
+
+    async def main():
+        # Content-Length 比实际内容长（比如压缩传输）
+        async with writer.open(part, size=1024) as f:
+            for chunk in (b"ab", b"cd", b"ef"):
+                await f.write(chunk)
+
+    asyncio.run(main())
+    writer.close()
+
+    assert part.read_bytes() == b"abcdef"
+    assert writer.pending_bytes == 0
+
+
+def test_pending_bytes_are_bounded(tmp_path):
+    writer = FileWriter(max_pending_bytes=8)
+    peak = 0
+    release = writer.release
+
+    def tracking_release(amount: int) -> None:
+        nonlocal peak
+        peak = max(peak, writer.pending_bytes)
+        release(amount)
+
+    writer.release = tracking_release
+
+    async def write(name: str) -> None:
+        async with writer.open(tmp_path / name) as f:
+            for _ in range(10):
+                await f.write(b"1234")
+
+    async def main():
+        await asyncio.gather(*(write(f".{index}.part") for index in range(3)))
+
+    asyncio.run(main())
+    writer.close()
+
+    assert peak <= 8
+    assert all(
+        (tmp_path / f".{index}.part").read_bytes() == b"1234" * 10 for index in range(3)
+    )
+
+
+def test_commit_resolves_collisions_without_overwriting(tmp_path):
+    writer = FileWriter()
+    target = tmp_path / "duck.jpg"
+    target.write_bytes(b"old")
+
+    async def commit(index: int):
+        part = tmp_path / f".{index}.part"
+        part.write_bytes(f"new {index}".encode())
+        return await writer.commit(part, target)
+
+    async def main():
+        return await asyncio.gather(*(commit(index) for index in range(5)))
+
+    results = asyncio.run(main())
+
+    paths = {path for path, created in results if created}
+    assert len(paths) == 5 and target not in paths
+    assert target.read_bytes() == b"old"
+    assert not list(tmp_path.glob(".*.part"))
+
+    # 内容相同的不另存副本
+    part = tmp_path / ".same.part"
+    part.write_bytes(b"old")
+    digest = hashlib.sha256(b"old").hexdigest()
+
+    assert asyncio.run(writer.commit(part, target, digest)) == (target, False)
+    assert not part.exists()
+    writer.close()
+
+
+def test_commit_without_hard_links(tmp_path, monkeypatch):
+    def no_link(src, dst):
+        raise OSError("hard links are not supported")
+
+    monkeypatch.setattr(os, "link", no_link)
+
+    writer = FileWriter()
+    target = tmp_path / "duck.jpg"
+
+    async def commit(index: int):
+        part = tmp_path / f".{index}.part"
+        part.write_bytes(f"new {index}".encode())
+        return await writer.commit(part, target)
+
+    async def main():
+        return await asyncio.gather(*(commit(index) for index in range(5)))
+
+    paths = [path for path, _ in asyncio.run(main())]
+    writer.close()
+
+    assert len(set(paths)) == 5
+    assert sorted(path.read_bytes() for path in paths) == [
+        f"new {index}".encode() for index in range(5)
+    ]
+    assert not list(tmp_path.glob(".*.part"))